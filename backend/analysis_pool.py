@@ -0,0 +1,386 @@
+"""
+Analysis Pool - audio feature extraction in worker processes, fed from a job queue
+"""
+import asyncio
+import itertools
+import logging
+import os
+import resource
+import signal
+import threading
+import weakref
+from contextlib import contextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from audio_analyzer import ANALYSIS_PROFILES, ANALYZER_VERSION, DEFAULT_ANALYSIS_PROFILE, AudioAnalyzer
+from feature_cache import FeatureCache
+from pcm_cache import PCMCache
+
+logger = logging.getLogger(__name__)
+
+# Analysis priorities, most urgent first
+PRIORITY_PLAYBACK = 0
+PRIORITY_QUEUED = 1
+PRIORITY_BACKFILL = 2
+
+class AnalysisTimeout(Exception):
+    """A file used up its analysis time budget"""
+
+def failure_reason(error: BaseException) -> str:
+    """Short category of an analysis failure, recorded with the quarantined track"""
+    if isinstance(error, AnalysisTimeout):
+        return 'timeout'
+    if isinstance(error, MemoryError):
+        return 'memory'
+    if isinstance(error, BrokenProcessPool):
+        return 'worker_crashed'
+    return 'error'
+
+# One analyzer and feature cache connection per worker, set up by the pool initializer
+_worker_analyzer: Optional[AudioAnalyzer] = None
+_worker_cache: Optional[FeatureCache] = None
+
+def _init_worker(feature_cache: Optional[FeatureCache] = None, pcm_cache: Optional[PCMCache] = None,
+                 memory_headroom: Optional[int] = None):
+    global _worker_analyzer, _worker_cache
+    _worker_analyzer = AudioAnalyzer(pcm_cache=pcm_cache)
+    _worker_cache = feature_cache
+    if memory_headroom:
+        _limit_address_space(memory_headroom)
+
+def _address_space() -> Optional[int]:
+    """Bytes of address space the process has mapped, where /proc tells"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _limit_address_space(headroom: int):
+    """Cap the worker's address space (RLIMIT_AS, not resident memory) at ``headroom`` bytes beyond
+    what it maps once warmed up; a file that needs more fails with MemoryError"""
+    # Numba compiles and BLAS and FFT set up their buffers on first use, mapping more on more cores
+    _worker_analyzer.compute_features(np.random.default_rng(0).standard_normal(22050).astype(np.float32), 22050)
+    mapped = _address_space()
+    if mapped is None:
+        logger.warning("Cannot read the analysis worker's address space; running it without a memory limit")
+        return
+    limit = mapped + headroom
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _raise_timeout(signum, frame):
+    raise AnalysisTimeout("Analysis time budget exceeded")
+
+@contextmanager
+def _time_budget(seconds: Optional[float]):
+    """Interrupt the block with AnalysisTimeout after ``seconds`` (only on a process's main thread)"""
+    if not seconds or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def analyze_audio_file(file_path: str, profile_name: str, duration: Optional[float] = None,
+                       content_hash: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Extract audio features (runs inside an analysis worker).
+    
+    Features already extracted for the same content are taken from the
+    feature cache without decoding the file. Genre, mood and energy are
+    derived by the caller, in batches. Extraction is cut off after
+    ``timeout`` seconds where the worker can set an alarm.
+    """
+    features = None
+    if _worker_cache and content_hash:
+        features = _worker_cache.get(content_hash, profile_name)
+    
+    if features is not None:
+        stats = {'decoder': 'cache', 'decode_seconds': 0.0, 'feature_seconds': 0.0}
+    else:
+        stats = {}
+        with _time_budget(timeout):
+            features = _worker_analyzer.extract_audio_features(
+                file_path, ANALYSIS_PROFILES[profile_name], duration, stats, content_hash
+            )
+        if _worker_cache and content_hash:
+            _worker_cache.put(content_hash, profile_name, features)
+    
+    return {
+        'audio_features': features,
+        'analysis_profile': profile_name,
+        'analysis_stats': stats,
+        'analyzer_version': ANALYZER_VERSION
+    }
+
+
+class AnalysisRequest:
+    """One track waiting for (or in) analysis; every caller asking for it shares the future"""
+
+    def __init__(self, key: str, args: Tuple, future: asyncio.Future, priority: int):
+        self.key = key
+        self.args = args
+        self.future = future
+        self.priority = priority
+        self.running = False
+        self.crashes = 0
+
+
+class AnalysisPool:
+    """Runs audio analysis on a pool of workers so the event loop never blocks on librosa.
+
+    Requests wait in a priority queue and a fixed number of dispatchers, one
+    per worker, hand them to the pool, so the number of decodes in flight
+    never exceeds the number of workers however many tracks are submitted.
+    Requests are keyed by track: submitting a track that is already waiting
+    shares its result, and raising its priority moves it ahead of the
+    backfill without disturbing the order of anything else.
+
+    Each file gets ``timeout`` seconds from when a worker picks it up: the
+    worker interrupts itself with an alarm, and if no result arrives a
+    little after that (a decoder stuck in native code), process workers are
+    killed and replaced; files that were in flight on the other workers are
+    queued again without counting as a crash. Process workers are also
+    limited to ``memory_limit_mb`` of virtual address space beyond what
+    they map once the analyzer is loaded and warmed up, which scales with
+    the core count because numpy and BLAS reserve address space per thread.
+
+    Thread workers get neither limit: the alarm only works on a process's
+    main thread, memory limits are per process, and a stuck thread cannot
+    be stopped, so a file past its deadline is failed but keeps its thread
+    busy until it returns.
+    """
+
+    EXECUTOR_TYPES = ('process', 'thread')
+
+    # Extra seconds the pool waits past the worker's own deadline before killing it; process pools
+    # hand a file over before a new worker has finished loading and warming up the analyzer
+    DEADLINE_GRACE = 30.0
+
+    # Worker crashes a file may be caught up in before it is failed
+    MAX_CRASHES = 2
+
+    # Seconds between checks whether a worker has picked up a submitted file
+    START_POLL_INTERVAL = 0.1
+
+    def __init__(self, workers: Optional[int] = None, executor_type: str = 'process',
+                 profile: str = DEFAULT_ANALYSIS_PROFILE, feature_cache: Optional[FeatureCache] = None,
+                 pcm_cache: Optional[PCMCache] = None, timeout: Optional[float] = None,
+                 memory_limit_mb: Optional[int] = None):
+        if executor_type not in self.EXECUTOR_TYPES:
+            raise ValueError(f"Unknown analysis executor type: {executor_type}")
+        if profile not in ANALYSIS_PROFILES:
+            raise ValueError(f"Unknown analysis profile: {profile}")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.executor_type = executor_type
+        self.profile = profile
+        self.feature_cache = feature_cache
+        self.pcm_cache = pcm_cache
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._executor: Optional[Executor] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._dispatchers: List[asyncio.Task] = []
+        self._requests: Dict[str, AnalysisRequest] = {}
+        # Pools killed on purpose, whose broken futures are not the files' fault
+        self._killed_executors = weakref.WeakSet()
+        # Tie-breaker keeping equal priorities first in, first out
+        self._sequence = itertools.count()
+
+    @property
+    def executor(self) -> Executor:
+        """Lazily create the worker pool; each worker loads the analyzer once"""
+        if self._executor is None:
+            if self.executor_type == 'process':
+                memory_headroom = self.memory_limit_mb * 1024 * 1024 if self.memory_limit_mb else None
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker,
+                    initargs=(self.feature_cache, self.pcm_cache, memory_headroom)
+                )
+            else:
+                logger.warning(
+                    "Thread analysis workers have no per-file time budget or memory limit; "
+                    "a file that hangs keeps its thread busy"
+                )
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='analysis',
+                    initializer=_init_worker, initargs=(self.feature_cache, self.pcm_cache)
+                )
+            logger.info(f"Started {self.executor_type} analysis pool with {self.workers} workers")
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for request in self._requests.values() if not request.running)
+
+    def start(self):
+        """Start the dispatchers (must be called from the event loop)"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    def submit(self, key: str, file_path: str, profile: Optional[str] = None, duration: Optional[float] = None,
+               content_hash: Optional[str] = None, priority: int = PRIORITY_BACKFILL) -> asyncio.Future:
+        """Queue a track for analysis with a profile (the pool's default if None) and return its future.
+
+        If the track is already queued, its existing future is returned and
+        its priority raised to ``priority`` if that is more urgent.
+        """
+        self.start()
+        request = self._requests.get(key)
+        if request is not None and not request.future.done():
+            self.prioritize(key, priority)
+            return request.future
+
+        future = asyncio.get_running_loop().create_future()
+        request = AnalysisRequest(
+            key, (file_path, profile or self.profile, duration, content_hash, self.timeout), future, priority
+        )
+        self._requests[key] = request
+        future.add_done_callback(lambda _: self._forget(request))
+        self._queue.put_nowait((priority, next(self._sequence), request))
+        return future
+
+    async def analyze(self, key: str, file_path: str, profile: Optional[str] = None,
+                      duration: Optional[float] = None, content_hash: Optional[str] = None,
+                      priority: int = PRIORITY_BACKFILL) -> Dict[str, Any]:
+        """Queue a track for analysis and wait for its result"""
+        return await asyncio.shield(self.submit(key, file_path, profile, duration, content_hash, priority))
+
+    def prioritize(self, key: str, priority: int) -> bool:
+        """Move a queued track up to ``priority``; False if the pool does not have it.
+
+        The heap cannot reorder an entry in place, so the request is queued a
+        second time; whichever copy comes out first runs and the other is
+        skipped.
+        """
+        request = self._requests.get(key)
+        if request is None or request.future.done():
+            return False
+        if not request.running and priority < request.priority:
+            request.priority = priority
+            self._queue.put_nowait((priority, next(self._sequence), request))
+        return True
+
+    def discard(self, keys: Iterable[str]):
+        """Drop tracks still waiting at backfill priority, e.g. when their scan is cancelled.
+
+        Tracks someone moved up stay queued for whoever moved them up, who
+        is expected to wait for them too.
+        """
+        for key in keys:
+            request = self._requests.get(key)
+            if request is not None and not request.running and request.priority >= PRIORITY_BACKFILL:
+                request.future.cancel()
+
+    def _forget(self, request: AnalysisRequest):
+        if self._requests.get(request.key) is request:
+            del self._requests[request.key]
+
+    async def _dispatch(self):
+        queue = self._queue
+        deadline = self.timeout + self.DEADLINE_GRACE if self.timeout else None
+        while True:
+            _, _, request = await queue.get()
+            future = request.future
+            file_path = request.args[0]
+            try:
+                # Already taken by a higher-priority copy, or nobody is waiting any more
+                if request.running or future.done():
+                    continue
+                request.running = True
+                executor = self.executor
+                result = await self._run(executor, request, deadline)
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except asyncio.TimeoutError:
+                logger.error(f"No analysis result for {file_path} after {deadline}s")
+                self._kill_workers(executor)
+                if not future.done():
+                    future.set_exception(AnalysisTimeout(f"No result after {deadline}s"))
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed by the OOM killer) and took every file in flight with it;
+                # start a fresh pool and give those files another go
+                if self._executor is executor:
+                    self._executor = None
+                if executor in self._killed_executors:
+                    # Killed for another file that overran its deadline
+                    request.running = False
+                    queue.put_nowait((request.priority, next(self._sequence), request))
+                    continue
+                request.crashes += 1
+                if request.crashes < self.MAX_CRASHES:
+                    logger.warning(f"Analysis workers crashed while processing {file_path}; retrying it")
+                    request.running = False
+                    queue.put_nowait((request.priority, next(self._sequence), request))
+                else:
+                    logger.error(f"Analysis workers crashed while processing {file_path}")
+                    if not future.done():
+                        future.set_exception(e)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                queue.task_done()
+
+    async def _run(self, executor: Executor, request: AnalysisRequest, deadline: Optional[float]) -> Dict[str, Any]:
+        """Analyze one file, allowing it ``deadline`` seconds from when a worker picks it up"""
+        work = executor.submit(analyze_audio_file, *request.args)
+        result = asyncio.wrap_future(work)
+        if deadline is None:
+            return await result
+        try:
+            # Time spent waiting for a worker (a new pool starting, a thread held by a stuck file)
+            # does not count against the file
+            while not work.running() and not work.done():
+                await asyncio.sleep(self.START_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            result.cancel()
+            raise
+        return await asyncio.wait_for(result, deadline)
+
+    def _kill_workers(self, executor: Executor):
+        """Replace the process pool after a worker overran its deadline.
+
+        ProcessPoolExecutor cannot stop a single task, so every worker is
+        killed; files in flight on the others are retried. A stuck thread
+        cannot be killed and keeps its slot until it returns.
+        """
+        if not isinstance(executor, ProcessPoolExecutor):
+            logger.error("An analysis thread is stuck; it cannot be stopped")
+            return
+        if self._executor is executor:
+            self._executor = None
+        self._killed_executors.add(executor)
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Stop the dispatchers and the worker pool"""
+        for task in self._dispatchers:
+            task.cancel()
+        self._dispatchers = []
+        self._queue = None
+        for request in list(self._requests.values()):
+            request.future.cancel()
+        self._requests = {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
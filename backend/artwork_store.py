@@ -0,0 +1,153 @@
+"""
+Artwork Store - content-addressed cover art on disk
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, features
+
+from disk_cache import DiskLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the image formats embedded in audio tags
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+
+def sniff_image_type(header: bytes) -> str:
+    """Determine an image MIME type from its first bytes"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return 'application/octet-stream'
+
+class ArtworkStore:
+    """Stores each distinct cover image once, in a file named after its SHA-256.
+
+    Files are fanned out over 256 subdirectories and written atomically, so
+    concurrent ingest workers can store the same cover without coordination.
+    Instances only hold a path and can be handed to worker processes.
+    """
+
+    HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def is_valid_hash(self, artwork_hash: str) -> bool:
+        return bool(self.HASH_PATTERN.match(artwork_hash))
+
+    def path_for(self, artwork_hash: str) -> Path:
+        if not self.is_valid_hash(artwork_hash):
+            raise ValueError(f"Invalid artwork hash: {artwork_hash}")
+        return self.root / artwork_hash[:2] / artwork_hash
+
+    def put(self, data: bytes) -> str:
+        """Store image bytes if not already present and return their hash"""
+        artwork_hash = self.hash_bytes(data)
+        path = self.path_for(artwork_hash)
+        if path.exists():
+            return artwork_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return artwork_hash
+
+    def get_path(self, artwork_hash: str) -> Optional[Path]:
+        """Path of a stored image, or None if it is unknown"""
+        if not self.is_valid_hash(artwork_hash):
+            return None
+        path = self.path_for(artwork_hash)
+        return path if path.exists() else None
+
+    def media_type(self, artwork_hash: str) -> str:
+        path = self.get_path(artwork_hash)
+        if path is None:
+            return 'application/octet-stream'
+        with open(path, 'rb') as f:
+            return sniff_image_type(f.read(12))
+
+class ArtworkThumbnailer:
+    """Scales stored cover art down to a few fixed sizes on first request.
+
+    Thumbnails are encoded as WebP when Pillow supports it and the client
+    accepts it, JPEG otherwise, and kept in a size-capped LRU disk cache so
+    only the covers actually being browsed take up space.
+    """
+
+    SIZES = (128, 320, 640)
+    FORMATS = {
+        'webp': ('WEBP', 'image/webp'),
+        'jpeg': ('JPEG', 'image/jpeg'),
+    }
+
+    def __init__(self, store: ArtworkStore, cache: DiskLRUCache, quality: int = 80):
+        self.store = store
+        self.cache = cache
+        self.quality = quality
+        self.webp_supported = features.check('webp')
+
+    @classmethod
+    def snap_size(cls, requested: int) -> int:
+        """Smallest fixed size that covers the requested one"""
+        return next((size for size in cls.SIZES if size >= requested), cls.SIZES[-1])
+
+    def choose_format(self, accept: str) -> str:
+        return 'webp' if self.webp_supported and 'image/webp' in (accept or '') else 'jpeg'
+
+    def media_type(self, image_format: str) -> str:
+        return self.FORMATS[image_format][1]
+
+    def get(self, artwork_hash: str, size: int, image_format: str) -> Optional[Path]:
+        """Path of the thumbnail, rendering it on a cache miss; None if there is no usable source"""
+        key = f"{size}/{artwork_hash[:2]}/{artwork_hash}.{image_format}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        source = self.store.get_path(artwork_hash)
+        if source is None:
+            return None
+        try:
+            data = self._render(source, size, image_format)
+        except Exception as e:
+            logger.warning(f"Cannot render {size}px thumbnail of artwork {artwork_hash}: {e}")
+            return None
+        return self.cache.put(key, data)
+
+    def _render(self, source: Path, size: int, image_format: str) -> bytes:
+        pil_format, _ = self.FORMATS[image_format]
+        with Image.open(source) as image:
+            image.draft('RGB', (size, size))
+            image.thumbnail((size, size), Image.LANCZOS)
+            has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha and pil_format == 'WEBP' else 'RGB')
+
+            output = io.BytesIO()
+            image.save(output, format=pil_format, quality=self.quality, optimize=pil_format == 'JPEG')
+            return output.getvalue()
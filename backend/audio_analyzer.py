@@ -3,142 +3,381 @@ Advanced Audio Analysis Module for Genre Classification and Music Intelligence
 """
 import librosa
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
 import json
 from pathlib import Path
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional
 import pickle
 import os
+import time
+from dataclasses import dataclass
+
+from audio_decoder import audio_duration, decode_audio, stream_audio
+from genre_model import DEFAULT_MODEL_PATH, GENRE_FEATURES, GENRE_MAPPING, GenreModel, load_genre_model
+from pcm_cache import PCM_CACHE, PCMCache
+from feature_index import FeatureIndex
 
 logger = logging.getLogger(__name__)
 
+@dataclass(frozen=True)
+class AnalysisProfile:
+    name: str
+    rank: int  # higher ranks refine lower ones
+    sample_rate: int
+    res_type: str  # librosa resampler
+    segment_strategy: str  # head, middle or full
+    segment_duration: Optional[float] = 30.0  # seconds per segment
+    segment_count: int = 1
+
+ANALYSIS_PROFILES = {
+    # A few short windows from the body of the track at a low rate, for a cheap first pass
+    'fast': AnalysisProfile('fast', 0, 16000, 'soxr_lq', 'middle', segment_duration=8.0, segment_count=3),
+    # The original analysis: the first 30 seconds at librosa's default rate
+    'standard': AnalysisProfile('standard', 1, 22050, 'soxr_hq', 'head', segment_duration=30.0),
+    # The whole track
+    'full': AnalysisProfile('full', 2, 22050, 'soxr_hq', 'full', segment_duration=None),
+}
+DEFAULT_ANALYSIS_PROFILE = 'standard'
+
+# Bump whenever feature extraction changes, and record the profiles it affects in PROFILE_VERSIONS
+# (2: caches written by version 1 may hold the stand-in features below;
+#  3: windows longer than a stream block are analyzed block-wise)
+ANALYZER_VERSION = '3'
+
+# Analyzer version in which each profile's features last changed; cached features are keyed by it,
+# so a change to one profile leaves the others' caches valid
+PROFILE_VERSIONS = {'fast': '2', 'standard': '2', 'full': '3'}
+
+# Profiles whose features changed in the current analyzer version; tracks analyzed with them by an
+# older version are analyzed again
+PROFILES_CHANGED_IN_VERSION = [name for name, version in PROFILE_VERSIONS.items() if version == ANALYZER_VERSION]
+
+# Features stored in place of real ones when analysis failed, before failures were quarantined
+LEGACY_STAND_IN_FEATURES = {
+    'spectral_centroid': 2000.0, 'spectral_rolloff': 4000.0, 'spectral_bandwidth': 2000.0,
+    'tempo': 120.0, 'harmonic_mean': 0.1, 'percussive_mean': 0.1,
+    'mfcc_1': 0.0, 'mfcc_2': 0.0, 'mfcc_3': 0.0, 'mfcc_4': 0.0, 'mfcc_5': 0.0,
+    'rms_energy': 0.1, 'zero_crossing_rate': 0.1, 'dynamic_range': 0.5
+}
+
+# Bump whenever the rule-based genres or the mood/energy thresholds change
+CLASSIFICATION_RULES_VERSION = '1'
+
 class AudioAnalyzer:
     """Advanced audio analysis for genre classification and similarity detection"""
     
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.genre_classifier = None
-        self.genre_mapping = {
-            0: "Electronic", 1: "Rock", 2: "Pop", 3: "Hip-Hop", 4: "Jazz",
-            5: "Classical", 6: "Blues", 7: "Country", 8: "Reggae", 9: "Metal",
-            10: "Folk", 11: "R&B", 12: "Ambient", 13: "Indie", 14: "Alternative"
-        }
-        self._initialize_classifier()
+    def __init__(self, model_path: Optional[str] = None, pcm_cache: Optional[PCMCache] = None):
+        self.model_path = model_path or os.environ.get('GENRE_MODEL_PATH', DEFAULT_MODEL_PATH)
+        self.pcm_cache = pcm_cache
+        self.genre_mapping = dict(GENRE_MAPPING)
+        self._genre_model: Optional[GenreModel] = None
+        self._genre_model_loaded = False
     
-    def _initialize_classifier(self):
-        """Initialize a basic genre classifier with pre-trained weights simulation"""
-        # In a real implementation, you'd load a pre-trained model
-        # For demo purposes, we'll create a basic classifier
-        self.genre_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-        
-        # Create dummy training data to initialize the model
-        dummy_features = np.random.rand(150, 13)  # 13 features we extract
-        dummy_labels = np.random.randint(0, len(self.genre_mapping), 150)
-        
-        self.scaler.fit(dummy_features)
-        self.genre_classifier.fit(self.scaler.transform(dummy_features), dummy_labels)
+    @property
+    def genre_model(self) -> Optional[GenreModel]:
+        """The genre classifier artifact, loaded on first use; None if it is unavailable"""
+        if not self._genre_model_loaded:
+            self._genre_model_loaded = True
+            try:
+                self._genre_model = load_genre_model(self.model_path)
+                self.genre_mapping = dict(self._genre_model.genre_mapping)
+                logger.info(f"Loaded genre model {self._genre_model.version} from {self.model_path}")
+            except FileNotFoundError:
+                logger.warning(
+                    f"No genre model at {self.model_path}, using rule-based genres "
+                    f"(build one with: python genre_model.py build)"
+                )
+            except Exception as e:
+                logger.error(f"Could not load genre model from {self.model_path}: {e}")
+        return self._genre_model
     
-    def extract_audio_features(self, file_path: str) -> Dict[str, float]:
-        """Extract comprehensive audio features for analysis"""
-        try:
-            # Load audio file
-            y, sr = librosa.load(file_path, duration=30)  # Analyze first 30 seconds
-            
-            features = {}
-            
-            # Spectral features
-            features['spectral_centroid'] = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-            features['spectral_rolloff'] = float(np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)))
-            features['spectral_bandwidth'] = float(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
-            
-            # Rhythmic features
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            features['tempo'] = float(tempo)
-            
-            # Harmonic features
-            harmonic, percussive = librosa.effects.hpss(y)
-            features['harmonic_mean'] = float(np.mean(harmonic))
-            features['percussive_mean'] = float(np.mean(percussive))
-            
-            # MFCC features (first 5 coefficients)
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=5)
-            for i in range(5):
-                features[f'mfcc_{i+1}'] = float(np.mean(mfccs[i]))
-            
-            # Energy and dynamics
-            features['rms_energy'] = float(np.mean(librosa.feature.rms(y=y)))
-            features['zero_crossing_rate'] = float(np.mean(librosa.feature.zero_crossing_rate(y)))
-            
-            # Loudness variation (dynamic range)
-            features['dynamic_range'] = float(np.max(y) - np.min(y))
-            
-            return features
-            
-        except Exception as e:
-            logger.error(f"Error extracting features from {file_path}: {e}")
-            return self._get_default_features()
+    @property
+    def model_version(self) -> str:
+        return self.genre_model.version if self.genre_model else 'rules'
+    
+    @property
+    def classification_version(self) -> str:
+        """Identifies everything genre, mood and energy are derived with, recorded per track"""
+        return f"{self.model_version}+rules-{CLASSIFICATION_RULES_VERSION}"
+    
+    # Frame parameters shared by every spectral feature (librosa's defaults)
+    N_FFT = 2048
+    HOP_LENGTH = 512
+    
+    # Windows longer than this (whole tracks) are decoded and analyzed in blocks of this many
+    # seconds, so a worker's memory does not grow with the length of the file
+    STREAM_BLOCK_SECONDS = 30.0
+    
+    def extract_audio_features(self, file_path: str, profile: Optional[AnalysisProfile] = None,
+                               duration: Optional[float] = None,
+                               stats: Optional[Dict[str, Any]] = None,
+                               content_hash: Optional[str] = None) -> Dict[str, float]:
+        """Extract comprehensive audio features for analysis.
+        
+        ``profile`` decides the sample rate, resampler and which part of the
+        track is decoded; ``duration`` (from the tags) saves probing the file
+        when segments are taken from the middle. If a ``stats`` dict is given,
+        it receives the decoder used and the time spent decoding and
+        computing features. With a ``content_hash`` and a PCM cache, decoded
+        windows are read from and saved to the cache (streamed windows are
+        not cached). Files that cannot be decoded or analyzed raise; there
+        are no stand-in features for them.
+        """
+        profile = profile or ANALYSIS_PROFILES[DEFAULT_ANALYSIS_PROFILE]
+        segments = []
+        decoders = set()
+        timings = {'decode': 0.0, 'total': 0.0}
+        for offset, segment_duration in self._segment_windows(file_path, profile, duration):
+            started = time.perf_counter()
+            if segment_duration is None or segment_duration > self.STREAM_BLOCK_SECONDS:
+                blocks, decoder = stream_audio(
+                    file_path, profile.sample_rate, profile.res_type, self.STREAM_BLOCK_SECONDS,
+                    offset, segment_duration
+                )
+                segments.append(self.compute_features_streaming(
+                    self._timed_blocks(blocks, timings), profile.sample_rate
+                ))
+            else:
+                y, decoder = self._decode_window(file_path, profile, offset, segment_duration, content_hash)
+                timings['decode'] += time.perf_counter() - started
+                segments.append(self.compute_features(y, profile.sample_rate))
+            timings['total'] += time.perf_counter() - started
+            decoders.add(decoder)
+        decode_seconds = timings['decode']
+        feature_seconds = timings['total'] - decode_seconds
+        
+        if stats is not None:
+            stats.update({
+                'decoder': '+'.join(sorted(decoders)),
+                'decode_seconds': round(decode_seconds, 3),
+                'feature_seconds': round(feature_seconds, 3)
+            })
+        return self._combine_segment_features(segments)
+    
+    def _decode_window(self, file_path: str, profile: AnalysisProfile, offset: float,
+                       duration: Optional[float], content_hash: Optional[str]) -> Tuple[np.ndarray, str]:
+        """Decode one analysis window, through the PCM cache when there is one"""
+        use_cache = self.pcm_cache is not None and content_hash
+        if use_cache:
+            y = self.pcm_cache.get(content_hash, profile.sample_rate, profile.res_type, offset, duration)
+            if y is not None:
+                return y, PCM_CACHE
+        
+        y, decoder = decode_audio(file_path, profile.sample_rate, profile.res_type, offset, duration)
+        if use_cache:
+            self.pcm_cache.put(content_hash, profile.sample_rate, profile.res_type, offset, duration, y)
+        return y, decoder
+    
+    def _timed_blocks(self, blocks: Iterator[np.ndarray], timings: Dict[str, float]) -> Iterator[np.ndarray]:
+        """Pass blocks through, adding the time spent decoding them to ``timings['decode']``"""
+        while True:
+            started = time.perf_counter()
+            block = next(blocks, None)
+            timings['decode'] += time.perf_counter() - started
+            if block is None:
+                return
+            yield block
+    
+    def _segment_windows(self, file_path: str, profile: AnalysisProfile,
+                         duration: Optional[float]) -> List[Tuple[float, Optional[float]]]:
+        """(offset, duration) of each part of the track to decode"""
+        if profile.segment_strategy == 'full':
+            return [(0.0, None)]
+        if profile.segment_strategy == 'head':
+            return [(0.0, profile.segment_duration)]
+        
+        # Evenly spaced windows over the middle 60% of the track, skipping intro and outro
+        if not duration:
+            duration = audio_duration(file_path)
+        covered = profile.segment_duration * profile.segment_count
+        if duration <= covered:
+            return [(0.0, None)]
+        
+        start, end = duration * 0.2, duration * 0.8 - profile.segment_duration
+        if end <= start:
+            start = end = (duration - profile.segment_duration) / 2
+        if profile.segment_count == 1:
+            return [((start + end) / 2, profile.segment_duration)]
+        step = (end - start) / (profile.segment_count - 1)
+        return [(start + i * step, profile.segment_duration) for i in range(profile.segment_count)]
+    
+    def _combine_segment_features(self, segments: List[Dict[str, float]]) -> Dict[str, float]:
+        """Average per-segment features; the dynamic range is the widest one seen"""
+        if len(segments) == 1:
+            return segments[0]
+        combined = {key: float(np.mean([segment[key] for segment in segments])) for key in segments[0]}
+        combined['dynamic_range'] = max(segment['dynamic_range'] for segment in segments)
+        return combined
+    
+    def compute_features(self, y: np.ndarray, sr: int) -> Dict[str, float]:
+        """Compute the feature dict from a decoded mono signal.
+        
+        The STFT is computed once and every spectral feature, the HPSS split
+        and the beat tracker's onset envelope are derived from it and from a
+        single log-mel spectrogram, instead of each librosa feature running
+        its own STFT over the signal.
+        """
+        features = {}
+        
+        # Shared intermediates
+        stft = librosa.stft(y, n_fft=self.N_FFT, hop_length=self.HOP_LENGTH)
+        magnitude = np.abs(stft)
+        log_mel = librosa.power_to_db(librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr))
+        
+        # Spectral features
+        features['spectral_centroid'] = float(np.mean(librosa.feature.spectral_centroid(S=magnitude, sr=sr)))
+        features['spectral_rolloff'] = float(np.mean(librosa.feature.spectral_rolloff(S=magnitude, sr=sr)))
+        features['spectral_bandwidth'] = float(np.mean(librosa.feature.spectral_bandwidth(S=magnitude, sr=sr)))
+        
+        # Rhythmic features
+        onset_envelope = librosa.onset.onset_strength(S=log_mel, sr=sr)
+        tempo, _ = librosa.beat.beat_track(onset_envelope=onset_envelope, sr=sr, hop_length=self.HOP_LENGTH)
+        features['tempo'] = float(np.atleast_1d(tempo)[0])
+        
+        # Harmonic features
+        harmonic_stft, percussive_stft = librosa.decompose.hpss(stft)
+        harmonic = librosa.istft(harmonic_stft, hop_length=self.HOP_LENGTH, length=len(y))
+        percussive = librosa.istft(percussive_stft, hop_length=self.HOP_LENGTH, length=len(y))
+        features['harmonic_mean'] = float(np.mean(harmonic))
+        features['percussive_mean'] = float(np.mean(percussive))
+        
+        # MFCC features (first 5 coefficients)
+        mfccs = librosa.feature.mfcc(S=log_mel, n_mfcc=5)
+        for i in range(5):
+            features[f'mfcc_{i+1}'] = float(np.mean(mfccs[i]))
+        
+        # Energy and dynamics (time-domain, no STFT involved)
+        features['rms_energy'] = float(np.mean(librosa.feature.rms(y=y)))
+        features['zero_crossing_rate'] = float(np.mean(librosa.feature.zero_crossing_rate(y)))
+        
+        # Loudness variation (dynamic range)
+        features['dynamic_range'] = float(np.max(y) - np.min(y))
+        
+        return features
     
-    def _get_default_features(self) -> Dict[str, float]:
-        """Return default features when analysis fails"""
-        return {
-            'spectral_centroid': 2000.0, 'spectral_rolloff': 4000.0, 'spectral_bandwidth': 2000.0,
-            'tempo': 120.0, 'harmonic_mean': 0.1, 'percussive_mean': 0.1,
-            'mfcc_1': 0.0, 'mfcc_2': 0.0, 'mfcc_3': 0.0, 'mfcc_4': 0.0, 'mfcc_5': 0.0,
-            'rms_energy': 0.1, 'zero_crossing_rate': 0.1, 'dynamic_range': 0.5
-        }
+    def compute_features_streaming(self, blocks: Iterable[np.ndarray], sr: int) -> Dict[str, float]:
+        """Compute the feature dict over a signal given as consecutive blocks, one block in memory at a time.
+        
+        Frame-averaged features are averaged over blocks weighted by block
+        length, the dynamic range spans the extremes of every block, and the
+        tempo is the length-weighted median of the per-block estimates.
+        """
+        totals: Dict[str, float] = {}
+        tempos: List[Tuple[float, int]] = []
+        samples = 0
+        peak, trough = -np.inf, np.inf
+        
+        for y in blocks:
+            # The resampler's flush can leave a sliver too short to frame
+            if not len(y) or (len(y) < self.N_FFT and samples):
+                continue
+            features = self.compute_features(y, sr)
+            tempos.append((features.pop('tempo'), len(y)))
+            del features['dynamic_range']
+            for key, value in features.items():
+                totals[key] = totals.get(key, 0.0) + value * len(y)
+            peak, trough = max(peak, float(np.max(y))), min(trough, float(np.min(y)))
+            samples += len(y)
+        
+        if not samples:
+            raise ValueError("No audio decoded")
+        
+        combined = {key: total / samples for key, total in totals.items()}
+        tempos.sort()
+        cumulative = np.cumsum([weight for _, weight in tempos])
+        combined['tempo'] = float(tempos[int(np.searchsorted(cumulative, samples / 2))][0])
+        combined['dynamic_range'] = peak - trough
+        return combined
+    
+    # Below this model confidence, the rule-based genre is used instead
+    MIN_MODEL_CONFIDENCE = 0.3
     
     def classify_genre(self, features: Dict[str, float]) -> Tuple[str, float]:
         """Classify genre based on audio features"""
+        genres, confidences = self.classify_genres([features])
+        return str(genres[0]), float(confidences[0])
+    
+    def classify_batch(self, features_list: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+        """Genre, confidence, mood and energy for many tracks in one vectorized pass"""
+        if not features_list:
+            return []
+        genres, confidences = self.classify_genres(features_list)
+        moods, energies = self.moods_and_energies(features_list)
+        return [
+            {
+                'ai_genre': str(genre),
+                'ai_genre_confidence': float(confidence),
+                'mood': str(mood),
+                'energy': float(energy)
+            }
+            for genre, confidence, mood, energy in zip(genres, confidences, moods, energies)
+        ]
+    
+    def feature_matrix(self, features_list: List[Dict[str, float]],
+                       names: List[str] = GENRE_FEATURES) -> np.ndarray:
+        """N x len(names) matrix of the given features; missing values are NaN"""
+        return np.array(
+            [[features.get(name, np.nan) for name in names] for features in features_list], dtype=float
+        ).reshape(len(features_list), len(names))
+    
+    def classify_genres(self, features_list: List[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Genres and confidences for N tracks with a single predict_proba call.
+        
+        Tracks with incomplete features, and everything when no model is
+        available, get the rule-based genre with confidence 0.5.
+        """
+        rule_genres = self._rule_based_genres(features_list)
+        genres = rule_genres.astype(object)
+        confidences = np.full(len(features_list), 0.5)
+        
+        model = self.genre_model
+        matrix = self.feature_matrix(features_list)
+        complete = ~np.isnan(matrix).any(axis=1)
+        if model is None or not complete.any():
+            return genres, confidences
+        
         try:
-            # Convert features to array
-            feature_vector = np.array([
-                features['spectral_centroid'], features['spectral_rolloff'], features['spectral_bandwidth'],
-                features['tempo'], features['harmonic_mean'], features['percussive_mean'],
-                features['mfcc_1'], features['mfcc_2'], features['mfcc_3'], features['mfcc_4'], features['mfcc_5'],
-                features['rms_energy'], features['zero_crossing_rate']
-            ]).reshape(1, -1)
-            
-            # Scale features
-            feature_vector_scaled = self.scaler.transform(feature_vector)
-            
-            # Predict genre
-            prediction = self.genre_classifier.predict(feature_vector_scaled)[0]
-            confidence = float(np.max(self.genre_classifier.predict_proba(feature_vector_scaled)))
-            
-            genre = self.genre_mapping.get(prediction, "Unknown")
+            probabilities = model.classifier.predict_proba(model.scaler.transform(matrix[complete]))
+            best = probabilities.argmax(axis=1)
+            model_confidences = probabilities[np.arange(len(best)), best]
+            model_genres = np.array(
+                [self.genre_mapping.get(label, "Unknown") for label in model.classifier.classes_[best]],
+                dtype=object
+            )
             
             # Fallback genre classification based on simple rules
-            if confidence < 0.3:
-                genre = self._rule_based_genre_classification(features)
-                confidence = 0.6
-            
-            return genre, confidence
+            uncertain = model_confidences < self.MIN_MODEL_CONFIDENCE
+            model_genres[uncertain] = rule_genres[complete][uncertain]
+            model_confidences[uncertain] = 0.6
             
+            genres[complete] = model_genres
+            confidences[complete] = model_confidences
         except Exception as e:
             logger.error(f"Error classifying genre: {e}")
-            return self._rule_based_genre_classification(features), 0.5
+        
+        return genres, confidences
+    
+    def _feature_column(self, features_list: List[Dict[str, float]], name: str, default: float) -> np.ndarray:
+        return np.array([features.get(name, default) for features in features_list], dtype=float)
     
-    def _rule_based_genre_classification(self, features: Dict[str, float]) -> str:
+    def _rule_based_genres(self, features_list: List[Dict[str, float]]) -> np.ndarray:
         """Simple rule-based genre classification as fallback"""
-        tempo = features.get('tempo', 120)
-        spectral_centroid = features.get('spectral_centroid', 2000)
-        rms_energy = features.get('rms_energy', 0.1)
-        
-        # Simple genre rules
-        if tempo > 140 and rms_energy > 0.15:
-            return "Electronic"
-        elif tempo > 130 and spectral_centroid > 3000:
-            return "Rock"
-        elif tempo < 80 and spectral_centroid < 1500:
-            return "Jazz"
-        elif tempo > 90 and tempo < 130:
-            return "Pop"
-        elif spectral_centroid < 1000:
-            return "Classical"
-        else:
-            return "Alternative"
+        tempo = self._feature_column(features_list, 'tempo', 120)
+        spectral_centroid = self._feature_column(features_list, 'spectral_centroid', 2000)
+        rms_energy = self._feature_column(features_list, 'rms_energy', 0.1)
+        
+        # Simple genre rules, first match wins
+        return np.select(
+            [
+                (tempo > 140) & (rms_energy > 0.15),
+                (tempo > 130) & (spectral_centroid > 3000),
+                (tempo < 80) & (spectral_centroid < 1500),
+                (tempo > 90) & (tempo < 130),
+                spectral_centroid < 1000
+            ],
+            ["Electronic", "Rock", "Jazz", "Pop", "Classical"],
+            default="Alternative"
+        )
     
     def calculate_similarity(self, features1: Dict[str, float], features2: Dict[str, float]) -> float:
         """Calculate similarity between two tracks based on audio features"""
@@ -165,31 +404,33 @@ class AudioAnalyzer:
     
     def get_mood_energy(self, features: Dict[str, float]) -> Tuple[str, float]:
         """Determine mood and energy level from audio features"""
-        tempo = features.get('tempo', 120)
-        rms_energy = features.get('rms_energy', 0.1)
-        dynamic_range = features.get('dynamic_range', 0.5)
+        moods, energies = self.moods_and_energies([features])
+        return str(moods[0]), float(energies[0])
+    
+    def moods_and_energies(self, features_list: List[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Moods and energy levels for N tracks"""
+        tempo = self._feature_column(features_list, 'tempo', 120)
+        rms_energy = self._feature_column(features_list, 'rms_energy', 0.1)
+        dynamic_range = self._feature_column(features_list, 'dynamic_range', 0.5)
         
         # Calculate energy level (0-1)
-        energy = min(1.0, (tempo / 200.0) + (rms_energy * 2) + (dynamic_range * 0.5))
+        energy = np.minimum(1.0, (tempo / 200.0) + (rms_energy * 2) + (dynamic_range * 0.5))
         
         # Determine mood
-        if energy > 0.7:
-            mood = "Energetic"
-        elif energy > 0.5:
-            mood = "Upbeat"
-        elif energy > 0.3:
-            mood = "Mellow"
-        else:
-            mood = "Calm"
-        
+        mood = np.select(
+            [energy > 0.7, energy > 0.5, energy > 0.3],
+            ["Energetic", "Upbeat", "Mellow"],
+            default="Calm"
+        )
         return mood, energy
 
 
 class RecommendationEngine:
     """Advanced recommendation engine for unlimited playback"""
     
-    def __init__(self, audio_analyzer: AudioAnalyzer):
+    def __init__(self, audio_analyzer: AudioAnalyzer, feature_index: Optional[FeatureIndex] = None):
         self.audio_analyzer = audio_analyzer
+        self.feature_index = feature_index
     
     def calculate_popularity_score(self, track_data: Dict) -> float:
         """Calculate popularity score based on play count, recency, and user behavior"""
@@ -210,6 +451,12 @@ class RecommendationEngine:
         popularity = (play_score * 0.4) + (recency_score * 0.3) + (recent_play_score * 0.3)
         return min(1.0, popularity)
     
+    def popularity_scores(self, tracks: List[Dict]) -> np.ndarray:
+        """calculate_popularity_score for many tracks at once"""
+        play_counts = np.array([track.get('play_count') or 0 for track in tracks], dtype=np.float64)
+        play_score = np.minimum(1.0, np.log(play_counts + 1) / 10.0)
+        return np.minimum(1.0, play_score * 0.4 + 0.5 * 0.3 + 0.5 * 0.3)
+    
     def find_similar_tracks(self, target_track: Dict, candidate_tracks: List[Dict], 
                           limit: int = 10) -> List[Dict]:
         """Find tracks similar to target track"""
@@ -220,58 +467,64 @@ class RecommendationEngine:
         target_genre = target_track.get('genre', 'Unknown')
         target_year = target_track.get('year')
         
-        scored_tracks = []
+        candidates = [track for track in candidate_tracks if track['id'] != target_track['id']]
+        if not candidates:
+            return []
         
-        for track in candidate_tracks:
-            if track['id'] == target_track['id']:
-                continue
-            
-            score = 0.0
-            
-            # Audio similarity (40% weight)
-            if track.get('audio_features'):
-                audio_similarity = self.audio_analyzer.calculate_similarity(
-                    target_features, track['audio_features']
-                )
-                score += audio_similarity * 0.4
-            
-            # Genre similarity (30% weight)
-            if track.get('genre') == target_genre:
-                score += 0.3
-            elif self._are_genres_similar(target_genre, track.get('genre', 'Unknown')):
-                score += 0.15
-            
-            # Year similarity (20% weight)
-            if target_year and track.get('year'):
-                year_diff = abs(target_year - track['year'])
-                year_similarity = max(0, 1 - (year_diff / 20))  # 20-year window
-                score += year_similarity * 0.2
-            
-            # Popularity score (10% weight)
-            popularity = self.calculate_popularity_score(track)
-            score += popularity * 0.1
-            
-            scored_tracks.append((track, score))
+        # Audio similarity (40% weight)
+        scores = self._audio_similarities(target_features, candidates) * 0.4
+        
+        # Genre similarity (30% weight)
+        similar_genres = self.SIMILAR_GENRES.get(target_genre, [])
+        scores += np.array([
+            0.3 if genre == target_genre else 0.15 if genre in similar_genres else 0.0
+            for genre in (track.get('genre') for track in candidates)
+        ])
         
-        # Sort by score and return top tracks
-        scored_tracks.sort(key=lambda x: x[1], reverse=True)
-        return [track for track, score in scored_tracks[:limit]]
+        # Year similarity (20% weight), over a 20-year window
+        if target_year:
+            years = np.array([track.get('year') or np.nan for track in candidates], dtype=np.float64)
+            year_similarity = np.maximum(0, 1 - np.abs(target_year - years) / 20)
+            scores += np.nan_to_num(year_similarity) * 0.2
+        
+        # Popularity score (10% weight)
+        scores += self.popularity_scores(candidates) * 0.1
+        
+        # Best first; equal scores keep their candidate order
+        top = np.argsort(-scores, kind='stable')[:limit]
+        return [candidates[i] for i in top]
+    
+    def _audio_similarities(self, target_features: Dict[str, float], candidates: List[Dict]) -> np.ndarray:
+        """Non-negative audio similarity of each candidate to the target; 0 for unanalyzed candidates"""
+        analyzed = np.array([bool(track.get('audio_features')) for track in candidates])
+        if self.feature_index is None:
+            scores = np.array([
+                self.audio_analyzer.calculate_similarity(target_features, track['audio_features'])
+                if track.get('audio_features') else 0.0
+                for track in candidates
+            ])
+        else:
+            # One matrix-vector product over the index; tracks it does not hold yet are scored one by one
+            scores = self.feature_index.scores_for(target_features, [track['id'] for track in candidates])
+            for i in np.flatnonzero(np.isnan(scores) & analyzed):
+                scores[i] = self.feature_index.similarity(target_features, candidates[i]['audio_features'])
+        return np.where(analyzed, np.maximum(np.nan_to_num(scores), 0.0), 0.0)
+    
+    SIMILAR_GENRES = {
+        'Rock': ['Metal', 'Alternative', 'Indie'],
+        'Electronic': ['Ambient', 'Pop'],
+        'Jazz': ['Blues', 'R&B'],
+        'Pop': ['R&B', 'Electronic'],
+        'Classical': ['Ambient'],
+        'Hip-Hop': ['R&B'],
+        'Country': ['Folk'],
+        'Metal': ['Rock'],
+        'Alternative': ['Rock', 'Indie']
+    }
     
     def _are_genres_similar(self, genre1: str, genre2: str) -> bool:
         """Check if two genres are similar"""
-        similar_genres = {
-            'Rock': ['Metal', 'Alternative', 'Indie'],
-            'Electronic': ['Ambient', 'Pop'],
-            'Jazz': ['Blues', 'R&B'],
-            'Pop': ['R&B', 'Electronic'],
-            'Classical': ['Ambient'],
-            'Hip-Hop': ['R&B'],
-            'Country': ['Folk'],
-            'Metal': ['Rock'],
-            'Alternative': ['Rock', 'Indie']
-        }
-        
-        return genre2 in similar_genres.get(genre1, [])
+        return genre2 in self.SIMILAR_GENRES.get(genre1, [])
     
     def generate_auto_queue(self, current_track: Dict, all_tracks: List[Dict], 
                           queue_size: int = 20) -> List[Dict]:
@@ -293,15 +546,14 @@ class RecommendationEngine:
         
         # Add discovery tracks (30% of queue) - popular but different
         discovery_count = queue_size - len(similar_tracks)
-        remaining_tracks = [t for t in available_tracks 
-                          if t['id'] not in [st['id'] for st in similar_tracks]]
+        similar_ids = {st['id'] for st in similar_tracks}
+        remaining_tracks = [t for t in available_tracks if t['id'] not in similar_ids]
         
         # Sort by popularity for discovery
-        discovery_tracks = sorted(
-            remaining_tracks,
-            key=lambda x: self.calculate_popularity_score(x),
-            reverse=True
-        )[:discovery_count]
+        popularity = self.popularity_scores(remaining_tracks) if remaining_tracks else np.zeros(0)
+        discovery_tracks = [
+            remaining_tracks[i] for i in np.argsort(-popularity, kind='stable')[:discovery_count]
+        ]
         
         # Combine and shuffle slightly for variety
         auto_queue = similar_tracks + discovery_tracks
@@ -0,0 +1,175 @@
+"""
+Audio Decoder - picks the fastest available decoder per file for analysis
+"""
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional, Set, Tuple
+
+import audioread
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+logger = logging.getLogger(__name__)
+
+SOUNDFILE = 'soundfile'
+AUDIOREAD = 'audioread'
+
+# Extensions libsndfile may decode, mapped to its format names (MP3 needs libsndfile >= 1.1)
+SOUNDFILE_FORMATS = {
+    '.flac': 'FLAC',
+    '.wav': 'WAV',
+    '.ogg': 'OGG',
+    '.oga': 'OGG',
+    '.opus': 'OGG',
+    '.mp3': 'MP3',
+    '.aiff': 'AIFF',
+    '.aif': 'AIFF',
+}
+
+@lru_cache(maxsize=1)
+def available_soundfile_formats() -> Set[str]:
+    return set(sf.available_formats())
+
+def soundfile_supports(file_path: str) -> bool:
+    """Whether the linked libsndfile can decode this kind of file in-process"""
+    return SOUNDFILE_FORMATS.get(Path(file_path).suffix.lower()) in available_soundfile_formats()
+
+def decode_audio(file_path: str, sample_rate: int, res_type: str, offset: float = 0.0,
+                 duration: Optional[float] = None) -> Tuple[np.ndarray, str]:
+    """Decode part of a file to mono float32 at ``sample_rate``.
+
+    libsndfile decodes in-process and seeks straight to ``offset``. Formats it
+    cannot handle (m4a/aac/wma, or MP3 with an old libsndfile) go through
+    audioread, which runs an external decoder per file. Returns the signal and
+    the decoder that produced it.
+    """
+    if soundfile_supports(file_path):
+        try:
+            with sf.SoundFile(file_path) as f:
+                native_rate = f.samplerate
+                if offset:
+                    f.seek(int(offset * native_rate))
+                frames = -1 if duration is None else int(duration * native_rate)
+                data = f.read(frames, dtype='float32', always_2d=True)
+            y = data.mean(axis=1)
+            if native_rate != sample_rate:
+                y = librosa.resample(y, orig_sr=native_rate, target_sr=sample_rate, res_type=res_type)
+            return y, SOUNDFILE
+        except Exception as e:
+            logger.debug(f"soundfile could not decode {file_path}, falling back to audioread: {e}")
+
+    with audioread.audio_open(file_path) as f:
+        y, _ = librosa.load(f, sr=sample_rate, res_type=res_type, offset=offset, duration=duration)
+    return y, AUDIOREAD
+
+def audio_duration(file_path: str) -> float:
+    """Track length in seconds, from the header where libsndfile can read it"""
+    if soundfile_supports(file_path):
+        try:
+            return sf.info(file_path).duration
+        except Exception:
+            pass
+    return librosa.get_duration(path=file_path)
+
+class BlockResampler:
+    """Resamples consecutive blocks of one signal without seams at the block edges.
+
+    soxr resamplers keep their filter state between blocks; any other
+    ``res_type`` resamples each block on its own.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int, res_type: str):
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self.res_type = res_type
+        self._stream = None
+        if orig_sr != target_sr and res_type.startswith('soxr_'):
+            quality = res_type[len('soxr_'):].upper()
+            self._stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype='float32', quality=quality)
+
+    def resample(self, y: np.ndarray) -> np.ndarray:
+        if self.orig_sr == self.target_sr:
+            return y
+        if self._stream is not None:
+            return self._stream.resample_chunk(y)
+        return librosa.resample(y, orig_sr=self.orig_sr, target_sr=self.target_sr, res_type=self.res_type)
+
+    def flush(self) -> np.ndarray:
+        """Whatever the resampler still holds at the end of the signal"""
+        if self._stream is None:
+            return np.zeros(0, dtype=np.float32)
+        return self._stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+def stream_audio(file_path: str, sample_rate: int, res_type: str, block_duration: float,
+                 offset: float = 0.0, duration: Optional[float] = None) -> Tuple[Iterator[np.ndarray], str]:
+    """Decode part of a file as consecutive mono float32 blocks of about ``block_duration`` seconds.
+
+    Like ``decode_audio``, but only one block is held at a time, so memory
+    stays the same however long the file is. Returns the block iterator and
+    the decoder that will produce it.
+    """
+    if soundfile_supports(file_path):
+        try:
+            sf.info(file_path)
+            return _soundfile_blocks(file_path, sample_rate, res_type, block_duration, offset, duration), SOUNDFILE
+        except Exception as e:
+            logger.debug(f"soundfile could not open {file_path}, falling back to audioread: {e}")
+    return _audioread_blocks(file_path, sample_rate, res_type, block_duration, offset, duration), AUDIOREAD
+
+def _soundfile_blocks(file_path: str, sample_rate: int, res_type: str, block_duration: float,
+                      offset: float, duration: Optional[float]) -> Iterator[np.ndarray]:
+    with sf.SoundFile(file_path) as f:
+        resampler = BlockResampler(f.samplerate, sample_rate, res_type)
+        if offset:
+            f.seek(int(offset * f.samplerate))
+        remaining = None if duration is None else int(duration * f.samplerate)
+        block_frames = int(block_duration * f.samplerate)
+        while remaining is None or remaining > 0:
+            frames = block_frames if remaining is None else min(block_frames, remaining)
+            data = f.read(frames, dtype='float32', always_2d=True)
+            if not len(data):
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield resampler.resample(data.mean(axis=1))
+    tail = resampler.flush()
+    if len(tail):
+        yield tail
+
+def _audioread_blocks(file_path: str, sample_rate: int, res_type: str, block_duration: float,
+                      offset: float, duration: Optional[float]) -> Iterator[np.ndarray]:
+    with audioread.audio_open(file_path) as f:
+        channels = f.channels
+        resampler = BlockResampler(f.samplerate, sample_rate, res_type)
+        # Counts of interleaved samples, always whole frames
+        skip = int(offset * f.samplerate) * channels
+        remaining = None if duration is None else int(duration * f.samplerate) * channels
+        block_size = int(block_duration * f.samplerate) * channels
+
+        pending, pending_size = [], 0
+        for buffer in f:
+            samples = librosa.util.buf_to_float(buffer, dtype=np.float32)
+            if skip:
+                skipped = min(skip, len(samples))
+                samples, skip = samples[skipped:], skip - skipped
+            if remaining is not None:
+                samples = samples[:remaining]
+                remaining -= len(samples)
+            pending.append(samples)
+            pending_size += len(samples)
+
+            if pending_size >= block_size:
+                data = np.concatenate(pending)
+                pending, pending_size = [data[block_size:]], len(data) - block_size
+                yield resampler.resample(data[:block_size].reshape(-1, channels).mean(axis=1))
+            if remaining == 0:
+                break
+
+        data = np.concatenate(pending) if pending else np.zeros(0, dtype=np.float32)
+        data = data[:len(data) - len(data) % channels]
+        tail = np.concatenate([resampler.resample(data.reshape(-1, channels).mean(axis=1)), resampler.flush()])
+        if len(tail):
+            yield tail
@@ -0,0 +1,77 @@
+"""
+Background Jobs - library-wide maintenance jobs run one at a time, with their progress kept for status requests
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+@dataclass(kw_only=True)
+class BackgroundJob:
+    """State and progress of one run; jobs add their own fields"""
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "running"
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    total_tracks: int = 0
+    processed: int = 0
+    elapsed_seconds: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.__dict__,
+            "tracks_per_second": round(self.processed / self.elapsed_seconds, 1) if self.elapsed_seconds else 0.0
+        }
+
+Job = TypeVar('Job', bound=BackgroundJob)
+
+class JobRunner(Generic[Job]):
+    """Runs jobs of one kind, never two at once, and remembers the last one.
+
+    ``run`` awaits a job in the caller; ``start`` runs it in the background
+    unless one is already running, in which case that one is returned.
+    Either way the outcome is recorded on the job instead of raised.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.job: Optional[Job] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, job: Job, work: Callable[[Job], Awaitable[Any]]) -> Job:
+        if self.running:
+            return self.job
+        self.job = job
+        self._task = asyncio.create_task(self.run(job, work))
+        return job
+
+    async def run(self, job: Job, work: Callable[[Job], Awaitable[Any]]):
+        self.job = job
+        started = time.monotonic()
+        try:
+            await work(job)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            logger.error(f"Error in {self.name}: {e}")
+        finally:
+            job.elapsed_seconds = time.monotonic() - started
+            job.finished_at = datetime.utcnow()
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
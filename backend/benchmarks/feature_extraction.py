@@ -0,0 +1,106 @@
+"""
+Feature Extraction Benchmark - per-track analysis time of the shared-STFT path
+against the original one-STFT-per-feature implementation
+
+Usage (from backend/):
+    python benchmarks/feature_extraction.py song1.mp3 song2.flac ...
+    python benchmarks/feature_extraction.py --synthetic 5
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import librosa
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from audio_analyzer import AudioAnalyzer
+
+def reference_features(y: np.ndarray, sr: int) -> Dict[str, float]:
+    """The original extraction, where every librosa call computes its own STFT"""
+    features = {}
+    features['spectral_centroid'] = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
+    features['spectral_rolloff'] = float(np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)))
+    features['spectral_bandwidth'] = float(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    features['tempo'] = float(np.atleast_1d(tempo)[0])
+    harmonic, percussive = librosa.effects.hpss(y)
+    features['harmonic_mean'] = float(np.mean(harmonic))
+    features['percussive_mean'] = float(np.mean(percussive))
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=5)
+    for i in range(5):
+        features[f'mfcc_{i+1}'] = float(np.mean(mfccs[i]))
+    features['rms_energy'] = float(np.mean(librosa.feature.rms(y=y)))
+    features['zero_crossing_rate'] = float(np.mean(librosa.feature.zero_crossing_rate(y)))
+    features['dynamic_range'] = float(np.max(y) - np.min(y))
+    return features
+
+def synthetic_signal(seed: int, duration: float, sr: int = 22050) -> np.ndarray:
+    """Chord plus noise plus a click track, so every feature has something to measure"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    y = sum(np.sin(2 * np.pi * f * t) for f in rng.uniform(110, 880, size=3)) / 3
+    y += 0.05 * rng.standard_normal(len(t))
+    beat_interval = 60.0 / rng.uniform(80, 160)
+    clicks = librosa.clicks(times=np.arange(0, duration, beat_interval), sr=sr, length=len(t))
+    return (0.6 * y + 0.4 * clicks).astype(np.float32)
+
+def best_time(func: Callable[[], Dict[str, float]], repeat: int) -> Tuple[float, Dict[str, float]]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def max_relative_difference(a: Dict[str, float], b: Dict[str, float]) -> Tuple[str, float]:
+    worst = ('', 0.0)
+    for key in a:
+        difference = abs(a[key] - b[key]) / max(abs(a[key]), abs(b[key]), 1e-6)
+        if difference > worst[1]:
+            worst = (key, difference)
+    return worst
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help='audio files to analyze')
+    parser.add_argument('--synthetic', type=int, default=0, help='number of synthetic signals to add')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of audio per track')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per track; the fastest is reported')
+    args = parser.parse_args(argv)
+
+    inputs = []
+    for file_path in args.files:
+        y, sr = librosa.load(file_path, duration=args.duration)
+        inputs.append((Path(file_path).name, y, sr))
+    for i in range(args.synthetic):
+        inputs.append((f'synthetic-{i}', synthetic_signal(i, args.duration), 22050))
+    if not inputs:
+        parser.error('give audio files and/or --synthetic N')
+
+    analyzer = AudioAnalyzer()
+    # Warm up librosa's caches (mel filters, numba) outside the measurements
+    analyzer.compute_features(inputs[0][1], inputs[0][2])
+    reference_features(inputs[0][1], inputs[0][2])
+
+    before, after = [], []
+    print(f"{'track':<32} {'before (s)':>10} {'after (s)':>10} {'speedup':>8}  max diff")
+    for name, y, sr in inputs:
+        reference_time, expected = best_time(lambda: reference_features(y, sr), args.repeat)
+        shared_time, actual = best_time(lambda: analyzer.compute_features(y, sr), args.repeat)
+        assert expected.keys() == actual.keys()
+        key, difference = max_relative_difference(expected, actual)
+        before.append(reference_time)
+        after.append(shared_time)
+        print(f"{name[:32]:<32} {reference_time:>10.3f} {shared_time:>10.3f} "
+              f"{reference_time / shared_time:>7.2f}x  {difference:.2e} ({key or '-'})")
+
+    print(f"\n{'mean per track':<32} {statistics.mean(before):>10.3f} {statistics.mean(after):>10.3f} "
+          f"{statistics.mean(before) / statistics.mean(after):>7.2f}x")
+
+if __name__ == '__main__':
+    main()
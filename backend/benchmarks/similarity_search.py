@@ -0,0 +1,100 @@
+"""
+Similarity Search Benchmark - recall@k and query latency of the neighbor search
+backends against brute force, at several library sizes
+
+Usage (from backend/):
+    python benchmarks/similarity_search.py
+    python benchmarks/similarity_search.py --sizes 10000 100000 1000000 --k 20
+    python benchmarks/similarity_search.py --backends lsh --lsh-tables 12 --lsh-bits 20 --lsh-probes 0
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from feature_index import FeatureIndex
+from neighbor_search import NEIGHBOR_BACKENDS, ExactSearch, NeighborSearch, create_neighbor_search
+
+# Plausible ranges of the similarity features, for synthetic libraries
+FEATURE_RANGES = {
+    'spectral_centroid': (500.0, 5000.0),
+    'spectral_rolloff': (1000.0, 9000.0),
+    'tempo': (60.0, 180.0),
+    'rms_energy': (0.01, 0.3),
+}
+
+def synthetic_features(count: int, seed: int, clusters: int = 50) -> np.ndarray:
+    """Raw feature rows drawn around random cluster centers, like a library of many styles"""
+    rng = np.random.default_rng(seed)
+    low = np.array([FEATURE_RANGES[name][0] for name in FEATURE_RANGES])
+    high = np.array([FEATURE_RANGES[name][1] for name in FEATURE_RANGES])
+    centers = rng.uniform(low, high, size=(clusters, len(FEATURE_RANGES)))
+    spread = (high - low) * 0.05
+    rows = centers[rng.integers(0, clusters, count)] + rng.normal(0, 1, (count, len(FEATURE_RANGES))) * spread
+    return np.clip(rows, low * 0.5, high * 1.5).astype(np.float32)
+
+def build_index(raw: np.ndarray) -> FeatureIndex:
+    index = FeatureIndex(list(FEATURE_RANGES), capacity=len(raw))
+    names = list(FEATURE_RANGES)
+    index.upsert_many((str(i), dict(zip(names, row.tolist()))) for i, row in enumerate(raw))
+    return index
+
+def measure(searcher: NeighborSearch, queries: np.ndarray, k: int) -> Dict[str, object]:
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows, _ = searcher.query(query, k)
+        latencies.append(time.perf_counter() - started)
+        results.append(rows)
+    return {'results': results, 'latencies': np.array(latencies) * 1000}
+
+def recall(results: List[np.ndarray], expected: List[np.ndarray], k: int) -> float:
+    return float(np.mean([len(np.intersect1d(found, truth)) / k for found, truth in zip(results, expected)]))
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='library sizes')
+    parser.add_argument('--backends', nargs='+', default=[name for name in NEIGHBOR_BACKENDS if name != 'exact'],
+                        choices=sorted(NEIGHBOR_BACKENDS), help='backends to compare with brute force')
+    parser.add_argument('--k', type=int, default=20, help='neighbors per query')
+    parser.add_argument('--queries', type=int, default=200, help='queries per library size')
+    parser.add_argument('--leaf-size', type=int, default=40, help='ball tree leaf size')
+    parser.add_argument('--lsh-tables', type=int, default=8)
+    parser.add_argument('--lsh-bits', type=int, default=16)
+    parser.add_argument('--lsh-probes', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    options = {
+        'balltree': {'leaf_size': args.leaf_size},
+        'lsh': {'tables': args.lsh_tables, 'bits': args.lsh_bits, 'probes': args.lsh_probes},
+    }
+
+    print(f"{'tracks':>9} {'backend':<9} {'build (s)':>9} {f'recall@{args.k}':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for size in args.sizes:
+        index = build_index(synthetic_features(size, seed=size))
+        vectors, valid, _, _ = index.snapshot()
+        queries = index.normalize(synthetic_features(args.queries, seed=size + 1))
+
+        started = time.perf_counter()
+        exact = ExactSearch().fit(vectors, valid)
+        build_seconds = time.perf_counter() - started
+        reference = measure(exact, queries, args.k)
+        print(f"{size:>9} {'exact':<9} {build_seconds:>9.2f} {1.0:>9.3f} "
+              f"{np.percentile(reference['latencies'], 50):>9.3f} {np.percentile(reference['latencies'], 99):>9.3f}")
+
+        for backend in args.backends:
+            started = time.perf_counter()
+            searcher = create_neighbor_search(backend, **options.get(backend, {})).fit(vectors, valid)
+            build_seconds = time.perf_counter() - started
+            measured = measure(searcher, queries, args.k)
+            print(f"{size:>9} {backend:<9} {build_seconds:>9.2f} "
+                  f"{recall(measured['results'], reference['results'], args.k):>9.3f} "
+                  f"{np.percentile(measured['latencies'], 50):>9.3f} {np.percentile(measured['latencies'], 99):>9.3f}")
+
+if __name__ == '__main__':
+    main()
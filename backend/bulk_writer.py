@@ -0,0 +1,126 @@
+"""
+Bulk Writer - batches MongoDB writes into unordered bulk operations
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BulkWriteStats:
+    batches: int = 0
+    operations: int = 0
+    failed_operations: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+class BulkWriter:
+    """Buffers inserts and updates for one collection and flushes them together.
+
+    A flush happens when ``max_batch_size`` operations are buffered or the
+    oldest buffered operation is ``max_interval`` seconds old. Writers listed in
+    ``upstream`` are flushed first, so e.g. a checkpoint never lands before
+    the documents it refers to.
+    """
+
+    # Keep only the most recent batch errors around for reporting
+    MAX_RECORDED_ERRORS = 100
+
+    def __init__(self, collection, max_batch_size: int = 500, max_interval: float = 1.0,
+                 upstream: Optional[List['BulkWriter']] = None):
+        self.collection = collection
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_interval = max_interval
+        self.upstream = upstream or []
+        self.stats = BulkWriteStats()
+        self._buffer: List[Any] = []
+        self._oldest: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> 'BulkWriter':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def start(self):
+        """Start the background task that enforces the time threshold"""
+        if self._timer is None and self.max_interval > 0:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """Stop the timer and write out everything still buffered"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        if self.stats.failed_operations:
+            logger.warning(
+                f"Bulk writes to {self.collection.name}: {self.stats.failed_operations} of "
+                f"{self.stats.operations} operations failed across {self.stats.batches} batches"
+            )
+
+    async def add(self, operation: Any):
+        """Buffer a pymongo write operation"""
+        if not self._buffer:
+            self._oldest = time.monotonic()
+        self._buffer.append(operation)
+        if len(self._buffer) >= self.max_batch_size:
+            await self.flush()
+
+    async def insert(self, document: Dict[str, Any]):
+        await self.add(InsertOne(document))
+
+    async def update(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        await self.add(UpdateOne(filter, update, upsert=upsert))
+
+    async def flush(self):
+        """Write all buffered operations with a single unordered bulk_write"""
+        for writer in self.upstream:
+            await writer.flush()
+
+        async with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            self._oldest = None
+
+            self.stats.batches += 1
+            self.stats.operations += len(batch)
+            try:
+                await self.collection.bulk_write(batch, ordered=False)
+            except BulkWriteError as e:
+                write_errors = e.details.get('writeErrors', [])
+                self._record_error(len(batch), len(write_errors), write_errors[:5])
+            except Exception as e:
+                self._record_error(len(batch), len(batch), [{'errmsg': str(e)}])
+
+    def _record_error(self, batch_size: int, failed: int, samples: List[Dict[str, Any]]):
+        self.stats.failed_operations += failed
+        self.stats.errors.append({
+            'batch': self.stats.batches,
+            'batch_size': batch_size,
+            'failed': failed,
+            'samples': [sample.get('errmsg') for sample in samples]
+        })
+        del self.stats.errors[:-self.MAX_RECORDED_ERRORS]
+        logger.error(
+            f"Bulk write batch {self.stats.batches} to {self.collection.name}: "
+            f"{failed} of {batch_size} operations failed"
+        )
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.max_interval / 2)
+            if self._oldest is not None and time.monotonic() - self._oldest >= self.max_interval:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Error flushing bulk writes to {self.collection.name}: {e}")
@@ -0,0 +1,131 @@
+"""
+Disk Cache - size-capped least-recently-used file cache
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class DiskLRUCache:
+    """Keeps files under ``root`` and evicts the least recently used ones once
+    their total size exceeds ``max_bytes``.
+
+    Recency is tracked in memory and mirrored into file modification times,
+    which seed the order the first time the cache is used after a restart.
+    Entries are written atomically; methods are safe to call from threads.
+
+    When several processes share a cache, give a ``refresh_interval``: each
+    re-indexes the directory that often, so entries written by the others
+    count against the cap and are evicted in the same order everywhere.
+    """
+
+    def __init__(self, root: str, max_bytes: int, refresh_interval: Optional[float] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def path_for(self, key: str) -> Path:
+        """Location of an entry; keys are relative paths chosen by the caller"""
+        return self.root / key
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of a cached entry, marking it as recently used, or None on a miss"""
+        path = self.path_for(key)
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                # Possibly written by another process since the last index
+                if self.refresh_interval is None:
+                    return None
+                try:
+                    size = path.stat().st_size
+                except OSError:
+                    return None
+                self._entries[key] = size
+                self._total_bytes += size
+            elif not path.exists():
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store an entry, evicting older ones if the cache grows past its cap"""
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self._load()
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+        return path
+
+    def _load(self):
+        """Index files already on disk, oldest first (called with the lock held)"""
+        if self._loaded and (
+            self.refresh_interval is None or time.monotonic() - self._loaded_at < self.refresh_interval
+        ):
+            return
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+        self._entries.clear()
+        self._total_bytes = 0
+        if not self.root.is_dir():
+            return
+
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat_result.st_mtime, os.path.relpath(path, self.root), stat_result.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.unlink(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not evict cached file {key}: {e}")
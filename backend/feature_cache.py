@@ -0,0 +1,81 @@
+"""
+Feature Cache - extracted audio features on disk, keyed by file content
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+class FeatureCache:
+    """SQLite store of audio features keyed by content hash, analyzer version and profile.
+
+    ``analyzer_versions`` maps each profile to the analyzer version its
+    features last changed in, so bumping one profile does not invalidate
+    the cached features of the others.
+
+    It lives outside MongoDB, so a rebuilt database or a new environment
+    with the same files gets its features back without decoding anything.
+    Each process opens its own connection on first use, so an instance can
+    be handed to worker processes; WAL mode lets them read and write
+    concurrently.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS features (
+            content_hash TEXT NOT NULL,
+            analyzer_version TEXT NOT NULL,
+            profile TEXT NOT NULL,
+            features TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (content_hash, analyzer_version, profile)
+        )
+    '''
+
+    def __init__(self, path: str, analyzer_versions: Mapping[str, str]):
+        self.path = Path(path)
+        self.analyzer_versions = dict(analyzer_versions)
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'analyzer_versions': self.analyzer_versions}
+
+    def __setstate__(self, state):
+        self.__init__(str(state['path']), state['analyzer_versions'])
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(self.SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, content_hash: str, profile: str) -> Optional[Dict[str, float]]:
+        try:
+            row = self.connection.execute(
+                'SELECT features FROM features WHERE content_hash = ? AND analyzer_version = ? AND profile = ?',
+                (content_hash, self.analyzer_versions[profile], profile)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Feature cache lookup failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, content_hash: str, profile: str, features: Dict[str, float]):
+        try:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)',
+                    (content_hash, self.analyzer_versions[profile], profile, json.dumps(features), time.time())
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Feature cache write failed: {e}")
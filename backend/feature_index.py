@@ -0,0 +1,176 @@
+"""
+Feature Index - resident matrix of standardized audio feature vectors for similarity lookups
+"""
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Audio features track similarity is measured on
+SIMILARITY_FEATURES = ['spectral_centroid', 'spectral_rolloff', 'tempo', 'rms_energy']
+
+class FeatureIndex:
+    """One contiguous float32 matrix row per analyzed track, plus the id <-> row mapping.
+
+    Rows hold feature vectors standardized with the library's mean and
+    standard deviation and scaled to unit length, so the cosine similarity
+    of a track to every other track is a single matrix-vector product. The
+    statistics are refitted whenever the library has doubled since the last
+    fit; in between, new rows are standardized with the current ones. Rows
+    of removed tracks are zeroed and reused. Methods are safe to call from
+    threads.
+    """
+
+    def __init__(self, feature_names: Optional[List[str]] = None, capacity: int = 1024):
+        self.feature_names = list(feature_names or SIMILARITY_FEATURES)
+        self._lock = threading.RLock()
+        # Bumped on every refit, after which every row's vector (and any score computed from one) has changed
+        self.generation = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        dimensions = len(self.feature_names)
+        self._raw = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0  # rows handed out so far; everything after is unused capacity
+        self._mean = np.zeros(dimensions, dtype=np.float32)
+        self._scale = np.ones(dimensions, dtype=np.float32)
+        self._fitted_count = 0
+        # Bumped on every change, so structures derived from the matrix know when to rebuild
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._rows
+
+    def vectorize(self, features: Dict[str, float]) -> np.ndarray:
+        """Raw feature vector in column order; missing features count as 0"""
+        return np.array([features.get(name) or 0.0 for name in self.feature_names], dtype=np.float32)
+
+    def normalize(self, raw: np.ndarray) -> np.ndarray:
+        """Standardize raw vectors (one per row) and scale them to unit length"""
+        standardized = (raw - self._mean) / self._scale
+        norms = np.linalg.norm(standardized, axis=-1, keepdims=True)
+        return (standardized / (norms + 1e-8)).astype(np.float32)
+
+    def build(self, tracks: Iterable[Tuple[str, Dict[str, float]]]):
+        """Replace the whole index with (track id, audio features) pairs"""
+        tracks = list(tracks)
+        with self._lock:
+            self._allocate(max(1024, len(tracks)))
+            self.upsert_many(tracks)
+        logger.info(f"Built feature index of {len(self)} tracks")
+
+    def upsert_many(self, tracks: Iterable[Tuple[str, Dict[str, float]]]):
+        """Add or update tracks by id"""
+        with self._lock:
+            touched = []
+            for track_id, features in tracks:
+                row = self._rows.get(track_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._next_row()
+                    self._rows[track_id] = row
+                    self._ids[row] = track_id
+                    self._valid[row] = True
+                self._raw[row] = self.vectorize(features)
+                touched.append(row)
+            if not touched:
+                return
+
+            if len(self._rows) >= 2 * self._fitted_count:
+                self._fit()
+            else:
+                self._vectors[touched] = self.normalize(self._raw[touched])
+            self.version += 1
+
+    def upsert(self, track_id: str, features: Dict[str, float]):
+        self.upsert_many([(track_id, features)])
+
+    def remove(self, track_id: str):
+        with self._lock:
+            row = self._rows.pop(track_id, None)
+            if row is None:
+                return
+            self._ids[row] = None
+            self._valid[row] = False
+            self._vectors[row] = 0.0
+            self._free.append(row)
+            self.version += 1
+
+    def _next_row(self) -> int:
+        if self._size == len(self._valid):
+            capacity = 2 * len(self._valid)
+            self._raw = self._grow(self._raw, capacity)
+            self._vectors = self._grow(self._vectors, capacity)
+            self._valid = self._grow(self._valid, capacity)
+            self._ids.extend([None] * (capacity - len(self._ids)))
+        self._size += 1
+        return self._size - 1
+
+    @staticmethod
+    def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _fit(self):
+        """Refit the standardization to the current library and renormalize every row"""
+        valid = self._valid[:self._size]
+        raw = self._raw[:self._size][valid]
+        self._mean = raw.mean(axis=0)
+        std = raw.std(axis=0)
+        self._scale = np.where(std > 1e-6, std, 1.0).astype(np.float32)
+        self._vectors[:self._size] = self.normalize(self._raw[:self._size]) * valid[:, None]
+        self._fitted_count = len(self._rows)
+        self.generation += 1
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, List[Optional[str]], int]:
+        """The live matrix, validity mask, row ids and version, for building derived structures"""
+        with self._lock:
+            return (self._vectors[:self._size].copy(), self._valid[:self._size].copy(),
+                    list(self._ids[:self._size]), self.version)
+
+    def similarities(self, features: Dict[str, float]) -> np.ndarray:
+        """Cosine similarity of ``features`` to every row; unused rows score -inf"""
+        with self._lock:
+            query = self.normalize(self.vectorize(features))
+            scores = self._vectors[:self._size] @ query
+            scores[~self._valid[:self._size]] = -np.inf
+            return scores
+
+    def scores_for(self, features: Dict[str, float], track_ids: Sequence[str]) -> np.ndarray:
+        """Cosine similarity of ``features`` to the given tracks; NaN for tracks not in the index"""
+        with self._lock:
+            scores = self.similarities(features)
+            rows = np.array([self._rows.get(track_id, -1) for track_id in track_ids], dtype=np.int64)
+        return np.where(rows >= 0, scores[rows] if len(scores) else np.nan, np.nan)
+
+    def similarity(self, features1: Dict[str, float], features2: Dict[str, float]) -> float:
+        """Cosine similarity of two feature dicts in the index's standardized space"""
+        with self._lock:
+            vectors = self.normalize(np.stack([self.vectorize(features1), self.vectorize(features2)]))
+        return float(vectors[0] @ vectors[1])
+
+    def features(self, track_id: str) -> Optional[Dict[str, float]]:
+        """The indexed raw features of a track, or None if it is not in the index"""
+        with self._lock:
+            row = self._rows.get(track_id)
+            if row is None:
+                return None
+            return dict(zip(self.feature_names, self._raw[row].tolist()))
+
+    def track_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rows)
+
+    def row_ids(self, rows: Iterable[int]) -> List[str]:
+        return [self._ids[row] for row in rows]
@@ -0,0 +1,150 @@
+"""
+Genre Model - versioned genre classifier artifacts and the CLI that builds them
+
+Usage (from backend/):
+    python genre_model.py build [--training-data features.csv] [--version NAME] [--output PATH]
+    python genre_model.py info [PATH]
+
+Training data is a CSV with one column per entry of GENRE_FEATURES plus a
+``genre`` column. Without it, the placeholder model the analyzer has always
+used is rebuilt from a fixed seed, so every worker gets the same predictions.
+"""
+import argparse
+import csv
+import logging
+import os
+import pickle
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# Bump when the artifact layout changes
+ARTIFACT_FORMAT = 1
+
+DEFAULT_MODEL_PATH = str(Path(__file__).parent / 'models' / 'genre_model.pkl')
+
+# Classifier inputs, in column order
+GENRE_FEATURES = [
+    'spectral_centroid', 'spectral_rolloff', 'spectral_bandwidth',
+    'tempo', 'harmonic_mean', 'percussive_mean',
+    'mfcc_1', 'mfcc_2', 'mfcc_3', 'mfcc_4', 'mfcc_5',
+    'rms_energy', 'zero_crossing_rate'
+]
+
+GENRE_MAPPING = {
+    0: "Electronic", 1: "Rock", 2: "Pop", 3: "Hip-Hop", 4: "Jazz",
+    5: "Classical", 6: "Blues", 7: "Country", 8: "Reggae", 9: "Metal",
+    10: "Folk", 11: "R&B", 12: "Ambient", 13: "Indie", 14: "Alternative"
+}
+
+@dataclass
+class GenreModel:
+    version: str
+    scaler: StandardScaler
+    classifier: RandomForestClassifier
+    genre_mapping: Dict[int, str] = field(default_factory=lambda: dict(GENRE_MAPPING))
+    feature_names: List[str] = field(default_factory=lambda: list(GENRE_FEATURES))
+    sklearn_version: str = sklearn.__version__
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+def save_genre_model(model: GenreModel, path: str):
+    """Write the artifact atomically, so running workers never see a partial file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'format': ARTIFACT_FORMAT, 'model': model}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def load_genre_model(path: str) -> GenreModel:
+    """Load an artifact built by this module (only load artifacts you built: this unpickles)"""
+    with open(path, 'rb') as f:
+        artifact = pickle.load(f)
+    if not isinstance(artifact, dict) or artifact.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported genre model artifact format in {path}")
+
+    model = artifact['model']
+    if model.feature_names != GENRE_FEATURES:
+        raise ValueError(f"Genre model {model.version} was trained on different features")
+    if model.sklearn_version != sklearn.__version__:
+        logger.warning(
+            f"Genre model {model.version} was built with scikit-learn {model.sklearn_version}, "
+            f"running {sklearn.__version__}; rebuild it if predictions look wrong"
+        )
+    return model
+
+def build_placeholder_model(seed: int = 42) -> GenreModel:
+    """The analyzer's original demo model, made reproducible with a fixed seed"""
+    rng = np.random.RandomState(seed)
+    features = rng.rand(150, len(GENRE_FEATURES))
+    labels = rng.randint(0, len(GENRE_MAPPING), 150)
+    return fit_genre_model(features, labels, version=f'placeholder-{seed}')
+
+def fit_genre_model(features: np.ndarray, labels: np.ndarray, version: str) -> GenreModel:
+    scaler = StandardScaler().fit(features)
+    classifier = RandomForestClassifier(n_estimators=100, random_state=42)
+    classifier.fit(scaler.transform(features), labels)
+    return GenreModel(version=version, scaler=scaler, classifier=classifier)
+
+def read_training_data(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    genre_ids = {genre: genre_id for genre_id, genre in GENRE_MAPPING.items()}
+    features, labels = [], []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['genre'] not in genre_ids:
+                raise ValueError(f"Unknown genre in training data: {row['genre']}")
+            features.append([float(row[name]) for name in GENRE_FEATURES])
+            labels.append(genre_ids[row['genre']])
+    return np.array(features), np.array(labels)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='fit a genre model and write the artifact')
+    build.add_argument('--training-data', help='CSV of labelled feature vectors')
+    build.add_argument('--version', help='version recorded in the artifact and on analyzed tracks')
+    build.add_argument('--output', default=os.environ.get('GENRE_MODEL_PATH', DEFAULT_MODEL_PATH))
+
+    info = commands.add_parser('info', help='describe an artifact')
+    info.add_argument('path', nargs='?', default=os.environ.get('GENRE_MODEL_PATH', DEFAULT_MODEL_PATH))
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        if args.training_data:
+            features, labels = read_training_data(args.training_data)
+            version = args.version or f"rf-{datetime.utcnow():%Y%m%d%H%M%S}"
+            model = fit_genre_model(features, labels, version)
+        else:
+            model = build_placeholder_model()
+            model.version = args.version or model.version
+        save_genre_model(model, args.output)
+        print(f"Wrote genre model {model.version} to {args.output}")
+    else:
+        model = load_genre_model(args.path)
+        print(f"version:       {model.version}")
+        print(f"created:       {model.created_at:%Y-%m-%d %H:%M:%S} UTC")
+        print(f"scikit-learn:  {model.sklearn_version}")
+        print(f"genres:        {', '.join(model.genre_mapping.values())}")
+
+if __name__ == '__main__':
+    # Run from the importable module so pickled classes resolve as genre_model.*, not __main__.*
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from genre_model import main as genre_model_main
+    sys.exit(genre_model_main())
@@ -0,0 +1,308 @@
+"""
+Library Ingest - parallel metadata extraction for folder scans
+"""
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import stat
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar, Union
+
+import magic
+from mutagen import File as MutagenFile
+
+from artwork_store import ArtworkStore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+SUPPORTED_EXTENSIONS = {'.mp3', '.flac', '.wav', '.ogg', '.m4a', '.aac'}
+
+# Housekeeping directories NAS boxes and desktops drop into shared folders
+DEFAULT_EXCLUDED_DIRS = {'@eaDir', '#recycle', '#snapshot', '$RECYCLE.BIN', 'System Volume Information', 'lost+found'}
+
+def walk_audio_files(root: str, extensions: Set[str] = SUPPORTED_EXTENSIONS,
+                     excluded_dirs: Set[str] = DEFAULT_EXCLUDED_DIRS,
+                     unreadable_dirs: Optional[List[str]] = None) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (path, stat) for every audio file under root as the tree is walked.
+
+    Hidden and excluded directories are pruned without being entered, and
+    symlinked directories are not followed so link cycles cannot loop forever.
+    Subdirectories that cannot be read are skipped and appended to
+    ``unreadable_dirs``; an unreadable root raises.
+    """
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in excluded_dirs:
+                                stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                            yield entry.path, entry.stat()
+                    except OSError as e:
+                        logger.warning(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            if directory == str(root):
+                raise
+            logger.warning(f"Cannot read directory {directory}: {e}")
+            if unreadable_dirs is not None:
+                unreadable_dirs.append(directory)
+
+def walk_paths(paths: Iterable[str], extensions: Set[str] = SUPPORTED_EXTENSIONS,
+               excluded_dirs: Set[str] = DEFAULT_EXCLUDED_DIRS) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (path, stat) for audio files among specific paths, walking any directories.
+
+    Paths that no longer exist are skipped and nothing is yielded twice when
+    directories and files inside them are both listed.
+    """
+    seen = set()
+    for path in paths:
+        try:
+            path_stat = os.stat(path)
+        except OSError:
+            continue
+
+        if stat.S_ISDIR(path_stat.st_mode):
+            found = walk_audio_files(path, extensions, excluded_dirs)
+        elif os.path.splitext(path)[1].lower() in extensions:
+            found = [(path, path_stat)]
+        else:
+            continue
+
+        try:
+            for file_path, file_stat in found:
+                if file_path not in seen:
+                    seen.add(file_path)
+                    yield file_path, file_stat
+        except OSError as e:
+            # The directory vanished between stat and walk
+            logger.warning(f"Cannot read directory {path}: {e}")
+
+async def iterate_in_thread(iterator: Iterable[T], chunk_size: int = 256) -> AsyncIterator[T]:
+    """Drive a blocking iterator from the default thread pool, a chunk at a time"""
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterator)
+    while True:
+        chunk = await loop.run_in_executor(None, lambda: list(itertools.islice(iterator, chunk_size)))
+        if not chunk:
+            return
+        for item in chunk:
+            yield item
+
+def extract_audio_metadata(file_path: str, artwork_store: Optional[ArtworkStore] = None) -> Dict[str, Any]:
+    """Extract metadata from audio file"""
+    try:
+        audio_file = MutagenFile(file_path)
+        if audio_file is None:
+            return {}
+
+        metadata = {}
+
+        # Common metadata
+        metadata['title'] = audio_file.get('TIT2', [str(Path(file_path).stem)])[0] if audio_file.get('TIT2') else str(Path(file_path).stem)
+        metadata['artist'] = audio_file.get('TPE1', ['Unknown Artist'])[0] if audio_file.get('TPE1') else 'Unknown Artist'
+        metadata['album'] = audio_file.get('TALB', ['Unknown Album'])[0] if audio_file.get('TALB') else 'Unknown Album'
+        metadata['album_artist'] = audio_file.get('TPE2', [metadata['artist']])[0] if audio_file.get('TPE2') else metadata['artist']
+        metadata['genre'] = audio_file.get('TCON', ['Unknown'])[0] if audio_file.get('TCON') else 'Unknown'
+
+        # Try to get year
+        year_tag = audio_file.get('TDRC') or audio_file.get('TYER')
+        if year_tag:
+            try:
+                metadata['year'] = int(str(year_tag[0])[:4])
+            except:
+                metadata['year'] = None
+
+        # Track number
+        track_tag = audio_file.get('TRCK')
+        if track_tag:
+            try:
+                track_str = str(track_tag[0]).split('/')[0]
+                metadata['track_number'] = int(track_str)
+            except:
+                metadata['track_number'] = None
+
+        # Duration and quality info
+        if hasattr(audio_file, 'info'):
+            metadata['duration'] = getattr(audio_file.info, 'length', 0.0)
+            metadata['bitrate'] = getattr(audio_file.info, 'bitrate', 0)
+            metadata['sample_rate'] = getattr(audio_file.info, 'sample_rate', 0)
+
+        # Extract artwork into the content-addressed store, keeping only its hash
+        artwork_hash = None
+        if artwork_store and hasattr(audio_file, 'tags') and audio_file.tags:
+            for key in ['APIC:', 'APIC:Cover', 'APIC:Front Cover']:
+                if key in audio_file.tags:
+                    try:
+                        artwork_hash = artwork_store.put(audio_file.tags[key].data)
+                        break
+                    except:
+                        continue
+
+        metadata['artwork_hash'] = artwork_hash
+
+        return metadata
+    except Exception as e:
+        logger.error(f"Error extracting metadata from {file_path}: {e}")
+        return {}
+
+def get_file_format(file_path: str) -> str:
+    """Determine file format"""
+    try:
+        mime = magic.from_file(file_path, mime=True)
+        if 'flac' in mime:
+            return 'FLAC'
+        elif 'mpeg' in mime or 'mp3' in mime:
+            return 'MP3'
+        elif 'wav' in mime:
+            return 'WAV'
+        elif 'ogg' in mime:
+            return 'OGG'
+        else:
+            return Path(file_path).suffix.upper().lstrip('.')
+    except:
+        return Path(file_path).suffix.upper().lstrip('.')
+
+# Bytes hashed from each end of a file for its content fingerprint
+CONTENT_HASH_CHUNK_SIZE = 64 * 1024
+
+def compute_content_hash(file_path: str, file_size: int) -> str:
+    """Cheap content fingerprint from the file size plus its first and last 64 KiB.
+
+    It survives renames and moves but changes whenever tags or audio are
+    rewritten, which is what move detection and duplicate suppression need.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(file_size).encode())
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(CONTENT_HASH_CHUNK_SIZE))
+        if file_size > 2 * CONTENT_HASH_CHUNK_SIZE:
+            f.seek(-CONTENT_HASH_CHUNK_SIZE, os.SEEK_END)
+        digest.update(f.read(CONTENT_HASH_CHUNK_SIZE))
+    return digest.hexdigest()
+
+def probe_audio_file(file_path: str, artwork_store: Optional[ArtworkStore] = None) -> Dict[str, Any]:
+    """Collect everything the scanner needs for one file (runs inside an ingest worker)"""
+    try:
+        file_size = os.stat(file_path).st_size
+        return {
+            'file_path': file_path,
+            'metadata': extract_audio_metadata(file_path, artwork_store),
+            'file_format': get_file_format(file_path),
+            'file_size': file_size,
+            'content_hash': compute_content_hash(file_path, file_size),
+            'error': None
+        }
+    except Exception as e:
+        return {'file_path': file_path, 'error': str(e)}
+
+
+class IngestExecutor:
+    """Runs tag parsing and MIME sniffing for a scan in parallel, off the event loop"""
+
+    EXECUTOR_TYPES = ('process', 'thread')
+
+    def __init__(self, workers: Optional[int] = None, executor_type: str = 'process',
+                 queue_size: int = 256, artwork_store: Optional[ArtworkStore] = None):
+        if executor_type not in self.EXECUTOR_TYPES:
+            raise ValueError(f"Unknown ingest executor type: {executor_type}")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.executor_type = executor_type
+        self.queue_size = max(1, queue_size)
+        self.artwork_store = artwork_store
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        """Lazily create the worker pool so importing the server stays cheap"""
+        if self._executor is None:
+            if self.executor_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='ingest'
+                )
+            logger.info(f"Started {self.executor_type} ingest pool with {self.workers} workers")
+        return self._executor
+
+    async def probe_many(self, file_paths: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[Dict[str, Any]]:
+        """Probe files in parallel and yield results as they complete.
+
+        At most ``queue_size`` files are in flight or waiting to be consumed at
+        any time, so memory stays flat no matter how many paths are supplied.
+        Paths may come from an async iterable, so probing can start while the
+        caller is still discovering files.
+        """
+        loop = asyncio.get_running_loop()
+        # One spare slot so the end-of-stream marker never blocks
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size + 1)
+        slots = asyncio.Semaphore(self.queue_size)
+        done = object()
+        failures = []
+
+        async def probe_one(file_path: str):
+            try:
+                result = await loop.run_in_executor(
+                    self.executor, probe_audio_file, file_path, self.artwork_store
+                )
+            except Exception as e:
+                result = {'file_path': file_path, 'error': str(e)}
+            await results.put(result)
+
+        async def paths() -> AsyncIterator[str]:
+            if hasattr(file_paths, '__aiter__'):
+                async for file_path in file_paths:
+                    yield file_path
+            else:
+                for file_path in file_paths:
+                    yield file_path
+
+        async def produce():
+            pending = set()
+            try:
+                async for file_path in paths():
+                    await slots.acquire()
+                    task = asyncio.create_task(probe_one(str(file_path)))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                if pending:
+                    await asyncio.gather(*pending)
+            except Exception as e:
+                logger.error(f"Error feeding ingest workers: {e}")
+                failures.append(e)
+            finally:
+                for task in list(pending):
+                    task.cancel()
+                results.put_nowait(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                result = await results.get()
+                if result is done:
+                    break
+                slots.release()
+                yield result
+        finally:
+            producer.cancel()
+
+        # Surface errors from the path source instead of ending the stream silently
+        if failures:
+            raise failures[0]
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
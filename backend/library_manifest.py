@@ -0,0 +1,92 @@
+"""
+Library Manifest - per-folder file snapshots for incremental rescans
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+@dataclass
+class ManifestEntry:
+    path: str
+    size: int
+    mtime: float
+    inode: int
+
+    @classmethod
+    def from_stat(cls, path: str, stat_result: os.stat_result) -> 'ManifestEntry':
+        return cls(
+            path=path,
+            size=stat_result.st_size,
+            mtime=stat_result.st_mtime,
+            inode=stat_result.st_ino
+        )
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> 'ManifestEntry':
+        return cls(
+            path=document['path'],
+            size=document.get('size', 0),
+            mtime=document.get('mtime', 0.0),
+            inode=document.get('inode', 0)
+        )
+
+    def to_document(self, folder_id: str) -> Dict[str, Any]:
+        return {
+            'folder_id': folder_id,
+            'path': self.path,
+            'size': self.size,
+            'mtime': self.mtime,
+            'inode': self.inode
+        }
+
+    def same_content(self, other: 'ManifestEntry') -> bool:
+        """Size and mtime are the cheap signal that a file was rewritten"""
+        return self.size == other.size and self.mtime == other.mtime
+
+class ManifestDiffer:
+    """Classifies files against a folder's stored manifest as they are walked.
+
+    A file that appears at a new path with the inode, size and mtime of a
+    manifest entry whose path no longer exists is reported as a move rather
+    than an add, so the existing track can be re-pointed. Whatever was never seen by the end of
+    the walk has been removed.
+    """
+
+    UNCHANGED = 'unchanged'
+    ADDED = 'added'
+    MODIFIED = 'modified'
+    MOVED = 'moved'
+
+    def __init__(self, previous: Dict[str, ManifestEntry]):
+        self.previous = previous
+        self._by_inode: Dict[int, ManifestEntry] = {
+            entry.inode: entry for entry in previous.values() if entry.inode
+        }
+        self._seen = set()
+        self.counts = {change: 0 for change in (self.UNCHANGED, self.ADDED, self.MODIFIED, self.MOVED)}
+
+    def classify(self, entry: ManifestEntry) -> Tuple[str, Optional[ManifestEntry]]:
+        """Return the kind of change and, for moves, the entry the file moved from"""
+        self._seen.add(entry.path)
+        old = self.previous.get(entry.path)
+
+        if old is not None:
+            change = self.UNCHANGED if old.inode == entry.inode and old.same_content(entry) else self.MODIFIED
+        else:
+            old = self._by_inode.get(entry.inode) if entry.inode else None
+            # Inodes get reused after deletes, so a move must also keep size and mtime
+            if (old is not None and old.same_content(entry) and old.path not in self._seen
+                    and not os.path.lexists(old.path)):
+                self._seen.add(old.path)
+                del self._by_inode[entry.inode]
+                change = self.MOVED
+            else:
+                old = None
+                change = self.ADDED
+
+        self.counts[change] += 1
+        return change, old if change == self.MOVED else None
+
+    def removed(self) -> List[ManifestEntry]:
+        """Manifest entries not seen during the walk (call once the walk is complete)"""
+        return [entry for path, entry in self.previous.items() if path not in self._seen]
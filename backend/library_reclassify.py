@@ -0,0 +1,107 @@
+"""
+Library Reclassify - re-derive genre, mood and energy from stored audio features
+
+Usage (from backend/):
+    python library_reclassify.py [--all] [--chunk-size N]
+
+Only tracks classified with a different model or rule version are updated
+unless --all is given. No audio is decoded.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from audio_analyzer import AudioAnalyzer
+from background_jobs import BackgroundJob, JobRunner
+from bulk_writer import BulkWriter
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ReclassifyJob(BackgroundJob):
+    classification_version: str
+    only_outdated: bool = True
+    changed_genre: int = 0
+
+async def reclassify_library(tracks, analyzer: AudioAnalyzer, job: ReclassifyJob,
+                             chunk_size: int = 2000, write_batch_size: int = 1000):
+    """Stream stored feature vectors in chunks, classify each chunk in one pass and bulk-write the results"""
+    query: Dict[str, Any] = {"audio_features": {"$ne": None}}
+    if job.only_outdated:
+        query["classification_version"] = {"$ne": job.classification_version}
+
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    job.total_tracks = await tracks.count_documents(query)
+
+    async def classify_chunk(chunk: List[Dict[str, Any]]):
+        classifications = await loop.run_in_executor(
+            None, analyzer.classify_batch, [track['audio_features'] for track in chunk]
+        )
+        for track, classification in zip(chunk, classifications):
+            if classification['ai_genre'] != track.get('ai_genre'):
+                job.changed_genre += 1
+            await writer.update(
+                {"id": track['id']},
+                {"$set": {**classification, "classification_version": job.classification_version}}
+            )
+        job.processed += len(chunk)
+        job.elapsed_seconds = time.monotonic() - started
+
+    # Write batches are flushed by size only; the chunks keep them coming
+    async with BulkWriter(tracks, write_batch_size, max_interval=0) as writer:
+        chunk = []
+        async for track in tracks.find(
+            query, {"_id": 0, "id": 1, "audio_features": 1, "ai_genre": 1}
+        ).sort("_id", 1).batch_size(chunk_size):
+            chunk.append(track)
+            if len(chunk) >= chunk_size:
+                await classify_chunk(chunk)
+                chunk = []
+        await classify_chunk(chunk)
+
+    job.elapsed_seconds = time.monotonic() - started
+    if writer.stats.failed_operations:
+        raise RuntimeError(f"{writer.stats.failed_operations} track updates failed")
+    logger.info(
+        f"Reclassified {job.processed} tracks with {job.classification_version} "
+        f"in {job.elapsed_seconds:.1f}s ({job.changed_genre} changed genre)"
+    )
+
+def main(argv: Optional[List[str]] = None):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--all', action='store_true', help='reclassify every analyzed track')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='feature vectors classified per pass')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def run() -> ReclassifyJob:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        try:
+            analyzer = AudioAnalyzer()
+            job = ReclassifyJob(analyzer.classification_version, only_outdated=not args.all)
+            await JobRunner("library reclassification").run(job, lambda job: reclassify_library(
+                client[os.environ['DB_NAME']].tracks, analyzer, job, chunk_size=args.chunk_size
+            ))
+            return job
+        finally:
+            client.close()
+
+    job = asyncio.run(run())
+    print(f"{job.status}: {job.processed}/{job.total_tracks} tracks, {job.changed_genre} changed genre, "
+          f"{job.elapsed_seconds:.1f}s")
+    return 0 if job.status == "completed" else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
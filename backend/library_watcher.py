@@ -0,0 +1,165 @@
+"""
+Library Watcher - filesystem change events for continuous incremental indexing
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from library_ingest import DEFAULT_EXCLUDED_DIRS, SUPPORTED_EXTENSIONS
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+    WATCHDOG_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Handler for one coalesced batch: (folder_id, folder_path, {path: is_directory})
+ChangeHandler = Callable[[str, str, Dict[str, bool]], Awaitable[None]]
+
+class _FolderEventHandler(FileSystemEventHandler):
+    """Forwards relevant events for one folder from the observer thread to the event loop"""
+
+    EVENT_TYPES = {'created', 'deleted', 'modified', 'moved', 'closed'}
+
+    def __init__(self, watcher: 'LibraryWatcher', folder_id: str, root: str):
+        super().__init__()
+        self.watcher = watcher
+        self.folder_id = folder_id
+        self.root = root
+
+    def on_any_event(self, event):
+        if event.event_type not in self.EVENT_TYPES:
+            return
+        # A directory's own modify events only echo changes to its children
+        if event.is_directory and event.event_type in ('modified', 'closed'):
+            return
+
+        paths = [event.src_path]
+        if event.event_type == 'moved':
+            paths.append(event.dest_path)
+
+        changed = {path: event.is_directory for path in paths if self._is_relevant(path, event.is_directory)}
+        if changed:
+            self.watcher.record_threadsafe(self.folder_id, changed)
+
+    def _is_relevant(self, path: str, is_directory: bool) -> bool:
+        relative_parts = os.path.relpath(path, self.root).split(os.sep)
+        if any(part.startswith('.') or part in DEFAULT_EXCLUDED_DIRS for part in relative_parts):
+            return False
+        return is_directory or os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+
+class LibraryWatcher:
+    """Watches music folders and hands debounced, coalesced change batches to a handler.
+
+    A batch is flushed once no new event arrived for ``debounce`` seconds, or
+    at the latest ``max_delay`` seconds after its first event, so a long album
+    copy still shows up while it is in progress. Batches for the same folder
+    are applied one at a time.
+    """
+
+    def __init__(self, on_changes: ChangeHandler, debounce: float = 2.0, max_delay: float = 10.0):
+        if not WATCHDOG_AVAILABLE:
+            raise RuntimeError("Library watching requires the 'watchdog' package")
+
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._observer = Observer()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watches: Dict[str, object] = {}
+        self._roots: Dict[str, str] = {}
+        self._batches: Dict[str, Dict[str, bool]] = {}
+        self._batch_started: Dict[str, float] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Flushes in progress, kept referenced until they finish
+        self._flushes: Set[asyncio.Task] = set()
+
+    def start(self):
+        """Start the observer thread (must be called from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        self._observer.start()
+
+    def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in list(self._flushes):
+            task.cancel()
+        self._observer.stop()
+        self._observer.join(timeout=5)
+
+    def watch(self, folder_id: str, path: str):
+        if folder_id in self._watches:
+            return
+        try:
+            self._watches[folder_id] = self._observer.schedule(
+                _FolderEventHandler(self, folder_id, path), path, recursive=True
+            )
+            self._roots[folder_id] = path
+            logger.info(f"Watching {path} for library changes")
+        except OSError as e:
+            logger.error(f"Cannot watch {path}: {e}")
+
+    def unwatch(self, folder_id: str):
+        watch = self._watches.pop(folder_id, None)
+        if watch is not None:
+            self._observer.unschedule(watch)
+        self._roots.pop(folder_id, None)
+        self._batches.pop(folder_id, None)
+        timer = self._timers.pop(folder_id, None)
+        if timer:
+            timer.cancel()
+
+    def is_watching(self, folder_id: str) -> bool:
+        return folder_id in self._watches
+
+    def record_threadsafe(self, folder_id: str, changed: Dict[str, bool]):
+        """Called from the observer thread"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._record, folder_id, changed)
+
+    def _record(self, folder_id: str, changed: Dict[str, bool]):
+        if folder_id not in self._roots:
+            return
+
+        now = self._loop.time()
+        batch = self._batches.setdefault(folder_id, {})
+        if not batch:
+            self._batch_started[folder_id] = now
+        batch.update(changed)
+
+        timer = self._timers.pop(folder_id, None)
+        if timer:
+            timer.cancel()
+        delay = min(self.debounce, max(0.0, self._batch_started[folder_id] + self.max_delay - now))
+        self._timers[folder_id] = self._loop.call_later(delay, self._start_flush, folder_id)
+
+    def _start_flush(self, folder_id: str):
+        self._timers.pop(folder_id, None)
+        task = asyncio.create_task(self._flush(folder_id))
+        self._flushes.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error flushing library changes: {task.exception()}")
+
+    async def _flush(self, folder_id: str):
+        lock = self._locks.setdefault(folder_id, asyncio.Lock())
+        async with lock:
+            changed = self._batches.pop(folder_id, None)
+            root = self._roots.get(folder_id)
+            if not changed or root is None:
+                return
+            try:
+                await self.on_changes(folder_id, root, changed)
+            except Exception as e:
+                logger.error(f"Error applying library changes in {root}: {e}")
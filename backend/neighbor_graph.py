@@ -0,0 +1,184 @@
+"""
+Neighbor Graph - each track's top-K most similar tracks, materialized in MongoDB
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import DeleteMany, UpdateOne
+
+from background_jobs import BackgroundJob, JobRunner
+from bulk_writer import BulkWriter
+from neighbor_search import SimilaritySearch
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class NeighborGraphJob(BackgroundJob):
+    k: int
+
+class NeighborGraph:
+    """Top-``k`` neighbor lists, one document per track: ``{track_id, neighbors: [{id, score}], min_score}``.
+
+    A full build walks the feature index. Between builds the graph is kept
+    current incrementally: a newly analyzed track gets its own list, and
+    since cosine similarity is symmetric, the lists it can enter are nearly
+    always those of its own nearest tracks, so only the lists of its top
+    ``REVERSE_FACTOR * k`` are read and patched; an outlying track may miss
+    a new neighbor until the next full build. Lists that mention a removed
+    or re-analyzed track are recomputed. Changes are collected and applied
+    in batches every ``refresh_interval`` seconds. A refit of the feature
+    index changes every score, so it starts a full build instead.
+    """
+
+    # Tracks per chunk computed in the executor and written together
+    CHUNK_SIZE = 500
+
+    # How far beyond k a new track's neighbors are checked for lists it may enter
+    REVERSE_FACTOR = 4
+
+    def __init__(self, collection, search: SimilaritySearch, k: int = 50, refresh_interval: float = 5.0):
+        self.collection = collection
+        self.search = search
+        self.k = k
+        self.refresh_interval = refresh_interval
+        self._changed: Set[str] = set()
+        self._removed: Set[str] = set()
+        # Full builds, one at a time
+        self.builds: JobRunner[NeighborGraphJob] = JobRunner("neighbor graph build")
+        # Feature index generation the stored scores were computed in
+        self._generation: Optional[int] = None
+
+    def start_rebuild(self) -> NeighborGraphJob:
+        """Start a full build in the background, or return the one already running"""
+        return self.builds.start(NeighborGraphJob(k=self.k), self.rebuild)
+
+    def mark_changed(self, track_ids: Iterable[str]):
+        """Queue tracks whose features were added or changed"""
+        track_ids = set(track_ids)
+        self._removed -= track_ids
+        self._changed |= track_ids
+
+    def mark_removed(self, track_ids: Iterable[str]):
+        """Queue tracks that left the library or lost their features"""
+        track_ids = set(track_ids)
+        self._changed -= track_ids
+        self._removed |= track_ids
+
+    async def neighbors(self, track_id: str) -> Optional[List[Dict[str, Any]]]:
+        """The stored neighbor list of a track, best first, or None if it has none yet"""
+        document = await self.collection.find_one({"track_id": track_id}, {"_id": 0, "neighbors": 1})
+        return document["neighbors"] if document else None
+
+    def _nearest(self, track_ids: List[str], k: int) -> Dict[str, List[Tuple[str, float]]]:
+        """Neighbors of indexed tracks (runs in an executor)"""
+        nearest = {}
+        for track_id in track_ids:
+            features = self.search.index.features(track_id)
+            if features is not None:
+                nearest[track_id] = self.search.nearest(features, k, exclude=[track_id])
+        return nearest
+
+    def _list_update(self, track_id: str, neighbors: List[Tuple[str, float]]) -> UpdateOne:
+        stored = [{"id": neighbor_id, "score": round(score, 6)} for neighbor_id, score in neighbors]
+        return UpdateOne(
+            {"track_id": track_id},
+            {"$set": {
+                "neighbors": stored,
+                # Score a track must beat to enter a full list
+                "min_score": stored[-1]["score"] if len(stored) >= self.k else None,
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    async def rebuild(self, job: NeighborGraphJob):
+        """Recompute every track's list and drop the lists of tracks no longer indexed"""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        started_at = datetime.utcnow()
+        self._generation = self.search.index.generation
+        track_ids = self.search.index.track_ids()
+        job.total_tracks = len(track_ids)
+
+        async with BulkWriter(self.collection, self.CHUNK_SIZE, max_interval=0) as writer:
+            for i in range(0, len(track_ids), self.CHUNK_SIZE):
+                nearest = await loop.run_in_executor(None, self._nearest, track_ids[i:i + self.CHUNK_SIZE], self.k)
+                for track_id, neighbors in nearest.items():
+                    await writer.add(self._list_update(track_id, neighbors))
+                job.processed += len(nearest)
+                job.elapsed_seconds = time.monotonic() - started
+            await writer.add(DeleteMany({"updated_at": {"$lt": started_at}}))
+
+        job.elapsed_seconds = time.monotonic() - started
+        if writer.stats.failed_operations:
+            raise RuntimeError(f"{writer.stats.failed_operations} neighbor list writes failed")
+        logger.info(f"Built neighbor graph of {job.processed} tracks in {job.elapsed_seconds:.1f}s")
+
+    async def refresh(self, changed: Set[str], removed: Set[str]):
+        """Bring the graph up to date with changed and removed tracks"""
+        loop = asyncio.get_running_loop()
+        nearest = await loop.run_in_executor(None, self._nearest, list(changed), self.k * self.REVERSE_FACTOR)
+        operations = [self._list_update(track_id, neighbors[:self.k]) for track_id, neighbors in nearest.items()]
+
+        # Changed tracks offered to the lists of their own neighbors
+        offers: Dict[str, Dict[str, float]] = {}
+        for track_id, neighbors in nearest.items():
+            for neighbor_id, score in neighbors:
+                if neighbor_id not in changed:
+                    offers.setdefault(neighbor_id, {})[track_id] = score
+
+        # Lists that point at removed or re-analyzed tracks are recomputed from scratch
+        stale = set(await self.collection.distinct("track_id", {"neighbors.id": {"$in": list(changed | removed)}}))
+        stale -= changed | removed
+        if removed:
+            operations.append(DeleteMany({"track_id": {"$in": list(removed)}}))
+
+        async for document in self.collection.find(
+            {"track_id": {"$in": [track_id for track_id in offers if track_id not in stale]}},
+            {"_id": 0, "track_id": 1, "neighbors": 1, "min_score": 1}
+        ):
+            candidates = offers[document["track_id"]]
+            min_score = document.get("min_score")
+            if min_score is not None and max(candidates.values()) <= min_score:
+                continue
+            merged = {neighbor["id"]: neighbor["score"] for neighbor in document["neighbors"]}
+            merged.update(candidates)
+            neighbors = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:self.k]
+            operations.append(self._list_update(document["track_id"], neighbors))
+
+        if stale:
+            recomputed = await loop.run_in_executor(None, self._nearest, list(stale), self.k)
+            operations.extend(self._list_update(track_id, neighbors) for track_id, neighbors in recomputed.items())
+
+        async with BulkWriter(self.collection, self.CHUNK_SIZE, max_interval=0) as writer:
+            for operation in operations:
+                await writer.add(operation)
+        if changed or removed:
+            logger.info(
+                f"Refreshed neighbor graph: {len(nearest)} new lists, {len(operations) - len(nearest)} patched"
+            )
+
+    async def run_refresher(self):
+        """Apply queued changes every ``refresh_interval`` seconds until cancelled"""
+        if self._generation is None:
+            self._generation = self.search.index.generation
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if self._generation != self.search.index.generation and not self.builds.running:
+                logger.info("Feature index was refitted; rebuilding the neighbor graph")
+                self.start_rebuild()
+            if not self._changed and not self._removed:
+                continue
+            changed, self._changed = self._changed, set()
+            removed, self._removed = self._removed, set()
+            try:
+                await self.refresh(changed, removed)
+            except Exception as e:
+                logger.error(f"Error refreshing neighbor graph: {e}")
+                # Try again with the next batch
+                self._changed |= changed
+                self._removed |= removed
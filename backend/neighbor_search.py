@@ -0,0 +1,222 @@
+"""
+Neighbor Search - pluggable exact and approximate nearest-neighbor backends over the feature index
+"""
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from feature_index import FeatureIndex
+
+logger = logging.getLogger(__name__)
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions and values of the ``k`` highest finite scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    top = top[np.isfinite(scores[top])]
+    return top, scores[top]
+
+class NeighborSearch(ABC):
+    """Finds the rows most similar to a query among unit-length row vectors.
+
+    ``fit`` takes the feature index matrix and its validity mask; ``query``
+    returns matrix rows and cosine similarities, best first.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def fit(self, vectors: np.ndarray, valid: np.ndarray) -> 'NeighborSearch':
+        ...
+
+    @abstractmethod
+    def query(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ...
+
+class ExactSearch(NeighborSearch):
+    """Brute force: one matrix-vector product over every row"""
+
+    name = 'exact'
+
+    def fit(self, vectors: np.ndarray, valid: np.ndarray) -> 'ExactSearch':
+        self._vectors = vectors
+        self._valid = valid
+        return self
+
+    def query(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self._vectors @ query
+        scores[~self._valid] = -np.inf
+        return top_k(scores, k)
+
+class BallTreeSearch(NeighborSearch):
+    """Ball tree over the unit vectors.
+
+    On the unit sphere Euclidean distance orders neighbors exactly like
+    cosine similarity (cos = 1 - d^2 / 2), so results are exact; with the
+    handful of dimensions the features have, queries visit O(log N) nodes.
+    ``leaf_size`` trades tree depth against brute-force work per leaf.
+    """
+
+    name = 'balltree'
+
+    def __init__(self, leaf_size: int = 40):
+        self.leaf_size = leaf_size
+
+    def fit(self, vectors: np.ndarray, valid: np.ndarray) -> 'BallTreeSearch':
+        self._rows = np.flatnonzero(valid)
+        self._tree = BallTree(vectors[self._rows], leaf_size=self.leaf_size) if len(self._rows) else None
+        return self
+
+    def query(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(self._rows))
+        if self._tree is None or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        distances, positions = self._tree.query(query[None, :], k=k)
+        return self._rows[positions[0]], (1.0 - distances[0] ** 2 / 2).astype(np.float32)
+
+class LSHSearch(NeighborSearch):
+    """Random-hyperplane LSH for cosine similarity, with candidates re-ranked exactly.
+
+    Each of ``tables`` hash tables signs the vectors against ``bits`` random
+    hyperplanes; a query collects the rows in its own bucket and, with
+    ``probes`` > 0, in every bucket up to that many bit flips away. More
+    tables or probes raise recall and latency; more bits shrink buckets,
+    lowering both. If too few candidates turn up, the query is answered by
+    brute force.
+    """
+
+    name = 'lsh'
+
+    def __init__(self, tables: int = 8, bits: int = 16, probes: int = 1, seed: int = 0):
+        if not 0 < bits <= 30:
+            raise ValueError("LSH bits must be between 1 and 30")
+        self.tables = tables
+        self.bits = bits
+        self.probes = probes
+        self.seed = seed
+        # XOR masks of every bucket within ``probes`` bit flips
+        self._probe_masks = np.array([0] + [
+            sum(1 << bit for bit in flipped)
+            for distance in range(1, probes + 1)
+            for flipped in combinations(range(bits), distance)
+        ], dtype=np.int32)
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        """Bucket code of every vector in every table: (tables, n) int32"""
+        signs = np.einsum('nd,tbd->tnb', vectors, self._planes) > 0
+        return (signs * (1 << np.arange(self.bits))).sum(axis=-1).astype(np.int32)
+
+    def fit(self, vectors: np.ndarray, valid: np.ndarray) -> 'LSHSearch':
+        rng = np.random.default_rng(self.seed)
+        self._planes = rng.standard_normal((self.tables, self.bits, vectors.shape[1])).astype(np.float32)
+        self._rows = np.flatnonzero(valid)
+        self._vectors = np.ascontiguousarray(vectors[self._rows])
+        # Per table, row positions sorted by code, so a bucket is one searchsorted range
+        codes = self._codes(self._vectors)
+        self._order = np.argsort(codes, axis=1, kind='stable').astype(np.int32)
+        self._sorted_codes = np.take_along_axis(codes, self._order, axis=1)
+        return self
+
+    def query(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        query_codes = self._codes(query[None, :])[:, 0]
+        buckets = []
+        for table, code in enumerate(query_codes):
+            probes = code ^ self._probe_masks
+            starts = np.searchsorted(self._sorted_codes[table], probes, side='left')
+            ends = np.searchsorted(self._sorted_codes[table], probes, side='right')
+            buckets.extend(self._order[table, start:end] for start, end in zip(starts, ends) if end > start)
+
+        candidates = np.unique(np.concatenate(buckets)) if buckets else np.zeros(0, dtype=np.int32)
+        if len(candidates) < min(k, len(self._rows)):
+            candidates = np.arange(len(self._rows))
+        positions, scores = top_k(self._vectors[candidates] @ query, k)
+        return self._rows[candidates[positions]], scores
+
+NEIGHBOR_BACKENDS: Dict[str, Type[NeighborSearch]] = {
+    backend.name: backend for backend in (ExactSearch, BallTreeSearch, LSHSearch)
+}
+
+def create_neighbor_search(backend: str, **options) -> NeighborSearch:
+    if backend not in NEIGHBOR_BACKENDS:
+        raise ValueError(f"Unknown neighbor search backend: {backend}")
+    return NEIGHBOR_BACKENDS[backend](**options)
+
+class SimilaritySearch:
+    """Nearest-neighbor lookups over a FeatureIndex through a pluggable backend.
+
+    Libraries smaller than ``exact_threshold`` are searched by brute force,
+    which is as fast as any index at that size and always current. Larger
+    ones go through the backend, built from a snapshot of the index and
+    rebuilt on the first query at least ``rebuild_interval`` seconds after
+    the last build once the index has changed; tracks added in between are
+    found after the next rebuild, removed ones are filtered out right away.
+    A refit of the index renormalizes every vector, so it triggers a rebuild
+    on the next query regardless of the interval. Builds run in the calling
+    thread, so call from an executor.
+    """
+
+    def __init__(self, index: FeatureIndex, backend: str = 'balltree', exact_threshold: int = 20000,
+                 rebuild_interval: float = 60.0, **options):
+        if backend not in NEIGHBOR_BACKENDS:
+            raise ValueError(f"Unknown neighbor search backend: {backend}")
+        self.index = index
+        self.backend = backend
+        self.exact_threshold = exact_threshold
+        self.rebuild_interval = rebuild_interval
+        self.options = options
+        self._searcher: Optional[NeighborSearch] = None
+        self._row_ids: List[Optional[str]] = []
+        self._built_version = -1
+        self._built_generation = -1
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self) -> Tuple[NeighborSearch, List[Optional[str]]]:
+        with self._lock:
+            stale = self._built_version != self.index.version
+            refitted = self._built_generation != self.index.generation
+            if self._searcher is None or refitted or (
+                stale and time.monotonic() - self._built_at >= self.rebuild_interval
+            ):
+                # Read before the snapshot, so a refit in between only causes another rebuild
+                generation = self.index.generation
+                vectors, valid, row_ids, version = self.index.snapshot()
+                started = time.perf_counter()
+                self._searcher = create_neighbor_search(self.backend, **self.options).fit(vectors, valid)
+                self._row_ids, self._built_version, self._built_at = row_ids, version, time.monotonic()
+                self._built_generation = generation
+                logger.info(
+                    f"Built {self.backend} neighbor search over {int(valid.sum())} tracks "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            return self._searcher, self._row_ids
+
+    def nearest(self, features: Dict[str, float], k: int,
+                exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Up to ``k`` (track id, cosine similarity) pairs most similar to ``features``, best first"""
+        exclude = set(exclude)
+        # Room for excluded tracks and for tracks removed since the last build
+        wanted = k + len(exclude) + 8
+
+        if self.backend == 'exact' or len(self.index) < self.exact_threshold:
+            rows, scores = top_k(self.index.similarities(features), wanted)
+            row_ids = self.index.row_ids(rows)
+        else:
+            searcher, ids = self._current()
+            rows, scores = searcher.query(self.index.normalize(self.index.vectorize(features)), wanted)
+            row_ids = [ids[row] for row in rows]
+
+        neighbors = [
+            (track_id, float(score)) for track_id, score in zip(row_ids, scores)
+            if track_id is not None and track_id not in exclude and track_id in self.index
+        ]
+        return neighbors[:k]
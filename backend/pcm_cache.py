@@ -0,0 +1,67 @@
+"""
+PCM Cache - decoded analysis windows on disk as memory-mapped NumPy arrays
+"""
+import io
+import logging
+from typing import Optional
+
+import numpy as np
+
+from disk_cache import DiskLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Recorded as the decoder of windows read back from the cache
+PCM_CACHE = 'pcm_cache'
+
+class PCMCache:
+    """Size-capped LRU cache of decoded, resampled mono analysis windows.
+
+    Each window is a ``.npy`` file keyed by content hash and everything that
+    shapes the decoded signal (sample rate, resampler, offset and duration),
+    so new features or changed feature parameters can be extracted again
+    without running the codec. Reads are memory-mapped: the OS pages the
+    samples in and shares them between workers. Instances can be handed to
+    worker processes; the workers share one directory and one cap.
+    """
+
+    # How often each process re-indexes the files the other workers wrote
+    REFRESH_INTERVAL = 60.0
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._cache = DiskLRUCache(root, max_bytes, refresh_interval=self.REFRESH_INTERVAL)
+
+    def __getstate__(self):
+        return {'root': self.root, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'], state['max_bytes'])
+
+    @staticmethod
+    def key(content_hash: str, sample_rate: int, res_type: str, offset: float, duration: Optional[float]) -> str:
+        window = f"{offset:.3f}-{duration:.3f}" if duration is not None else f"{offset:.3f}-end"
+        return f"{content_hash[:2]}/{content_hash}-{sample_rate}-{res_type}-{window}.npy"
+
+    def get(self, content_hash: str, sample_rate: int, res_type: str, offset: float,
+            duration: Optional[float]) -> Optional[np.ndarray]:
+        """The cached window as a read-only memory-mapped array, or None on a miss"""
+        path = self._cache.get(self.key(content_hash, sample_rate, res_type, offset, duration))
+        if path is None:
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            # Evicted by another worker in the meantime, or unreadable
+            logger.debug(f"PCM cache entry {path} could not be opened: {e}")
+            return None
+
+    def put(self, content_hash: str, sample_rate: int, res_type: str, offset: float,
+            duration: Optional[float], y: np.ndarray):
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(y, dtype=np.float32))
+        try:
+            self._cache.put(self.key(content_hash, sample_rate, res_type, offset, duration), buffer.getvalue())
+        except OSError as e:
+            logger.warning(f"PCM cache write failed: {e}")
@@ -0,0 +1,257 @@
+"""
+Scan Jobs - per-folder scan job tracking, deduplication and concurrency limits
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ScanJob:
+    folder_id: str
+    folder_path: str
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    current_folder: Optional[str] = None
+    total_files: int = 0
+    processed_files: int = 0
+    walk_complete: bool = False
+    ai_total: int = 0
+    ai_processed: int = 0
+    ai_failed: int = 0
+    changes: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+    resumed_from: Optional[str] = None
+    analysis_profile: Optional[str] = None  # None: the analysis pool's default
+    # Monotonic start times of the scan and analysis phases, for throughput
+    scan_started: Optional[float] = None
+    ai_started: Optional[float] = None
+
+    ACTIVE_STATUSES = ("queued", "scanning", "ai_processing")
+    # Runtime-only fields that are not checkpointed
+    TRANSIENT_FIELDS = ("scan_started", "ai_started")
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in self.ACTIVE_STATUSES
+
+    def start_phase(self, status: str):
+        self.status = status
+        if status == "scanning":
+            self.scan_started = time.monotonic()
+        elif status == "ai_processing":
+            self.ai_started = time.monotonic()
+
+    def to_document(self) -> Dict[str, Any]:
+        document = asdict(self)
+        for name in self.TRANSIENT_FIELDS:
+            del document[name]
+        return document
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> 'ScanJob':
+        names = {f.name for f in fields(cls)} - set(cls.TRANSIENT_FIELDS)
+        return cls(**{key: value for key, value in document.items() if key in names})
+
+    def _throughput(self, started: Optional[float], done: int, total: Optional[int]) -> Dict[str, Optional[float]]:
+        elapsed = time.monotonic() - started if started else 0.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 and total is not None else None
+        return {"per_second": round(rate, 2), "eta_seconds": round(eta, 1) if eta is not None else None}
+
+    def to_dict(self) -> Dict[str, Any]:
+        scan = self._throughput(
+            self.scan_started, self.processed_files, self.total_files if self.walk_complete else None
+        )
+        analysis = self._throughput(self.ai_started, self.ai_processed + self.ai_failed, self.ai_total)
+        if self.status == "scanning":
+            eta_seconds = scan["eta_seconds"]
+        elif self.status == "ai_processing":
+            eta_seconds = analysis["eta_seconds"]
+        else:
+            eta_seconds = None
+
+        return {
+            "id": self.id,
+            "folder_id": self.folder_id,
+            "folder_path": self.folder_path,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "current_folder": self.current_folder,
+            "total_files": self.total_files,
+            "processed_files": self.processed_files,
+            "walk_complete": self.walk_complete,
+            "ai_total": self.ai_total,
+            "ai_processed": self.ai_processed,
+            "ai_failed": self.ai_failed,
+            "changes": self.changes,
+            "error": self.error,
+            "resumed_from": self.resumed_from,
+            "analysis_profile": self.analysis_profile,
+            "files_per_second": scan["per_second"],
+            "tracks_analyzed_per_second": analysis["per_second"],
+            "eta_seconds": eta_seconds
+        }
+
+class ScanJobManager:
+    """Runs folder scans as tracked jobs.
+
+    At most one scan per folder runs at a time and at most ``max_concurrent``
+    run overall. Requesting a scan for a folder that already has one waiting
+    with the same analysis profile returns the waiting job, so any number of
+    identical requests made while a scan is running coalesce into a single
+    follow-up scan.
+
+    With a ``collection``, job records are checkpointed to MongoDB every
+    ``checkpoint_interval`` seconds and on every state change, so jobs cut
+    short by a restart can be found again with ``load_interrupted``.
+    """
+
+    def __init__(self, run_job: Callable[[ScanJob], Awaitable[None]], max_concurrent: int = 2,
+                 history_size: int = 50, collection=None, checkpoint_interval: float = 5.0):
+        self.run_job = run_job
+        self.max_concurrent = max(1, max_concurrent)
+        self.history_size = history_size
+        self.collection = collection
+        self.checkpoint_interval = checkpoint_interval
+        self._jobs: Dict[str, ScanJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._queued: Dict[Tuple[str, Optional[str]], ScanJob] = {}
+        self._folder_locks: Dict[str, asyncio.Lock] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._shutting_down = False
+
+    def folder_lock(self, folder_id: str) -> asyncio.Lock:
+        """Lock held while a folder is being scanned; other writers to the folder take it too"""
+        return self._folder_locks.setdefault(folder_id, asyncio.Lock())
+
+    def submit(self, folder_id: str, folder_path: str, resumed_from: Optional[str] = None,
+               analysis_profile: Optional[str] = None) -> ScanJob:
+        """Queue a scan of a folder, or return the identical scan already waiting for it"""
+        queued = self._queued.get((folder_id, analysis_profile))
+        if queued is not None:
+            return queued
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        job = ScanJob(
+            folder_id=folder_id, folder_path=folder_path, resumed_from=resumed_from,
+            analysis_profile=analysis_profile
+        )
+        self._jobs[job.id] = job
+        self._queued[(folder_id, analysis_profile)] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        self._prune_history()
+        return job
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        return self._jobs.get(job_id)
+
+    def list(self, folder_id: Optional[str] = None, active_only: bool = False) -> List[ScanJob]:
+        """Jobs, newest first"""
+        jobs = [
+            job for job in self._jobs.values()
+            if (folder_id is None or job.folder_id == folder_id) and (job.is_active or not active_only)
+        ]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it is unknown or already finished"""
+        job = self._jobs.get(job_id)
+        task = self._tasks.get(job_id)
+        if job is None or task is None or not job.is_active:
+            return False
+        task.cancel()
+        return True
+
+    def cancel_folder(self, folder_id: str):
+        for job in self.list(folder_id, active_only=True):
+            self.cancel(job.id)
+
+    async def load_interrupted(self) -> List[ScanJob]:
+        """Load recent job history and return the jobs the previous process did not finish.
+
+        Jobs still marked active crashed with the process and are marked as
+        interrupted. Only the latest job per folder is returned, so a folder is
+        resumed once even if it was interrupted repeatedly; the caller decides
+        whether to scan it again.
+        """
+        if self.collection is None:
+            return []
+
+        await self.collection.update_many(
+            {"status": {"$in": list(ScanJob.ACTIVE_STATUSES)}},
+            {"$set": {"status": "interrupted", "finished_at": datetime.utcnow()}}
+        )
+
+        latest_by_folder: Dict[str, ScanJob] = {}
+        async for document in self.collection.find({}, {"_id": 0}).sort("created_at", -1).limit(self.history_size):
+            job = ScanJob.from_document(document)
+            self._jobs.setdefault(job.id, job)
+            latest_by_folder.setdefault(job.folder_id, job)
+        return [job for job in latest_by_folder.values() if job.status == "interrupted"]
+
+    async def shutdown(self):
+        """Stop all jobs, checkpointing them as interrupted so the next start resumes them"""
+        self._shutting_down = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: ScanJob):
+        checkpoints = None
+        try:
+            await self._checkpoint(job)
+            async with self.folder_lock(job.folder_id), self._semaphore:
+                if self._queued.get((job.folder_id, job.analysis_profile)) is job:
+                    del self._queued[(job.folder_id, job.analysis_profile)]
+                job.started_at = datetime.utcnow()
+                job.start_phase("scanning")
+                checkpoints = asyncio.create_task(self._checkpoint_periodically(job))
+                await self.run_job(job)
+                job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "interrupted" if self._shutting_down else "cancelled"
+            logger.info(f"Scan of {job.folder_path} {job.status}")
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            logger.error(f"Error scanning folder {job.folder_path}: {e}")
+        finally:
+            if checkpoints is not None:
+                checkpoints.cancel()
+            if self._queued.get((job.folder_id, job.analysis_profile)) is job:
+                del self._queued[(job.folder_id, job.analysis_profile)]
+            job.finished_at = datetime.utcnow()
+            self._tasks.pop(job.id, None)
+            await self._checkpoint(job)
+
+    async def _checkpoint(self, job: ScanJob):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.replace_one({"id": job.id}, job.to_document(), upsert=True)
+        except Exception as e:
+            logger.error(f"Error checkpointing scan job {job.id}: {e}")
+
+    async def _checkpoint_periodically(self, job: ScanJob):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self._checkpoint(job)
+
+    def _prune_history(self):
+        finished = [job for job in self.list() if not job.is_active]
+        for job in finished[self.history_size:]:
+            del self._jobs[job.id]
@@ -1,31 +1,46 @@
-from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, BackgroundTasks, Request
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, DeleteOne, UpdateMany
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Set, Tuple
 import uuid
 from datetime import datetime, timedelta
 import asyncio
 import json
-from mutagen import File as MutagenFile
-from mutagen.id3 import ID3NoHeaderError
-import magic
+import re
 import hashlib
-import io
 import base64
-from PIL import Image
 import sys
 from pathlib import Path
 backend_dir = Path(__file__).parent
 sys.path.insert(0, str(backend_dir))
-from audio_analyzer import AudioAnalyzer, RecommendationEngine
+from audio_analyzer import (
+    ANALYSIS_PROFILES, ANALYZER_VERSION, DEFAULT_ANALYSIS_PROFILE, LEGACY_STAND_IN_FEATURES,
+    PROFILE_VERSIONS, PROFILES_CHANGED_IN_VERSION, AudioAnalyzer, RecommendationEngine
+)
 from playlist_ai import PlaylistAI
+from library_ingest import IngestExecutor, iterate_in_thread, walk_audio_files, walk_paths
+from library_watcher import LibraryWatcher, WATCHDOG_AVAILABLE
+from library_manifest import ManifestDiffer, ManifestEntry
+from bulk_writer import BulkWriter
+from artwork_store import ArtworkStore, ArtworkThumbnailer
+from scan_jobs import ScanJob, ScanJobManager
+from analysis_pool import PRIORITY_BACKFILL, PRIORITY_PLAYBACK, PRIORITY_QUEUED, AnalysisPool, failure_reason
+from feature_cache import FeatureCache
+from pcm_cache import PCMCache
+from library_reclassify import ReclassifyJob, reclassify_library
+from background_jobs import JobRunner
+from disk_cache import DiskLRUCache
+from feature_index import FeatureIndex
+from neighbor_search import SimilaritySearch
+from neighbor_graph import NeighborGraph
 import numpy as np
 
 ROOT_DIR = Path(__file__).parent
@@ -38,9 +53,79 @@ db = client[os.environ['DB_NAME']]
 
 # Initialize AI components
 audio_analyzer = AudioAnalyzer()
-recommendation_engine = RecommendationEngine(audio_analyzer)
+# Standardized feature vectors of every analyzed track, kept in memory for similarity lookups
+feature_index = FeatureIndex()
+recommendation_engine = RecommendationEngine(audio_analyzer, feature_index)
+# Nearest-neighbor lookups over the feature index; libraries below the threshold are searched exactly
+SIMILARITY_BACKEND = os.environ.get('SIMILARITY_BACKEND', 'balltree')
+similarity_search = SimilaritySearch(
+    feature_index, SIMILARITY_BACKEND,
+    exact_threshold=int(os.environ.get('SIMILARITY_EXACT_THRESHOLD', 20000)),
+    rebuild_interval=float(os.environ.get('SIMILARITY_REBUILD_INTERVAL', 60)),
+    **({
+        'tables': int(os.environ.get('SIMILARITY_LSH_TABLES', 8)),
+        'bits': int(os.environ.get('SIMILARITY_LSH_BITS', 16)),
+        'probes': int(os.environ.get('SIMILARITY_LSH_PROBES', 1))
+    } if SIMILARITY_BACKEND == 'lsh' else {})
+)
+# Every track's top-K neighbors materialized in the database, refreshed as tracks are analyzed or removed
+neighbor_graph = NeighborGraph(
+    db.track_neighbors, similarity_search,
+    k=int(os.environ.get('NEIGHBOR_GRAPH_K', 50)),
+    refresh_interval=float(os.environ.get('NEIGHBOR_GRAPH_REFRESH_INTERVAL', 5))
+)
 playlist_ai = PlaylistAI()
 
+# Content-addressed cover art, referenced from tracks by hash
+artwork_store = ArtworkStore(os.environ.get('ARTWORK_DIR', str(ROOT_DIR / 'artwork')))
+artwork_thumbnailer = ArtworkThumbnailer(
+    artwork_store,
+    DiskLRUCache(
+        os.environ.get('THUMBNAIL_CACHE_DIR', str(ROOT_DIR / 'artwork_thumbnails')),
+        max_bytes=int(os.environ.get('THUMBNAIL_CACHE_MB', 256)) * 1024 * 1024
+    )
+)
+
+# Parallel metadata ingest for folder scans
+ingest_executor = IngestExecutor(
+    workers=int(os.environ.get('INGEST_WORKERS', 0)) or None,
+    executor_type=os.environ.get('INGEST_EXECUTOR', 'process'),
+    queue_size=int(os.environ.get('INGEST_QUEUE_SIZE', 256)),
+    artwork_store=artwork_store
+)
+
+# Audio analysis off the event loop, one analyzer per worker, with a time
+# budget per file and optionally an address-space cap per worker; extracted
+# features are also kept in an on-disk cache that outlives the database, and
+# optionally the decoded PCM as well
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', str(ROOT_DIR / 'feature_cache'))
+PCM_CACHE_DIR = os.environ.get('PCM_CACHE_DIR', '')
+analysis_pool = AnalysisPool(
+    workers=int(os.environ.get('ANALYSIS_WORKERS', 0)) or None,
+    executor_type=os.environ.get('ANALYSIS_EXECUTOR', 'process'),
+    profile=os.environ.get('ANALYSIS_PROFILE', DEFAULT_ANALYSIS_PROFILE),
+    feature_cache=FeatureCache(
+        os.path.join(FEATURE_CACHE_DIR, 'features.sqlite3'), PROFILE_VERSIONS
+    ) if FEATURE_CACHE_DIR else None,
+    pcm_cache=PCMCache(
+        PCM_CACHE_DIR, max_bytes=int(os.environ.get('PCM_CACHE_MB', 4096)) * 1024 * 1024
+    ) if PCM_CACHE_DIR else None,
+    timeout=float(os.environ.get('ANALYSIS_TIMEOUT', 120)) or None,
+    # Virtual address space a process worker may map beyond its warmed-up footprint (see AnalysisPool); 0 disables
+    memory_limit_mb=int(os.environ.get('ANALYSIS_MEMORY_LIMIT_MB', 2048)) or None
+)
+
+# Failed analyses are retried after ANALYSIS_RETRY_BASE seconds, doubling per failure up to ANALYSIS_RETRY_MAX
+ANALYSIS_RETRY_BASE = float(os.environ.get('ANALYSIS_RETRY_BASE', 3600))
+ANALYSIS_RETRY_MAX = float(os.environ.get('ANALYSIS_RETRY_MAX', 7 * 24 * 3600))
+
+# Library-wide reclassification from stored features, one at a time
+reclassify_jobs: JobRunner[ReclassifyJob] = JobRunner("library reclassification")
+
+# Optional live library watcher, started on app startup
+LIBRARY_WATCH_ENABLED = os.environ.get('LIBRARY_WATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+library_watcher: Optional[LibraryWatcher] = None
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -75,7 +160,9 @@ class Track(BaseModel):
     sample_rate: Optional[int] = None
     file_format: str
     file_size: int
-    artwork_data: Optional[str] = None
+    content_hash: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    artwork_hash: Optional[str] = None
     # AI-Enhanced fields
     audio_features: Optional[Dict[str, float]] = None
     ai_genre: Optional[str] = None
@@ -83,6 +170,11 @@ class Track(BaseModel):
     mood: Optional[str] = None
     energy: Optional[float] = None
     popularity_score: Optional[float] = None
+    analysis_profile: Optional[str] = None
+    analysis_stats: Optional[Dict[str, Any]] = None  # decoder and timings of the last analysis
+    analyzer_version: Optional[str] = None  # feature extraction version
+    classification_version: Optional[str] = None  # genre model and rule version
+    analysis_failure: Optional[Dict[str, Any]] = None  # reason, attempts and next retry of a failed analysis
     # Analytics
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_played: Optional[datetime] = None
@@ -165,211 +257,582 @@ class ScanStatus(BaseModel):
     ai_processing: bool = False
     ai_processed: int = 0
 
-# Global scan status
-scan_status = ScanStatus()
+# Fields derived from a file's audio content, reset when the file changes
+ANALYSIS_FIELDS = [
+    'audio_features', 'ai_genre', 'ai_genre_confidence', 'mood', 'energy', 'analysis_profile', 'analysis_stats',
+    'analyzer_version', 'classification_version', 'analysis_failure'
+]
 
 # Helper functions
-def extract_audio_metadata(file_path: str) -> Dict[str, Any]:
-    """Extract metadata from audio file"""
-    try:
-        audio_file = MutagenFile(file_path)
-        if audio_file is None:
-            return {}
-        
-        metadata = {}
-        
-        # Common metadata
-        metadata['title'] = audio_file.get('TIT2', [str(Path(file_path).stem)])[0] if audio_file.get('TIT2') else str(Path(file_path).stem)
-        metadata['artist'] = audio_file.get('TPE1', ['Unknown Artist'])[0] if audio_file.get('TPE1') else 'Unknown Artist'
-        metadata['album'] = audio_file.get('TALB', ['Unknown Album'])[0] if audio_file.get('TALB') else 'Unknown Album'
-        metadata['album_artist'] = audio_file.get('TPE2', [metadata['artist']])[0] if audio_file.get('TPE2') else metadata['artist']
-        metadata['genre'] = audio_file.get('TCON', ['Unknown'])[0] if audio_file.get('TCON') else 'Unknown'
-        
-        # Try to get year
-        year_tag = audio_file.get('TDRC') or audio_file.get('TYER')
-        if year_tag:
-            try:
-                metadata['year'] = int(str(year_tag[0])[:4])
-            except:
-                metadata['year'] = None
-        
-        # Track number
-        track_tag = audio_file.get('TRCK')
-        if track_tag:
-            try:
-                track_str = str(track_tag[0]).split('/')[0]
-                metadata['track_number'] = int(track_str)
-            except:
-                metadata['track_number'] = None
-        
-        # Duration and quality info
-        if hasattr(audio_file, 'info'):
-            metadata['duration'] = getattr(audio_file.info, 'length', 0.0)
-            metadata['bitrate'] = getattr(audio_file.info, 'bitrate', 0)
-            metadata['sample_rate'] = getattr(audio_file.info, 'sample_rate', 0)
+async def store_audio_intelligence(analyzed: List[Tuple[Dict[str, Any], Dict[str, Any]]], writer: BulkWriter):
+    """Classify a batch of analyzed tracks in one vectorized pass and queue their updates"""
+    if not analyzed:
+        return
+    
+    # Genre, mood and energy for the whole batch with a single predict_proba
+    loop = asyncio.get_running_loop()
+    classifications = await loop.run_in_executor(
+        None, audio_analyzer.classify_batch, [result['audio_features'] for _, result in analyzed]
+    )
+    
+    for (track, result), classification in zip(analyzed, classifications):
+        update_data = {
+            **result,
+            **classification,
+            'classification_version': audio_analyzer.classification_version,
+            'analysis_failure': None,
+            'popularity_score': recommendation_engine.calculate_popularity_score(track)
+        }
         
-        # Extract artwork
-        artwork_data = None
-        if hasattr(audio_file, 'tags') and audio_file.tags:
-            for key in ['APIC:', 'APIC:Cover', 'APIC:Front Cover']:
-                if key in audio_file.tags:
-                    try:
-                        artwork_bytes = audio_file.tags[key].data
-                        artwork_data = base64.b64encode(artwork_bytes).decode('utf-8')
-                        break
-                    except:
-                        continue
+        # Byte-identical copies share the analysis of their original
+        duplicate_data = {field: update_data[field] for field in ANALYSIS_FIELDS}
         
-        metadata['artwork_data'] = artwork_data
+        await writer.update({"id": track['id']}, {"$set": update_data})
+        await writer.add(UpdateMany({"duplicate_of": track['id']}, {"$set": duplicate_data}))
         
-        return metadata
-    except Exception as e:
-        logger.error(f"Error extracting metadata from {file_path}: {e}")
+        stats = update_data.get('analysis_stats') or {}
+        logger.info(
+            f"Processed AI features for track {track.get('title')} - "
+            f"Genre: {update_data['ai_genre']} ({update_data['ai_genre_confidence']:.2f}), "
+            f"decoded with {stats.get('decoder')} in {stats.get('decode_seconds')}s"
+        )
+    
+    # Upserts may refit the whole index, so keep them off the event loop
+    await loop.run_in_executor(
+        None, feature_index.upsert_many, [(track['id'], result['audio_features']) for track, result in analyzed]
+    )
+    neighbor_graph.mark_changed(track['id'] for track, _ in analyzed)
+
+async def record_analysis_failure(track: Dict[str, Any], error: BaseException, writer: BulkWriter):
+    """Quarantine a track whose analysis failed until its next retry, backing off exponentially"""
+    attempts = (track.get('analysis_failure') or {}).get('attempts', 0) + 1
+    now = datetime.utcnow()
+    failure = {
+        'reason': failure_reason(error),
+        'error': str(error)[:500],
+        'attempts': attempts,
+        'failed_at': now,
+        'retry_after': now + timedelta(seconds=min(ANALYSIS_RETRY_BASE * 2 ** (attempts - 1), ANALYSIS_RETRY_MAX))
+    }
+    await writer.update({"id": track['id']}, {"$set": {"analysis_failure": failure}})
+    await writer.add(UpdateMany({"duplicate_of": track['id']}, {"$set": {"analysis_failure": failure}}))
+    logger.warning(
+        f"Analysis of {track['file_path']} failed ({failure['reason']}, attempt {attempts}): {error}; "
+        f"retrying after {failure['retry_after']:%Y-%m-%d %H:%M}"
+    )
+
+# Chunk size for $in queries over many paths
+QUERY_BATCH_SIZE = 1000
+
+# New files matched against existing tracks by content hash per query
+CONTENT_MATCH_BATCH_SIZE = 200
+
+# Write batching for scan and analysis results
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', 500))
+WRITE_BATCH_INTERVAL = float(os.environ.get('WRITE_BATCH_INTERVAL', 1.0))
+
+# Analyzed tracks are classified together once this many are waiting
+CLASSIFY_BATCH_SIZE = int(os.environ.get('CLASSIFY_BATCH_SIZE', 64))
+
+def path_scope_query(field: str, files: List[str], directories: List[str]) -> Dict[str, Any]:
+    """Filter matching the given files and everything under the given directories"""
+    clauses = []
+    if files:
+        clauses.append({field: {"$in": files}})
+    for directory in directories:
+        clauses.append({field: {"$regex": f"^{re.escape(directory.rstrip(os.sep) + os.sep)}"}})
+    return {"$or": clauses} if clauses else {field: {"$in": []}}
+
+async def load_folder_manifest(folder_id: str, scope: Optional[Dict[str, Any]] = None) -> Dict[str, ManifestEntry]:
+    """Load the stored file manifest of a folder keyed by path, optionally limited to a path scope"""
+    entries = {}
+    async for document in db.file_manifests.find({"folder_id": folder_id, **(scope or {})}, {"_id": 0}):
+        entry = ManifestEntry.from_document(document)
+        entries[entry.path] = entry
+    return entries
+
+async def find_tracks_by_path(paths: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Look up existing tracks for many paths with a handful of $in queries"""
+    tracks = {}
+    for i in range(0, len(paths), QUERY_BATCH_SIZE):
+        chunk = paths[i:i + QUERY_BATCH_SIZE]
+        async for track in db.tracks.find(
+            {"file_path": {"$in": chunk}},
+            {"_id": 0, "id": 1, "file_path": 1, "content_hash": 1}
+        ):
+            tracks[track['file_path']] = track
+    return tracks
+
+async def promote_duplicates(original_ids: List[str], writer: BulkWriter, exclude_paths: Optional[List[str]] = None,
+                             reset_analysis: bool = False) -> Dict[str, str]:
+    """Hand each original's copies over to the oldest of them, which becomes the new original.
+    
+    Used when originals are removed, with ``exclude_paths`` the files going
+    along with them, and when their content changes, with
+    ``reset_analysis`` so the copies are analyzed again instead of keeping
+    what they shared with the original. Returns the new original of every
+    old one that had copies.
+    """
+    if not original_ids:
         return {}
+    query: Dict[str, Any] = {"duplicate_of": {"$in": original_ids}}
+    if exclude_paths:
+        query["file_path"] = {"$nin": exclude_paths}
+    reset = {field: "" for field in ANALYSIS_FIELDS} if reset_analysis else {}
+    
+    promoted = {}
+    async for copy in db.tracks.find(query, {"_id": 0, "id": 1, "duplicate_of": 1}).sort("created_at", 1):
+        original_id = copy['duplicate_of']
+        if original_id in promoted:
+            continue
+        promoted[original_id] = copy['id']
+        await writer.update({"id": copy['id']}, {"$unset": {**reset, "duplicate_of": ""}})
+        repoint = {"$set": {"duplicate_of": copy['id']}}
+        if reset:
+            repoint["$unset"] = reset
+        await writer.add(UpdateMany({"duplicate_of": original_id, "id": {"$ne": copy['id']}}, repoint))
+    return promoted
 
-def get_file_format(file_path: str) -> str:
-    """Determine file format"""
-    try:
-        mime = magic.from_file(file_path, mime=True)
-        if 'flac' in mime:
-            return 'FLAC'
-        elif 'mpeg' in mime or 'mp3' in mime:
-            return 'MP3'
-        elif 'wav' in mime:
-            return 'WAV'
-        elif 'ogg' in mime:
-            return 'OGG'
-        else:
-            return Path(file_path).suffix.upper().lstrip('.')
-    except:
-        return Path(file_path).suffix.upper().lstrip('.')
-
-async def process_audio_intelligence(track_id: str):
-    """Process audio intelligence for a track in background"""
-    try:
-        track = await db.tracks.find_one({"id": track_id})
-        if not track:
-            return
-        
-        # Extract audio features
-        features = audio_analyzer.extract_audio_features(track['file_path'])
-        
-        # Classify genre
-        ai_genre, confidence = audio_analyzer.classify_genre(features)
-        
-        # Get mood and energy
-        mood, energy = audio_analyzer.get_mood_energy(features)
-        
-        # Calculate popularity score
-        popularity = recommendation_engine.calculate_popularity_score(track)
+def track_file_data(probe: Dict[str, Any]) -> Dict[str, Any]:
+    """Track fields that come from the file itself"""
+    file_path = Path(probe['file_path'])
+    return {
+        "file_path": str(file_path),
+        "filename": file_path.name,
+        "file_format": probe['file_format'],
+        "file_size": probe['file_size'],
+        "content_hash": probe['content_hash'],
+        **probe['metadata']
+    }
+
+async def sync_folder_files(folder_id: str, files: AsyncIterator[Tuple[str, os.stat_result]],
+                            previous: Dict[str, ManifestEntry], progress: ScanJob,
+                            unreadable_dirs: Optional[List[str]] = None) -> Dict[str, int]:
+    """Bring tracks and manifest in line with the files on disk.
+    
+    ``files`` is compared against the ``previous`` manifest entries as it
+    streams in, so only files that are new, modified, moved or removed are
+    touched. Manifest entries not seen in ``files`` count as removed, so
+    ``previous`` must cover exactly the part of the folder being walked.
+    Returns the number of files per kind of change.
+    """
+    differ = ManifestDiffer(previous)
+    unreadable_dirs = unreadable_dirs or []
+    loop = asyncio.get_running_loop()
+    
+    # Manifest entries only land after the track writes they describe
+    tracks_writer = BulkWriter(db.tracks, WRITE_BATCH_SIZE, WRITE_BATCH_INTERVAL)
+    manifest_writer = BulkWriter(
+        db.file_manifests, WRITE_BATCH_SIZE, WRITE_BATCH_INTERVAL, upstream=[tracks_writer]
+    )
+    
+    async def record_manifest(entry: ManifestEntry):
+        await manifest_writer.update(
+            {"folder_id": folder_id, "path": entry.path},
+            {"$set": entry.to_document(folder_id)},
+            upsert=True
+        )
+    
+    # Files to probe, mapped to (manifest entry, whether a track already exists for the path)
+    pending = {}
+    # Known files whose content changed
+    modified_paths = []
+    
+    async def resolve_new_files(entries: List[ManifestEntry]) -> AsyncIterator[str]:
+        # Files missing from the manifest may already be tracks (older scans, interrupted runs)
+        known_tracks = await find_tracks_by_path([entry.path for entry in entries])
+        for entry in entries:
+            if entry.path in known_tracks:
+                await record_manifest(entry)
+                progress.processed_files += 1
+            else:
+                pending[entry.path] = (entry, False)
+                yield entry.path
+    
+    async def files_to_probe() -> AsyncIterator[str]:
+        new_entries = []
+        async for path, stat in files:
+            progress.total_files += 1
+            entry = ManifestEntry.from_stat(path, stat)
+            change, old = differ.classify(entry)
+            
+            if change == ManifestDiffer.UNCHANGED:
+                progress.processed_files += 1
+                continue
+            
+            if change == ManifestDiffer.MODIFIED:
+                pending[path] = (entry, True)
+                yield path
+                continue
+            
+            if change == ManifestDiffer.MOVED:
+                await manifest_writer.add(DeleteOne({"folder_id": folder_id, "path": old.path}))
+                if await db.tracks.find_one({"file_path": old.path}, {"_id": 1}):
+                    # Re-point the track, keeping its analysis and play history
+                    await tracks_writer.update(
+                        {"file_path": old.path},
+                        {"$set": {"file_path": path, "filename": Path(path).name}}
+                    )
+                    await record_manifest(entry)
+                    progress.processed_files += 1
+                    continue
+            
+            new_entries.append(entry)
+            if len(new_entries) >= QUERY_BATCH_SIZE:
+                async for new_path in resolve_new_files(new_entries):
+                    yield new_path
+                new_entries = []
         
-        # Update track with AI data
-        update_data = {
-            'audio_features': features,
-            'ai_genre': ai_genre,
-            'ai_genre_confidence': confidence,
-            'mood': mood,
-            'energy': energy,
-            'popularity_score': popularity
+        async for new_path in resolve_new_files(new_entries):
+            yield new_path
+        progress.walk_complete = True
+    
+    def new_track_data() -> Dict[str, Any]:
+        return {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.utcnow(),
+            "play_count": 0,
+            "skip_count": 0
         }
+    
+    async def add_new_tracks(probes: List[Tuple[Dict[str, Any], ManifestEntry]]):
+        if not probes:
+            return
         
-        await db.tracks.update_one(
-            {"id": track_id},
-            {"$set": update_data}
-        )
+        # Match new files against existing tracks by content before inserting anything; tracks added
+        # by earlier batches of this scan must be written first, or their copies are missed
+        await tracks_writer.flush()
+        content_hashes = [probe['content_hash'] for probe, _ in probes]
+        originals = {}
+        async for track in db.tracks.find(
+            {"content_hash": {"$in": content_hashes}, "duplicate_of": None},
+            {"_id": 0, "id": 1, "file_path": 1, "content_hash": 1, **{field: 1 for field in ANALYSIS_FIELDS}}
+        ):
+            originals.setdefault(track['content_hash'], track)
         
-        logger.info(f"Processed AI features for track {track['title']} - Genre: {ai_genre} ({confidence:.2f})")
+        missing_paths = await loop.run_in_executor(
+            None, lambda: {track['file_path'] for track in originals.values() if not os.path.exists(track['file_path'])}
+        )
         
-    except Exception as e:
-        logger.error(f"Error processing audio intelligence for track {track_id}: {e}")
-
-async def scan_folder_for_music(folder_path: str):
-    """Enhanced scan with AI processing"""
-    global scan_status
-    supported_extensions = {'.mp3', '.flac', '.wav', '.ogg', '.m4a', '.aac'}
+        for probe, entry in probes:
+            file_data = track_file_data(probe)
+            original = originals.get(probe['content_hash'])
+            
+            if original and original['file_path'] in missing_paths:
+                # The file moved here from elsewhere: re-point the track, keeping features, plays and playlists
+                await tracks_writer.update({"id": original['id']}, {"$set": file_data})
+                original['file_path'] = file_data['file_path']
+            elif original:
+                # Byte-identical copy of a known track: share its analysis instead of redoing it
+                await tracks_writer.insert({
+                    **new_track_data(),
+                    **file_data,
+                    **{field: original[field] for field in ANALYSIS_FIELDS if field in original},
+                    "duplicate_of": original['id']
+                })
+            else:
+                track_data = {**new_track_data(), **file_data}
+                await tracks_writer.insert(track_data)
+                originals[probe['content_hash']] = track_data
+            
+            await record_manifest(entry)
+            progress.processed_files += 1
     
-    try:
-        folder_path = Path(folder_path)
-        if not folder_path.exists():
-            raise HTTPException(status_code=404, detail="Folder not found")
-        
-        # Count total files first
-        all_files = list(folder_path.rglob('*'))
-        music_files = [f for f in all_files if f.suffix.lower() in supported_extensions]
-        
-        scan_status.total_files = len(music_files)
-        scan_status.processed_files = 0
-        scan_status.ai_processed = 0
-        scan_status.status = "scanning"
-        scan_status.is_scanning = True
-        scan_status.ai_processing = False
+    async def update_modified_tracks(probes: List[Tuple[Dict[str, Any], ManifestEntry]]):
+        if not probes:
+            return
         
-        track_ids_for_ai = []
+        stored = await find_tracks_by_path([probe['file_path'] for probe, _ in probes])
+        for probe, entry in probes:
+            track = stored.get(probe['file_path'])
+            if track and track.get('content_hash') == probe['content_hash']:
+                # Only the timestamp changed (touch, rsync without -t): keep the analysis
+                await tracks_writer.update({"id": track['id']}, {"$set": track_file_data(probe)})
+            else:
+                # Content changed: refresh tags and queue for re-analysis
+                await tracks_writer.update(
+                    {"file_path": probe['file_path']},
+                    {
+                        "$set": track_file_data(probe),
+                        "$unset": {field: "" for field in ANALYSIS_FIELDS + ["duplicate_of"]},
+                        "$setOnInsert": new_track_data()
+                    },
+                    upsert=True
+                )
+                modified_paths.append(probe['file_path'])
+            await record_manifest(entry)
+            progress.processed_files += 1
+    
+    async with tracks_writer, manifest_writer:
+        new_probes = []
+        modified_probes = []
         
-        for file_path in music_files:
+        # Extract metadata for new and changed files in parallel, off the event loop
+        async for probe in ingest_executor.probe_many(files_to_probe()):
+            file_path = Path(probe['file_path'])
+            entry, is_known = pending.pop(str(file_path))
             try:
-                scan_status.current_folder = str(file_path.parent)
-                
-                # Check if file already exists in database
-                existing_track = await db.tracks.find_one({"file_path": str(file_path)})
-                if existing_track:
-                    scan_status.processed_files += 1
-                    if not existing_track.get('audio_features'):
-                        track_ids_for_ai.append(existing_track['id'])
-                    continue
+                progress.current_folder = str(file_path.parent)
                 
-                # Extract metadata
-                metadata = extract_audio_metadata(str(file_path))
-                file_format = get_file_format(str(file_path))
-                file_size = file_path.stat().st_size
+                if probe['error']:
+                    raise RuntimeError(probe['error'])
                 
-                # Create track object
-                track_data = {
-                    "id": str(uuid.uuid4()),
-                    "file_path": str(file_path),
-                    "filename": file_path.name,
-                    "file_format": file_format,
-                    "file_size": file_size,
-                    "created_at": datetime.utcnow(),
-                    "play_count": 0,
-                    "skip_count": 0,
-                    **metadata
-                }
+                if not is_known:
+                    new_probes.append((probe, entry))
+                    if len(new_probes) >= CONTENT_MATCH_BATCH_SIZE:
+                        await add_new_tracks(new_probes)
+                        new_probes = []
+                    continue
                 
-                # Insert into database
-                await db.tracks.insert_one(track_data)
-                track_ids_for_ai.append(track_data['id'])
-                scan_status.processed_files += 1
+                # Size or mtime changed; the stored content hash tells whether the content did
+                modified_probes.append((probe, entry))
+                if len(modified_probes) >= CONTENT_MATCH_BATCH_SIZE:
+                    await update_modified_tracks(modified_probes)
+                    modified_probes = []
                 
             except Exception as e:
                 logger.error(f"Error processing file {file_path}: {e}")
                 continue
         
-        scan_status.status = "ai_processing"
-        scan_status.is_scanning = False
-        scan_status.ai_processing = True
-        
-        # Process AI features in background
-        for track_id in track_ids_for_ai:
-            try:
-                await process_audio_intelligence(track_id)
-                scan_status.ai_processed += 1
-            except Exception as e:
-                logger.error(f"Error in AI processing: {e}")
-                continue
+        await add_new_tracks(new_probes)
+        await update_modified_tracks(modified_probes)
         
-        scan_status.ai_processing = False
-        scan_status.status = "completed"
-        logger.info(f"Scan completed. Processed {scan_status.processed_files} files with AI analysis")
+        # Changed files lose the features of their old content, and their copies no longer share it
+        for i in range(0, len(modified_paths), QUERY_BATCH_SIZE):
+            modified_ids = await db.tracks.distinct("id", {"file_path": {"$in": modified_paths[i:i + QUERY_BATCH_SIZE]}})
+            for track_id in modified_ids:
+                feature_index.remove(track_id)
+            neighbor_graph.mark_removed(modified_ids)
+            await promote_duplicates(modified_ids, tracks_writer, reset_analysis=True)
         
-        # Generate initial smart mixes
+        # Drop tracks whose files are gone, unless their directory merely could not be read
+        removed_paths = [
+            entry.path for entry in differ.removed()
+            if not any(entry.path.startswith(directory + os.sep) for directory in unreadable_dirs)
+        ]
+        for i in range(0, len(removed_paths), QUERY_BATCH_SIZE):
+            chunk = removed_paths[i:i + QUERY_BATCH_SIZE]
+            # Tracks re-pointed to a new path in this scan, and copies promoted for an earlier
+            # chunk, must be in place before the lookup and the delete below
+            await tracks_writer.flush()
+            removed = await db.tracks.find(
+                {"file_path": {"$in": chunk}}, {"_id": 0, "id": 1, "duplicate_of": 1}
+            ).to_list(None)
+            removed_ids = [track['id'] for track in removed]
+            # Copies of a removed original stay, one of them taking its place, in the feature index too
+            promoted = await promote_duplicates(
+                [track['id'] for track in removed if not track.get('duplicate_of')], tracks_writer, exclude_paths=chunk
+            )
+            promoted = {old_id: new_id for old_id, new_id in promoted.items() if old_id in feature_index}
+            await loop.run_in_executor(
+                None, feature_index.upsert_many,
+                [(new_id, feature_index.features(old_id)) for old_id, new_id in promoted.items()]
+            )
+            for track_id in removed_ids:
+                feature_index.remove(track_id)
+            neighbor_graph.mark_removed(removed_ids)
+            neighbor_graph.mark_changed(promoted.values())
+            await tracks_writer.add(DeleteMany({"file_path": {"$in": chunk}}))
+            await manifest_writer.add(DeleteMany({"folder_id": folder_id, "path": {"$in": chunk}}))
+    
+    return {**differ.counts, "removed": len(removed_paths)}
+
+# Tracks holding the stand-in features failed analyses used to store
+STAND_IN_FEATURES_QUERY = {f"audio_features.{name}": value for name, value in LEGACY_STAND_IN_FEATURES.items()}
+
+def analysis_pending_query(profile: Optional[str] = None) -> Dict[str, Any]:
+    """Tracks without features, plus those analyzed with a cheaper profile than ``profile``.
+    
+    Tracks whose profile's features an older analyzer extracted differently
+    are included too. Quarantined tracks are left out until their retry is due.
+    """
+    # Failed analyses used to store stand-in features; those count as unanalyzed
+    pending = [
+        {"audio_features": None},
+        STAND_IN_FEATURES_QUERY,
+        {"analysis_profile": {"$in": PROFILES_CHANGED_IN_VERSION}, "analyzer_version": {"$ne": ANALYZER_VERSION}}
+    ]
+    if profile is not None:
+        target = ANALYSIS_PROFILES[profile]
+        cheaper = [name for name, other in ANALYSIS_PROFILES.items() if other.rank < target.rank]
+        # Tracks analyzed before profiles existed got the standard analysis
+        if ANALYSIS_PROFILES[DEFAULT_ANALYSIS_PROFILE].rank < target.rank:
+            cheaper.append(None)
+        pending.append({"analysis_profile": {"$in": cheaper}})
+    
+    retry_due = {"$or": [{"analysis_failure": None}, {"analysis_failure.retry_after": {"$lte": datetime.utcnow()}}]}
+    return {"$and": [{"$or": pending}, retry_due]}
+
+# Track fields analysis and classification need
+ANALYSIS_PROJECTION = {
+    "_id": 0, "id": 1, "file_path": 1, "title": 1, "duration": 1, "content_hash": 1,
+    "play_count": 1, "created_at": 1, "last_played": 1, "analysis_failure": 1, "analysis_profile": 1
+}
+
+async def analyze_tracks(tracks: List[Dict[str, Any]], profile: Optional[str] = None,
+                         priority: int = PRIORITY_BACKFILL, progress: Optional[ScanJob] = None):
+    """Queue tracks in the analysis pool and store their results in classified batches as they complete.
+    
+    The whole list is queued at once, so a track moved up by playback can
+    overtake it; tracks still waiting are dropped if this is cancelled.
+    Without a ``profile``, tracks analyzed before are redone with the
+    profile they had.
+    """
+    loop = asyncio.get_running_loop()
+    completed: asyncio.Queue = asyncio.Queue()
+    
+    def on_done(track: Dict[str, Any]):
+        return lambda future: completed.put_nowait((track, future))
+    
+    for track in tracks:
+        future = analysis_pool.submit(
+            track['id'], track['file_path'], profile or track.get('analysis_profile'), track.get('duration'),
+            track.get('content_hash'), priority
+        )
+        future.add_done_callback(on_done(track))
+    
+    try:
+        async with BulkWriter(db.tracks, WRITE_BATCH_SIZE, WRITE_BATCH_INTERVAL) as features_writer:
+            # Extracted features wait here to be classified together
+            analyzed = []
+            oldest = None
+            
+            async def classify_analyzed():
+                nonlocal analyzed, oldest
+                batch, analyzed, oldest = analyzed, [], None
+                await store_audio_intelligence(batch, features_writer)
+                if progress is not None:
+                    progress.ai_processed += len(batch)
+            
+            for _ in range(len(tracks)):
+                track, future = await completed.get()
+                if future.cancelled():
+                    continue
+                if future.exception() is not None:
+                    await record_analysis_failure(track, future.exception(), features_writer)
+                    if progress is not None:
+                        progress.ai_failed += 1
+                    continue
+                analyzed.append((track, future.result()))
+                oldest = oldest or loop.time()
+                if len(analyzed) >= CLASSIFY_BATCH_SIZE or loop.time() - oldest >= WRITE_BATCH_INTERVAL:
+                    await classify_analyzed()
+            await classify_analyzed()
+    finally:
+        analysis_pool.discard(track['id'] for track in tracks)
+
+async def analyze_pending_tracks(track_query: Dict[str, Any], progress: ScanJob,
+                                 profile: Optional[str] = None) -> List[str]:
+    """Run audio intelligence for matching tracks that have no features yet.
+    
+    With a ``profile``, tracks analyzed with a cheaper profile are refined too.
+    """
+    tracks_for_ai = await db.tracks.find(
+        {"$and": [track_query, analysis_pending_query(profile), {"duplicate_of": None}]}, ANALYSIS_PROJECTION
+    ).to_list(None)
+    progress.ai_total = len(tracks_for_ai)
+    
+    await analyze_tracks(tracks_for_ai, profile, PRIORITY_BACKFILL, progress)
+    return [track['id'] for track in tracks_for_ai]
+
+# Background work started by requests and on startup, kept referenced until it finishes
+background_tasks: Set[asyncio.Task] = set()
+
+def run_in_background(work: Awaitable[Any], description: str) -> asyncio.Task:
+    """Run ``work`` as a task that stays referenced until it is done and whose failure is logged"""
+    task = asyncio.create_task(work)
+    background_tasks.add(task)
+    
+    def on_done(task: asyncio.Task):
+        background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error in {description}: {task.exception()}")
+    
+    task.add_done_callback(on_done)
+    return task
+
+async def analyze_with_priority(track_ids: List[str], priority: int):
+    """Move tracks without features to the front of the analysis queue and store their results.
+    
+    Tracks a scan has already queued are moved up and share the scan's
+    request; their results are stored here as well, so they are kept even
+    if the scan is cancelled before it gets to them.
+    """
+    unanalyzed = await db.tracks.find(
+        {"$and": [{"id": {"$in": track_ids}}, analysis_pending_query()]}, {"_id": 0, "id": 1, "duplicate_of": 1}
+    ).to_list(None)
+    # Byte-identical copies get their features from the original
+    original_ids = list({track.get('duplicate_of') or track['id'] for track in unanalyzed})
+    if not original_ids:
+        return
+    
+    tracks = await db.tracks.find(
+        {"$and": [{"id": {"$in": original_ids}}, analysis_pending_query()]}, ANALYSIS_PROJECTION
+    ).to_list(None)
+    await analyze_tracks(tracks, priority=priority)
+
+def schedule_priority_analysis(track_ids: List[str], priority: int = PRIORITY_QUEUED):
+    """Start analyze_with_priority in the background, so the request that triggered it is not held up"""
+    track_ids = [track_id for track_id in track_ids if track_id]
+    if not track_ids:
+        return
+    run_in_background(analyze_with_priority(track_ids, priority), "priority analysis")
+
+async def scan_folder_for_music(job: ScanJob):
+    """Enhanced scan with AI processing, run as a job by the scan job manager.
+    
+    The folder is walked as a stream and compared against its manifest on the
+    fly, so only files that are new, modified, moved or removed since the last
+    scan are touched and work starts before the walk has finished.
+    """
+    folder_path = Path(job.folder_path)
+    if not folder_path.exists():
+        raise FileNotFoundError(f"Folder not found: {folder_path}")
+    
+    unreadable_dirs = []
+    walker = walk_audio_files(str(folder_path), unreadable_dirs=unreadable_dirs)
+    changes = await sync_folder_files(
+        job.folder_id, iterate_in_thread(walker), await load_folder_manifest(job.folder_id),
+        job, unreadable_dirs
+    )
+    job.changes = changes
+    logger.info(f"Scanned {job.total_files} files in {folder_path}: {changes}")
+    
+    job.start_phase("ai_processing")
+    
+    # Everything in this folder that still lacks features, including changed files
+    track_ids_for_ai = await analyze_pending_tracks(
+        path_scope_query("file_path", [], [str(folder_path)]), job, job.analysis_profile
+    )
+    logger.info(f"Scan completed. Processed {job.processed_files} files with AI analysis")
+    
+    # Generate initial smart mixes
+    if changes[ManifestDiffer.UNCHANGED] < job.total_files or changes["removed"] or track_ids_for_ai:
         await generate_smart_mixes()
+
+# Folder scans run as tracked jobs, one per folder at a time, checkpointed to MongoDB
+scan_jobs = ScanJobManager(
+    scan_folder_for_music,
+    max_concurrent=int(os.environ.get('SCAN_MAX_CONCURRENT', 2)),
+    collection=db.scan_jobs,
+    checkpoint_interval=float(os.environ.get('SCAN_CHECKPOINT_INTERVAL', 5.0))
+)
+
+async def apply_library_changes(folder_id: str, folder_path: str, changed: Dict[str, bool]):
+    """Apply one coalesced batch of filesystem changes reported by the library watcher"""
+    files = [path for path, is_directory in changed.items() if not is_directory]
+    directories = [path for path, is_directory in changed.items() if is_directory]
+    progress = ScanJob(folder_id=folder_id, folder_path=folder_path, status="watching")
+    
+    # Never interleave with a full scan of the same folder
+    async with scan_jobs.folder_lock(folder_id):
+        previous = await load_folder_manifest(folder_id, path_scope_query("path", files, directories))
+        changes = await sync_folder_files(
+            folder_id, iterate_in_thread(walk_paths(list(changed))), previous, progress
+        )
+        logger.info(f"Applied {len(changed)} watched changes in {folder_path}: {changes}")
         
-    except Exception as e:
-        scan_status.status = "error"
-        scan_status.is_scanning = False
-        scan_status.ai_processing = False
-        logger.error(f"Error scanning folder {folder_path}: {e}")
+        await analyze_pending_tracks(path_scope_query("file_path", files, directories), progress)
 
 async def generate_smart_mixes():
     """Generate automatic smart mixes based on the music library"""
@@ -473,8 +936,11 @@ async def add_music_folder(folder_data: MusicFolderCreate):
     
     await db.music_folders.insert_one(folder.dict())
     
+    if library_watcher:
+        library_watcher.watch(folder.id, str(folder_path))
+    
     # Start scanning in background
-    asyncio.create_task(scan_folder_for_music(folder_data.path))
+    scan_jobs.submit(folder.id, folder_data.path)
     
     return folder
 
@@ -495,24 +961,71 @@ async def remove_music_folder(folder_id: str):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Folder not found")
     
+    if library_watcher:
+        library_watcher.unwatch(folder_id)
+    scan_jobs.cancel_folder(folder_id)
+    
     return {"message": "Folder removed successfully"}
 
 @api_router.post("/folders/{folder_id}/scan")
-async def rescan_folder(folder_id: str):
-    """Rescan a specific folder"""
+async def rescan_folder(folder_id: str, profile: Optional[str] = None):
+    """Rescan a specific folder.
+    
+    With an analysis ``profile``, tracks analyzed with a cheaper profile are
+    re-analyzed, e.g. to refine a fast first pass over the library.
+    """
+    if profile is not None and profile not in ANALYSIS_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis profile: {profile}")
+    
     folder = await db.music_folders.find_one({"id": folder_id, "is_active": True})
     if not folder:
         raise HTTPException(status_code=404, detail="Folder not found")
     
-    # Start scanning in background
-    asyncio.create_task(scan_folder_for_music(folder["path"]))
+    # Requests made while a scan is waiting share that scan
+    job = scan_jobs.submit(folder["id"], folder["path"], analysis_profile=profile)
     
-    return {"message": "Scan started"}
+    return {"message": "Scan started", "job_id": job.id, "status": job.status}
 
 @api_router.get("/scan-status", response_model=ScanStatus)
 async def get_scan_status():
-    """Get current scan status"""
-    return scan_status
+    """Get current scan status (summary of the most recent scan job)"""
+    jobs = scan_jobs.list()
+    if not jobs:
+        return ScanStatus()
+    
+    job = next((job for job in jobs if job.status in ("scanning", "ai_processing")), jobs[0])
+    return ScanStatus(
+        is_scanning=job.status == "scanning",
+        current_folder=job.current_folder,
+        processed_files=job.processed_files,
+        total_files=job.total_files,
+        status=job.status,
+        ai_processing=job.status == "ai_processing",
+        ai_processed=job.ai_processed
+    )
+
+@api_router.get("/scan-jobs")
+async def get_scan_jobs(folder_id: Optional[str] = None, active: bool = False):
+    """List scan jobs, newest first, with progress and throughput"""
+    return [job.to_dict() for job in scan_jobs.list(folder_id, active_only=active)]
+
+@api_router.get("/scan-jobs/{job_id}")
+async def get_scan_job(job_id: str):
+    """Get a scan job's progress and throughput"""
+    job = scan_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.to_dict()
+
+@api_router.post("/scan-jobs/{job_id}/cancel")
+async def cancel_scan_job(job_id: str):
+    """Cancel a queued or running scan job"""
+    job = scan_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    if not scan_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Scan job already {job.status}")
+    return {"message": "Scan cancellation requested"}
 
 # Enhanced music library endpoints
 @api_router.get("/tracks", response_model=List[Track])
@@ -557,6 +1070,21 @@ async def get_track(track_id: str):
         raise HTTPException(status_code=404, detail="Track not found")
     return Track(**track)
 
+@api_router.get("/tracks/{track_id}/similar")
+async def get_similar_tracks(track_id: str, limit: int = 20):
+    """Tracks that sound most like this one, best first, with their similarity"""
+    track = await db.tracks.find_one({"id": track_id}, {"_id": 0, "id": 1, "audio_features": 1})
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    
+    neighbors = await nearest_tracks(track, limit)
+    if not neighbors:
+        return []
+    scores = dict(neighbors)
+    tracks = await db.tracks.find({"id": {"$in": list(scores)}}, {"_id": 0}).to_list(None)
+    tracks.sort(key=lambda similar: scores[similar["id"]], reverse=True)
+    return [{"track": Track(**similar), "similarity": scores[similar["id"]]} for similar in tracks]
+
 @api_router.get("/tracks/{track_id}/stream")
 async def stream_track(track_id: str):
     """Stream audio file with enhanced analytics"""
@@ -568,6 +1096,10 @@ async def stream_track(track_id: str):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Audio file not found")
     
+    # A track being played is analyzed next if it has not been yet
+    if track.get("audio_features") is None:
+        schedule_priority_analysis([track_id], PRIORITY_PLAYBACK)
+    
     # Update play count and analytics
     await db.tracks.update_one(
         {"id": track_id},
@@ -599,6 +1131,54 @@ async def track_skipped(track_id: str):
     )
     return {"message": "Skip recorded"}
 
+@api_router.get("/artwork/{artwork_hash}")
+async def get_artwork(artwork_hash: str, request: Request, size: Optional[int] = None):
+    """Serve cover art by content hash; the content never changes, so it is cached forever.
+
+    With ``size``, a thumbnail at the nearest fixed size at least that large is
+    served instead of the original image.
+    """
+    if not artwork_store.is_valid_hash(artwork_hash):
+        raise HTTPException(status_code=400, detail="Invalid artwork hash")
+    if size is not None and size <= 0:
+        raise HTTPException(status_code=400, detail="Invalid artwork size")
+    
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+    if size is None:
+        headers["ETag"] = f'"{artwork_hash}"'
+    else:
+        size = ArtworkThumbnailer.snap_size(size)
+        image_format = artwork_thumbnailer.choose_format(request.headers.get("accept"))
+        headers["ETag"] = f'"{artwork_hash}-{size}.{image_format}"'
+        headers["Vary"] = "Accept"
+    if request.headers.get("if-none-match") in (headers["ETag"], f'W/{headers["ETag"]}'):
+        return Response(status_code=304, headers=headers)
+    
+    if size is not None:
+        loop = asyncio.get_running_loop()
+        thumbnail_path = await loop.run_in_executor(
+            None, artwork_thumbnailer.get, artwork_hash, size, image_format
+        )
+        if thumbnail_path:
+            return FileResponse(
+                path=str(thumbnail_path),
+                media_type=artwork_thumbnailer.media_type(image_format),
+                headers=headers
+            )
+        # Fall back to the original if it cannot be decoded
+        headers["ETag"] = f'"{artwork_hash}"'
+        headers.pop("Vary")
+    
+    artwork_path = artwork_store.get_path(artwork_hash)
+    if not artwork_path:
+        raise HTTPException(status_code=404, detail="Artwork not found")
+    
+    return FileResponse(
+        path=str(artwork_path),
+        media_type=artwork_store.media_type(artwork_hash),
+        headers=headers
+    )
+
 @api_router.get("/artists")
 async def get_artists():
     """Get all artists with AI genre info"""
@@ -627,7 +1207,7 @@ class Album(BaseModel):
     total_duration: float
     year: Optional[int] = None
     genres: List[str] = []
-    artwork_data: Optional[str] = None
+    artwork_hash: Optional[str] = None
     track_ids: List[str] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -650,7 +1230,7 @@ async def get_albums(artist: Optional[str] = None, limit: int = 100, offset: int
                     "artist": "$album_artist"
                 },
                 "track_count": {"$sum": 1},
-                "artwork_data": {"$first": "$artwork_data"},
+                "artwork_hash": {"$max": "$artwork_hash"},
                 "genres": {"$addToSet": "$ai_genre"},
                 "year": {"$first": "$year"},
                 "total_duration": {"$sum": "$duration"},
@@ -665,7 +1245,7 @@ async def get_albums(artist: Optional[str] = None, limit: int = 100, offset: int
                 "name": "$_id.album",
                 "artist": "$_id.artist", 
                 "track_count": 1,
-                "artwork_data": 1,
+                "artwork_hash": 1,
                 "genres": {"$filter": {"input": "$genres", "cond": {"$ne": ["$$this", None]}}},
                 "year": 1,
                 "total_duration": 1,
@@ -695,7 +1275,7 @@ async def get_albums(artist: Optional[str] = None, limit: int = 100, offset: int
             "total_duration": album.get('total_duration', 0.0),
             "year": album.get('year'),
             "genres": album.get('genres', []),
-            "artwork_data": album.get('artwork_data'),
+            "artwork_hash": album.get('artwork_hash'),
             "track_ids": album.get('track_ids', []),
             "avg_popularity": album.get('avg_popularity', 0.0),
             "play_count": album.get('play_count', 0),
@@ -719,7 +1299,7 @@ async def get_album_details(album_id: str):
                 },
                 "album_id": {"$first": {"$concat": [{"$toString": "$album"}, "-", {"$toString": "$album_artist"}]}},
                 "track_count": {"$sum": 1},
-                "artwork_data": {"$first": "$artwork_data"},
+                "artwork_hash": {"$max": "$artwork_hash"},
                 "genres": {"$addToSet": "$ai_genre"},
                 "year": {"$first": "$year"},
                 "total_duration": {"$sum": "$duration"},
@@ -750,7 +1330,7 @@ async def get_album_details(album_id: str):
         "total_duration": target_album['total_duration'],
         "year": target_album['year'],
         "genres": [g for g in target_album['genres'] if g],
-        "artwork_data": target_album['artwork_data'],
+        "artwork_hash": target_album['artwork_hash'],
         "tracks": [Track(**track) for track in target_album['tracks']],
         "avg_popularity": target_album.get('avg_popularity', 0.0),
         "total_plays": target_album.get('total_plays', 0),
@@ -809,6 +1389,7 @@ async def create_smart_queue(queue_data: Dict[str, Any]):
         generation_params=queue_data.get("generation_params", {})
     )
     await db.smart_queues.insert_one(queue.dict())
+    schedule_priority_analysis(queue.track_ids)
     return queue
 
 @api_router.get("/smart-queues", response_model=List[SmartQueue])
@@ -825,6 +1406,46 @@ async def get_smart_queue(queue_id: str):
         raise HTTPException(status_code=404, detail="Queue not found")
     return SmartQueue(**queue)
 
+# Nearest neighbors of the seed that auto queues are ranked from; up to the
+# graph's K they are read from the neighbor graph instead of searched
+AUTO_QUEUE_CANDIDATES = int(os.environ.get('AUTO_QUEUE_CANDIDATES', neighbor_graph.k))
+
+async def nearest_tracks(track: Dict[str, Any], limit: int) -> Optional[List[Tuple[str, float]]]:
+    """(track id, similarity) pairs of the tracks most like ``track``, best first.
+    
+    Read from the neighbor graph when it holds enough of them; tracks not in
+    the graph yet, or asked for more than it keeps, are searched live. None
+    if the track has no features or the index is still loading.
+    """
+    if limit <= neighbor_graph.k:
+        neighbors = await neighbor_graph.neighbors(track["id"])
+        if neighbors is not None:
+            return [(neighbor["id"], neighbor["score"]) for neighbor in neighbors[:limit]]
+    
+    if not track.get("audio_features") or not len(feature_index):
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, similarity_search.nearest, track["audio_features"], limit, [track["id"]]
+    )
+
+async def auto_queue_candidates(seed_track: Dict[str, Any], size: int) -> List[Dict[str, Any]]:
+    """The seed's nearest neighbors by audio, plus the most played tracks for discovery.
+    
+    Unanalyzed seeds, and libraries whose index is still loading, get the
+    first tracks of the library as before.
+    """
+    neighbors = await nearest_tracks(seed_track, max(AUTO_QUEUE_CANDIDATES, size))
+    if neighbors is None:
+        return await db.tracks.find({}, {"_id": 0}).to_list(1000)
+    
+    neighbor_ids = [track_id for track_id, _ in neighbors]
+    similar = await db.tracks.find({"id": {"$in": neighbor_ids}}, {"_id": 0}).to_list(None)
+    popular = await db.tracks.find(
+        {"id": {"$nin": neighbor_ids + [seed_track["id"]]}}, {"_id": 0}
+    ).sort("play_count", -1).limit(size).to_list(size)
+    return similar + popular
+
 @api_router.post("/smart-queues/{queue_id}/generate-auto")
 async def generate_auto_queue(queue_id: str, seed_track_id: str, size: int = 20):
     """Generate auto queue based on seed track"""
@@ -832,14 +1453,17 @@ async def generate_auto_queue(queue_id: str, seed_track_id: str, size: int = 20)
     seed_track = await db.tracks.find_one({"id": seed_track_id})
     if not seed_track:
         raise HTTPException(status_code=404, detail="Seed track not found")
+    if seed_track.get("audio_features") is None:
+        schedule_priority_analysis([seed_track_id], PRIORITY_PLAYBACK)
     
-    # Get all tracks for recommendations
-    all_tracks = await db.tracks.find({}).to_list(1000)
+    # Get candidate tracks for recommendations
+    all_tracks = await auto_queue_candidates(seed_track, size)
     
     # Generate auto queue
     auto_queue_tracks = recommendation_engine.generate_auto_queue(
         seed_track, all_tracks, size
     )
+    schedule_priority_analysis([t['id'] for t in auto_queue_tracks])
     
     # Update queue
     await db.smart_queues.update_one(
@@ -869,6 +1493,10 @@ async def update_smart_queue(queue_id: str, update_data: Dict[str, Any]):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Queue not found")
     
+    schedule_priority_analysis(update_data.get("track_ids") or [])
+    if update_data.get("seed_track_id"):
+        schedule_priority_analysis([update_data["seed_track_id"]], PRIORITY_PLAYBACK)
+    
     return {"message": "Queue updated"}
 
 # Playback Session Management
@@ -1026,6 +1654,101 @@ async def get_listening_stats():
         "recent_tracks": [Track(**track) for track in recent_tracks]
     }
 
+@api_router.post("/analysis/reclassify")
+async def start_reclassification(all_tracks: bool = False):
+    """Re-derive genre, mood and energy for the library from stored features, without decoding audio.
+    
+    Only tracks classified with another model or rule version are updated
+    unless ``all_tracks`` is set. A running reclassification is returned as is.
+    """
+    job = reclassify_jobs.start(
+        ReclassifyJob(audio_analyzer.classification_version, only_outdated=not all_tracks),
+        lambda job: reclassify_library(db.tracks, audio_analyzer, job)
+    )
+    return job.to_dict()
+
+@api_router.get("/analysis/reclassify")
+async def get_reclassification_status():
+    """Progress of the current or last reclassification"""
+    if not reclassify_jobs.job:
+        raise HTTPException(status_code=404, detail="No reclassification has run")
+    return reclassify_jobs.job.to_dict()
+
+@api_router.post("/analysis/neighbor-graph")
+async def start_neighbor_graph_build():
+    """Recompute every track's stored nearest neighbors. A running build is returned as is."""
+    return neighbor_graph.start_rebuild().to_dict()
+
+@api_router.get("/analysis/neighbor-graph")
+async def get_neighbor_graph_status():
+    """Progress of the current or last full neighbor graph build"""
+    if not neighbor_graph.builds.job:
+        raise HTTPException(status_code=404, detail="No neighbor graph build has run")
+    return neighbor_graph.builds.job.to_dict()
+
+@api_router.get("/analysis/quarantine")
+async def get_analysis_quarantine(reason: Optional[str] = None, limit: int = 100):
+    """Tracks whose analysis failed, why, and when they will be retried"""
+    query: Dict[str, Any] = {"analysis_failure": {"$ne": None}, "duplicate_of": None}
+    if reason:
+        query["analysis_failure.reason"] = reason
+    
+    by_reason = await db.tracks.aggregate([
+        {"$match": query},
+        {"$group": {"_id": "$analysis_failure.reason", "tracks": {"$sum": 1}}}
+    ]).to_list(None)
+    tracks = await db.tracks.find(
+        query, {"_id": 0, "id": 1, "title": 1, "artist": 1, "file_path": 1, "analysis_failure": 1}
+    ).sort("analysis_failure.failed_at", -1).limit(limit).to_list(limit)
+    
+    return {
+        "total": sum(row["tracks"] for row in by_reason),
+        "by_reason": {row["_id"]: row["tracks"] for row in by_reason},
+        "tracks": tracks
+    }
+
+@api_router.post("/analysis/quarantine/{track_id}/retry")
+async def retry_quarantined_analysis(track_id: str):
+    """Retry a quarantined track now instead of waiting for its backoff"""
+    result = await db.tracks.update_one(
+        {"id": track_id, "analysis_failure": {"$ne": None}},
+        {"$set": {"analysis_failure.retry_after": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Track is not quarantined")
+    
+    schedule_priority_analysis([track_id])
+    return {"message": "Analysis retry scheduled"}
+
+@api_router.get("/analytics/analysis-performance")
+async def get_analysis_performance():
+    """Where analysis time goes: decode and feature time per decoder and file format"""
+    breakdown = await db.tracks.aggregate([
+        {"$match": {"analysis_stats.decoder": {"$ne": None}}},
+        {"$group": {
+            "_id": {"decoder": "$analysis_stats.decoder", "file_format": "$file_format"},
+            "tracks": {"$sum": 1},
+            "avg_decode_seconds": {"$avg": "$analysis_stats.decode_seconds"},
+            "avg_feature_seconds": {"$avg": "$analysis_stats.feature_seconds"},
+            "total_decode_seconds": {"$sum": "$analysis_stats.decode_seconds"},
+            "total_feature_seconds": {"$sum": "$analysis_stats.feature_seconds"}
+        }},
+        {"$sort": {"total_decode_seconds": -1}}
+    ]).to_list(100)
+    
+    return [
+        {
+            "decoder": row["_id"]["decoder"],
+            "file_format": row["_id"]["file_format"],
+            "tracks": row["tracks"],
+            "avg_decode_seconds": round(row["avg_decode_seconds"] or 0, 3),
+            "avg_feature_seconds": round(row["avg_feature_seconds"] or 0, 3),
+            "total_decode_seconds": round(row["total_decode_seconds"], 1),
+            "total_feature_seconds": round(row["total_feature_seconds"], 1)
+        }
+        for row in breakdown
+    ]
+
 # AI-Powered Playlist Generation
 @api_router.post("/ai-playlists/generate", response_model=AIPlaylistResponse)
 async def generate_ai_playlist(request: AIPlaylistRequest):
@@ -1123,6 +1846,7 @@ async def play_ai_playlist(playlist_id: str):
         
         queue = SmartQueue(**queue_data)
         await db.smart_queues.insert_one(queue.dict())
+        schedule_priority_analysis(queue.track_ids)
         
         return {
             "message": "AI playlist converted to playable queue",
@@ -1180,6 +1904,149 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def ensure_indexes():
+    """Create the indexes incremental scans rely on"""
+    await db.tracks.create_index("id")
+    await db.tracks.create_index("file_path")
+    await db.tracks.create_index("content_hash")
+    await db.tracks.create_index("duplicate_of", sparse=True)
+    await db.tracks.create_index("analysis_failure.retry_after", sparse=True)
+    await db.tracks.create_index("play_count")
+    await db.file_manifests.create_index([("folder_id", 1), ("path", 1)], unique=True)
+    await db.scan_jobs.create_index("id", unique=True)
+    await db.scan_jobs.create_index("created_at")
+    await db.track_neighbors.create_index("track_id", unique=True)
+    await db.track_neighbors.create_index("neighbors.id")
+    await db.track_neighbors.create_index("updated_at")
+
+# Tracks read per batch when loading the feature index
+FEATURE_INDEX_BATCH_SIZE = 10000
+
+async def load_feature_index():
+    """Fill the feature index from every analyzed track; byte-identical copies are left to their original"""
+    try:
+        loop = asyncio.get_running_loop()
+        projection = {"_id": 0, "id": 1, **{f"audio_features.{name}": 1 for name in feature_index.feature_names}}
+        batch = []
+        async for track in db.tracks.find(
+            {"audio_features": {"$ne": None}, "duplicate_of": None, "$nor": [STAND_IN_FEATURES_QUERY]}, projection
+        ).batch_size(FEATURE_INDEX_BATCH_SIZE):
+            batch.append((track['id'], track['audio_features']))
+            if len(batch) >= FEATURE_INDEX_BATCH_SIZE:
+                await loop.run_in_executor(None, feature_index.upsert_many, batch)
+                batch = []
+        await loop.run_in_executor(None, feature_index.upsert_many, batch)
+        logger.info(f"Loaded feature index of {len(feature_index)} tracks")
+    except Exception as e:
+        logger.error(f"Error loading feature index: {e}")
+
+async def start_neighbor_graph():
+    """Once the feature index is loaded, build the neighbor graph if it is missing, then keep it current"""
+    await load_feature_index()
+    try:
+        if len(feature_index) and not await db.track_neighbors.find_one({}, {"_id": 1}):
+            neighbor_graph.start_rebuild()
+    except Exception as e:
+        logger.error(f"Error checking neighbor graph: {e}")
+    run_in_background(neighbor_graph.run_refresher(), "neighbor graph refresher")
+
+@app.on_event("startup")
+async def start_feature_index():
+    """Load the feature index in the background; until then lookups score tracks pairwise"""
+    run_in_background(start_neighbor_graph(), "feature index load")
+
+@app.on_event("startup")
+async def resume_interrupted_scans():
+    """Pick up scans and analysis that were cut short by the last shutdown or crash.
+    
+    Scan progress is checkpointed by the file manifest and analysis progress
+    by the tracks themselves, so rescanning a folder only redoes what never
+    got written: unchanged files are skipped and only tracks still lacking
+    features are analyzed.
+    """
+    try:
+        interrupted = {job.folder_id: job for job in await scan_jobs.load_interrupted()}
+        resumed = 0
+        async for folder in db.music_folders.find({"is_active": True}, {"_id": 0, "id": 1, "path": 1}):
+            job = interrupted.get(folder["id"])
+            if job is None:
+                # Tracks inserted before a crash may never have been analyzed; quarantined ones failed
+                # and are retried on their own schedule
+                pending = await db.tracks.find_one(
+                    {
+                        **path_scope_query("file_path", [], [folder["path"]]),
+                        "audio_features": None, "duplicate_of": None, "analysis_failure": None
+                    },
+                    {"_id": 1}
+                )
+                if not pending:
+                    continue
+            scan_jobs.submit(
+                folder["id"], folder["path"],
+                resumed_from=job.id if job else None,
+                analysis_profile=job.analysis_profile if job else None
+            )
+            resumed += 1
+        if resumed:
+            logger.info(f"Resuming scans for {resumed} folders with unfinished work")
+    except Exception as e:
+        logger.error(f"Error resuming interrupted scans: {e}")
+
+@app.on_event("startup")
+async def start_artwork_migration():
+    """Move base64 artwork embedded by older scans into the artwork store"""
+    run_in_background(migrate_embedded_artwork(), "artwork migration")
+
+async def migrate_embedded_artwork():
+    loop = asyncio.get_running_loop()
+    migrated = 0
+    try:
+        async with BulkWriter(db.tracks, WRITE_BATCH_SIZE, WRITE_BATCH_INTERVAL) as writer:
+            async for track in db.tracks.find(
+                {"artwork_data": {"$ne": None}}, {"_id": 0, "id": 1, "artwork_data": 1}
+            ):
+                artwork_hash = await loop.run_in_executor(
+                    None, lambda: artwork_store.put(base64.b64decode(track['artwork_data']))
+                )
+                await writer.update(
+                    {"id": track['id']},
+                    {"$set": {"artwork_hash": artwork_hash}, "$unset": {"artwork_data": ""}}
+                )
+                migrated += 1
+        if migrated:
+            logger.info(f"Moved embedded artwork of {migrated} tracks into the artwork store")
+    except Exception as e:
+        logger.error(f"Error migrating embedded artwork: {e}")
+
+@app.on_event("startup")
+async def start_library_watcher():
+    """Watch every active folder for changes when watcher mode is enabled"""
+    global library_watcher
+    if not LIBRARY_WATCH_ENABLED:
+        return
+    if not WATCHDOG_AVAILABLE:
+        logger.warning("LIBRARY_WATCH_ENABLED is set but the watchdog package is not installed")
+        return
+    
+    library_watcher = LibraryWatcher(
+        apply_library_changes,
+        debounce=float(os.environ.get('LIBRARY_WATCH_DEBOUNCE', 2.0)),
+        max_delay=float(os.environ.get('LIBRARY_WATCH_MAX_DELAY', 10.0))
+    )
+    library_watcher.start()
+    async for folder in db.music_folders.find({"is_active": True}):
+        library_watcher.watch(folder["id"], str(Path(folder["path"])))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if library_watcher:
+        library_watcher.stop()
+    await scan_jobs.shutdown()
+    reclassify_jobs.cancel()
+    neighbor_graph.builds.cancel()
+    for task in list(background_tasks):
+        task.cancel()
     client.close()
+    ingest_executor.shutdown()
+    analysis_pool.shutdown()
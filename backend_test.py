@@ -185,6 +185,14 @@ class MusicPlayerAPITest(unittest.TestCase):
                 
                 if not scan_completed:
                     print("⚠️ Scan did not complete within timeout period")
+                
+                # The rescan is tracked as a job with throughput figures
+                job_response = requests.get(f"{API_URL}/scan-jobs/{response.json()['job_id']}")
+                self.assertEqual(job_response.status_code, 200)
+                job = job_response.json()
+                self.assertEqual(job["folder_id"], self.test_folder_id)
+                self.assertIn("files_per_second", job)
+                print(f"✅ Scan job {job['id']} is {job['status']} ({job['files_per_second']} files/sec)")
             except Exception as e:
                 print(f"❌ Failed to rescan folder: {str(e)}")
         
@@ -775,7 +783,7 @@ class MusicPlayerAPITest(unittest.TestCase):
                 print(f"   - Total duration: {sample_album.get('total_duration', 0):.2f} seconds")
                 print(f"   - Year: {sample_album.get('year', 'Not available')}")
                 print(f"   - Genres: {', '.join(sample_album.get('genres', ['None']))}")
-                print(f"   - Has artwork: {'Yes' if sample_album.get('artwork_data') else 'No'}")
+                print(f"   - Has artwork: {'Yes' if sample_album.get('artwork_hash') else 'No'}")
                 print(f"   - Play count: {sample_album.get('play_count', 0)}")
                 print(f"   - Average popularity: {sample_album.get('avg_popularity', 0):.2f}")
                 
@@ -847,7 +855,7 @@ class MusicPlayerAPITest(unittest.TestCase):
                 print(f"   - Total plays: {album.get('total_plays', 0)}")
                 
                 # Verify album artwork aggregation
-                if album.get('artwork_data'):
+                if album.get('artwork_hash'):
                     print("✅ Album artwork is properly aggregated")
                 else:
                     print("⚠️ Album does not have artwork")
@@ -991,11 +999,11 @@ class MusicPlayerAPITest(unittest.TestCase):
                     print(f"❌ Album '{album_details.get('name')}' has incorrect play count: {album_details.get('total_plays', 0)} vs {track_plays}")
                 
                 # Verify artwork aggregation
-                if album_details.get('artwork_data'):
-                    print(f"✅ Album '{album_details.get('name')}' has artwork data")
+                if album_details.get('artwork_hash'):
+                    print(f"✅ Album '{album_details.get('name')}' has artwork")
                 else:
                     # Check if any tracks have artwork
-                    tracks_with_artwork = [t for t in tracks if t.get('artwork_data')]
+                    tracks_with_artwork = [t for t in tracks if t.get('artwork_hash')]
                     if tracks_with_artwork:
                         print(f"❌ Album '{album_details.get('name')}' is missing artwork despite tracks having artwork")
                     else:
@@ -1072,6 +1080,52 @@ class MusicPlayerAPITest(unittest.TestCase):
         except Exception as e:
             print(f"❌ Failed to test album with non-existent artist: {str(e)}")
 
+    def test_12_artwork_endpoint(self):
+        """Test the content-addressed artwork endpoint"""
+        print("\n🔍 Testing artwork endpoint...")
+        
+        # Test invalid and unknown hashes
+        print("Testing GET /api/artwork with invalid and unknown hashes...")
+        try:
+            response = requests.get(f"{API_URL}/artwork/not-a-hash")
+            self.assertEqual(response.status_code, 400)
+            print("✅ Artwork endpoint rejects invalid hashes")
+            
+            response = requests.get(f"{API_URL}/artwork/{'0' * 64}")
+            self.assertEqual(response.status_code, 404)
+            print("✅ Artwork endpoint returns 404 for unknown artwork")
+        except Exception as e:
+            print(f"❌ Failed to test artwork edge cases: {str(e)}")
+        
+        # Test caching headers on real artwork
+        print("Testing GET /api/artwork caching headers...")
+        try:
+            albums = requests.get(f"{API_URL}/albums", params={"limit": 100}).json()
+            album = next((a for a in albums if a.get('artwork_hash')), None)
+            if not album:
+                print("⚠️ No album with artwork to test caching headers")
+                return
+            
+            artwork_url = f"{API_URL}/artwork/{album['artwork_hash']}"
+            response = requests.get(artwork_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers.get('ETag'), f'"{album["artwork_hash"]}"')
+            self.assertIn('immutable', response.headers.get('Cache-Control', ''))
+            self.assertTrue(response.headers.get('Content-Type', '').startswith('image/'))
+            print(f"✅ Artwork served with strong ETag and immutable caching ({len(response.content)} bytes)")
+            
+            cached_response = requests.get(artwork_url, headers={"If-None-Match": response.headers['ETag']})
+            self.assertEqual(cached_response.status_code, 304)
+            print("✅ Artwork endpoint answers conditional requests with 304")
+            
+            thumbnail_response = requests.get(artwork_url, params={"size": 100}, headers={"Accept": "image/webp,image/*"})
+            self.assertEqual(thumbnail_response.status_code, 200)
+            self.assertIn(thumbnail_response.headers.get('Content-Type'), ('image/webp', 'image/jpeg'))
+            self.assertIn('-128.', thumbnail_response.headers.get('ETag', ''))
+            print(f"✅ 128px thumbnail served as {thumbnail_response.headers.get('Content-Type')} ({len(thumbnail_response.content)} bytes)")
+        except Exception as e:
+            print(f"❌ Failed to test artwork caching headers: {str(e)}")
+
 def run_tests():
     """Run the test suite"""
     print(f"🎵 Testing Enhanced Music Player API at {API_URL}")
@@ -1089,6 +1143,7 @@ def run_tests():
     suite.addTest(MusicPlayerAPITest('test_09_album_endpoints'))
     suite.addTest(MusicPlayerAPITest('test_10_album_data_integrity'))
     suite.addTest(MusicPlayerAPITest('test_11_edge_cases'))
+    suite.addTest(MusicPlayerAPITest('test_12_artwork_endpoint'))
     
     # Run the tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -5,6 +5,9 @@ import axios from "axios";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Artwork is served by content hash from the backend artwork store
+const artworkUrl = (item, size) => (item?.artwork_hash ? `${API}/artwork/${item.artwork_hash}${size ? `?size=${size}` : ''}` : null);
+
 // Icons as components
 const PlayIcon = () => (
   <svg className="w-6 h-6" fill="currentColor" viewBox="0 0 24 24">
@@ -781,9 +784,9 @@ function App() {
                         className="track-artwork"
                         onClick={() => playTrack(track, filteredTracks)}
                       >
-                        {track.artwork_data ? (
+                        {artworkUrl(track, 320) ? (
                           <img 
-                            src={`data:image/jpeg;base64,${track.artwork_data}`}
+                            src={artworkUrl(track, 320)}
                             alt={track.album || 'Album artwork'}
                           />
                         ) : (
@@ -870,9 +873,9 @@ function App() {
                           }
                         }}
                       >
-                        {album.artwork_data ? (
+                        {artworkUrl(album, 320) ? (
                           <img 
-                            src={`data:image/jpeg;base64,${album.artwork_data}`}
+                            src={artworkUrl(album, 320)}
                             alt={album.name}
                           />
                         ) : (
@@ -941,9 +944,9 @@ function App() {
                           }
                         }}
                       >
-                        {album.artwork_data ? (
+                        {artworkUrl(album, 320) ? (
                           <img 
-                            src={`data:image/jpeg;base64,${album.artwork_data}`}
+                            src={artworkUrl(album, 320)}
                             alt={album.name}
                           />
                         ) : (
@@ -1183,9 +1186,9 @@ function App() {
                       onClick={() => playTrack(track, currentQueueType === 'user' ? userQueue : autoQueue, currentQueueType)}
                     >
                       <div className="queue-track-artwork">
-                        {track.artwork_data ? (
+                        {artworkUrl(track, 128) ? (
                           <img 
-                            src={`data:image/jpeg;base64,${track.artwork_data}`}
+                            src={artworkUrl(track, 128)}
                             alt={track.album}
                           />
                         ) : (
@@ -1211,9 +1214,9 @@ function App() {
                   <>
                     <div className="current-track-large">
                       <div className="track-artwork-large">
-                        {currentTrack.artwork_data ? (
+                        {artworkUrl(currentTrack, 640) ? (
                           <img 
-                            src={`data:image/jpeg;base64,${currentTrack.artwork_data}`}
+                            src={artworkUrl(currentTrack, 640)}
                             alt={currentTrack.album}
                           />
                         ) : (
@@ -1304,9 +1307,9 @@ function App() {
         <div className="player-bar">
           <div className="current-track-info">
             <div className="track-artwork-small">
-              {currentTrack.artwork_data ? (
+              {artworkUrl(currentTrack, 128) ? (
                 <img 
-                  src={`data:image/jpeg;base64,${currentTrack.artwork_data}`}
+                  src={artworkUrl(currentTrack, 128)}
                   alt={currentTrack.album}
                 />
               ) : (
@@ -0,0 +1,66 @@
+"""
+Analysis Pool Tests - per-file deadlines and failures on thread workers
+"""
+import asyncio
+import time
+
+import analysis_pool
+from analysis_pool import AnalysisPool, AnalysisTimeout
+
+def slow_analysis(seconds, stuck_seconds=0.0):
+    def analyze(file_path, profile_name, duration=None, content_hash=None, timeout=None):
+        time.sleep(stuck_seconds if file_path == 'stuck.mp3' else seconds)
+        if file_path == 'broken.mp3':
+            raise ValueError("No audio decoded")
+        return {'audio_features': {'tempo': 120.0}, 'analysis_profile': profile_name}
+    return analyze
+
+def make_pool(timeout):
+    pool = AnalysisPool(workers=1, executor_type='thread', timeout=timeout)
+    pool.DEADLINE_GRACE = 0.0
+    return pool
+
+def test_waiting_for_a_stuck_thread_does_not_use_up_the_deadline(monkeypatch):
+    monkeypatch.setattr(analysis_pool, 'analyze_audio_file', slow_analysis(0.1, stuck_seconds=0.8))
+
+    async def scenario():
+        pool = make_pool(timeout=0.3)
+        try:
+            # The stuck file times out but holds the only thread for a while longer
+            return await asyncio.gather(
+                pool.analyze('t1', 'stuck.mp3'), pool.analyze('t2', 'fine.mp3'), return_exceptions=True
+            )
+        finally:
+            pool.shutdown()
+
+    error, result = asyncio.run(scenario())
+    assert isinstance(error, AnalysisTimeout)
+    assert result['audio_features'] == {'tempo': 120.0}
+
+def test_file_past_its_deadline_fails(monkeypatch):
+    monkeypatch.setattr(analysis_pool, 'analyze_audio_file', slow_analysis(0.5))
+
+    async def scenario():
+        pool = make_pool(timeout=0.1)
+        try:
+            return await asyncio.gather(pool.analyze('t1', 'slow.mp3'), return_exceptions=True)
+        finally:
+            pool.shutdown()
+
+    [error] = asyncio.run(scenario())
+    assert isinstance(error, AnalysisTimeout)
+
+def test_analysis_errors_reach_the_caller(monkeypatch):
+    monkeypatch.setattr(analysis_pool, 'analyze_audio_file', slow_analysis(0.0))
+
+    async def scenario():
+        pool = make_pool(timeout=None)
+        try:
+            return await asyncio.gather(
+                pool.analyze('t1', 'broken.mp3'), pool.analyze('t2', 'fine.mp3'), return_exceptions=True
+            )
+        finally:
+            pool.shutdown()
+
+    error, result = asyncio.run(scenario())
+    assert isinstance(error, ValueError) and result['analysis_profile'] == 'standard'
@@ -0,0 +1,49 @@
+"""
+Audio Analyzer Tests - block-wise feature extraction against whole-signal extraction
+"""
+import numpy as np
+import pytest
+
+from audio_analyzer import AudioAnalyzer
+
+SR = 22050
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    t = np.arange(SR * 4) / SR
+    # A tone with clicks on the beat, plus a little noise
+    y = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t))
+    y[::SR // 2] += 0.8
+    return y.astype(np.float32)
+
+def test_single_block_matches_compute_features(signal):
+    analyzer = AudioAnalyzer()
+    expected = analyzer.compute_features(signal, SR)
+    streamed = analyzer.compute_features_streaming([signal], SR)
+
+    assert streamed.keys() == expected.keys()
+    for key, value in expected.items():
+        assert streamed[key] == pytest.approx(value, rel=1e-6, abs=1e-9), key
+
+def test_blocks_combine_by_length_and_extremes(signal):
+    analyzer = AudioAnalyzer()
+    first, second = signal[:SR * 3], signal[SR * 3:]
+    streamed = analyzer.compute_features_streaming([first, second], SR)
+    parts = [analyzer.compute_features(block, SR) for block in (first, second)]
+
+    expected_rms = (parts[0]['rms_energy'] * len(first) + parts[1]['rms_energy'] * len(second)) / len(signal)
+    assert streamed['rms_energy'] == pytest.approx(expected_rms)
+    assert streamed['dynamic_range'] == pytest.approx(float(signal.max() - signal.min()))
+    # The longer block carries the median
+    assert streamed['tempo'] == parts[0]['tempo']
+
+def test_short_trailing_block_is_skipped(signal):
+    analyzer = AudioAnalyzer()
+    whole = analyzer.compute_features_streaming([signal], SR)
+    with_sliver = analyzer.compute_features_streaming([signal, signal[:10]], SR)
+    assert with_sliver == whole
+
+def test_no_audio_raises():
+    with pytest.raises(ValueError):
+        AudioAnalyzer().compute_features_streaming([np.zeros(0, dtype=np.float32)], SR)
@@ -0,0 +1,104 @@
+"""
+Bulk Writer Tests - flush thresholds, upstream ordering and error accounting
+"""
+import asyncio
+
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from bulk_writer import BulkWriter
+
+class FakeCollection:
+    """Records each bulk_write batch; optionally fails them"""
+
+    def __init__(self, name='tracks', error=None, log=None):
+        self.name = name
+        self.error = error
+        self.batches = []
+        self.log = log if log is not None else []
+
+    async def bulk_write(self, operations, ordered=True):
+        assert not ordered
+        self.batches.append(list(operations))
+        self.log.append(self.name)
+        if self.error is not None:
+            raise self.error
+
+def test_flushes_when_the_batch_is_full():
+    async def scenario():
+        collection = FakeCollection()
+        writer = BulkWriter(collection, max_batch_size=3, max_interval=0)
+        for i in range(7):
+            await writer.insert({'id': i})
+        assert [len(batch) for batch in collection.batches] == [3, 3]
+        await writer.close()
+        assert [len(batch) for batch in collection.batches] == [3, 3, 1]
+        assert (writer.stats.batches, writer.stats.operations, writer.stats.failed_operations) == (3, 7, 0)
+
+    asyncio.run(scenario())
+
+def test_flushes_when_the_oldest_operation_is_due():
+    async def scenario():
+        collection = FakeCollection()
+        async with BulkWriter(collection, max_batch_size=100, max_interval=0.05) as writer:
+            await writer.update({'id': 1}, {'$set': {'title': 'a'}}, upsert=True)
+            assert collection.batches == []
+            await asyncio.sleep(0.2)
+            assert len(collection.batches) == 1
+        assert writer.stats.batches == 1
+
+    asyncio.run(scenario())
+
+def test_empty_flush_writes_nothing():
+    async def scenario():
+        collection = FakeCollection()
+        await BulkWriter(collection, max_interval=0).close()
+        assert collection.batches == []
+
+    asyncio.run(scenario())
+
+def test_upstream_writers_flush_first():
+    async def scenario():
+        log = []
+        tracks = BulkWriter(FakeCollection('tracks', log=log), max_interval=0)
+        checkpoints = BulkWriter(FakeCollection('checkpoints', log=log), max_interval=0, upstream=[tracks])
+        await tracks.add(InsertOne({'id': 1}))
+        await checkpoints.add(InsertOne({'folder': 1}))
+        await checkpoints.flush()
+        assert log == ['tracks', 'checkpoints']
+
+    asyncio.run(scenario())
+
+def test_bulk_write_error_counts_only_failed_operations():
+    async def scenario():
+        error = BulkWriteError({'writeErrors': [{'index': 1, 'errmsg': 'duplicate key'}]})
+        writer = BulkWriter(FakeCollection(error=error), max_interval=0)
+        for i in range(4):
+            await writer.insert({'id': i})
+        await writer.close()
+        assert writer.stats.failed_operations == 1
+        assert writer.stats.errors == [{'batch': 1, 'batch_size': 4, 'failed': 1, 'samples': ['duplicate key']}]
+
+    asyncio.run(scenario())
+
+def test_other_errors_fail_the_whole_batch_without_raising():
+    async def scenario():
+        writer = BulkWriter(FakeCollection(error=ConnectionError('connection lost')), max_batch_size=2,
+                            max_interval=0)
+        for i in range(3):
+            await writer.insert({'id': i})
+        await writer.close()
+        assert writer.stats.failed_operations == 3
+        assert [error['samples'] for error in writer.stats.errors] == [['connection lost'], ['connection lost']]
+
+    asyncio.run(scenario())
+
+def test_recorded_errors_are_capped():
+    async def scenario():
+        writer = BulkWriter(FakeCollection(error=RuntimeError('down')), max_batch_size=1, max_interval=0)
+        writer.MAX_RECORDED_ERRORS = 3
+        for i in range(5):
+            await writer.insert({'id': i})
+        assert [error['batch'] for error in writer.stats.errors] == [3, 4, 5]
+
+    asyncio.run(scenario())
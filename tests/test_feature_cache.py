@@ -0,0 +1,25 @@
+"""
+Feature Cache Tests - per-profile versioning of cached features
+"""
+import pickle
+
+from feature_cache import FeatureCache
+
+FEATURES = {'tempo': 120.0, 'rms_energy': 0.2}
+
+def test_bumping_one_profile_keeps_the_others(tmp_path):
+    path = str(tmp_path / 'features.sqlite3')
+    old = FeatureCache(path, {'standard': '2', 'full': '2'})
+    old.put('hash', 'standard', FEATURES)
+    old.put('hash', 'full', FEATURES)
+
+    new = FeatureCache(path, {'standard': '2', 'full': '3'})
+    assert new.get('hash', 'standard') == FEATURES
+    assert new.get('hash', 'full') is None
+    assert new.get('other', 'standard') is None
+
+def test_survives_pickling(tmp_path):
+    cache = FeatureCache(str(tmp_path / 'features.sqlite3'), {'standard': '2'})
+    cache.put('hash', 'standard', FEATURES)
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.get('hash', 'standard') == FEATURES
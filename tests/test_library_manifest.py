@@ -0,0 +1,65 @@
+"""
+Library Manifest Tests - classification of walked files against a stored manifest
+"""
+import os
+
+from library_manifest import ManifestDiffer, ManifestEntry
+
+def write(path, content=b'audio'):
+    path.write_bytes(content)
+    return ManifestEntry.from_stat(str(path), os.stat(path))
+
+def test_unchanged_and_added(tmp_path):
+    kept = write(tmp_path / 'kept.mp3')
+    differ = ManifestDiffer({kept.path: kept})
+
+    assert differ.classify(kept) == (ManifestDiffer.UNCHANGED, None)
+    new = write(tmp_path / 'new.mp3')
+    assert differ.classify(new) == (ManifestDiffer.ADDED, None)
+    assert differ.removed() == []
+    assert differ.counts[ManifestDiffer.ADDED] == 1
+
+def test_modified_when_size_or_mtime_changes(tmp_path):
+    old = write(tmp_path / 'song.mp3')
+    rewritten = ManifestEntry(old.path, old.size + 10, old.mtime + 5, old.inode)
+    differ = ManifestDiffer({old.path: old})
+
+    assert differ.classify(rewritten) == (ManifestDiffer.MODIFIED, None)
+    assert differ.removed() == []
+
+def test_moved_keeps_the_old_entry(tmp_path):
+    old = write(tmp_path / 'before.mp3')
+    os.rename(old.path, tmp_path / 'after.mp3')
+    moved = ManifestEntry.from_stat(str(tmp_path / 'after.mp3'), os.stat(tmp_path / 'after.mp3'))
+    differ = ManifestDiffer({old.path: old})
+
+    assert differ.classify(moved) == (ManifestDiffer.MOVED, old)
+    # The old path counts as seen, so it is not also reported as removed
+    assert differ.removed() == []
+
+def test_reused_inode_with_other_content_is_an_add(tmp_path):
+    old = write(tmp_path / 'deleted.mp3')
+    os.remove(old.path)
+    reused = ManifestEntry(str(tmp_path / 'other.mp3'), old.size + 1, old.mtime, old.inode)
+    differ = ManifestDiffer({old.path: old})
+
+    assert differ.classify(reused) == (ManifestDiffer.ADDED, None)
+    assert differ.removed() == [old]
+
+def test_copy_of_an_existing_file_is_not_a_move(tmp_path):
+    old = write(tmp_path / 'original.mp3')
+    # Same inode (a hard link) while the original path still exists
+    os.link(old.path, tmp_path / 'link.mp3')
+    link = ManifestEntry.from_stat(str(tmp_path / 'link.mp3'), os.stat(tmp_path / 'link.mp3'))
+    differ = ManifestDiffer({old.path: old})
+
+    assert differ.classify(link) == (ManifestDiffer.ADDED, None)
+
+def test_removed_lists_entries_never_walked(tmp_path):
+    kept = write(tmp_path / 'kept.mp3')
+    gone = write(tmp_path / 'gone.mp3')
+    os.remove(gone.path)
+    differ = ManifestDiffer({kept.path: kept, gone.path: gone})
+
+    differ.classify(kept)
+    assert differ.removed() == [gone]
@@ -0,0 +1,136 @@
+"""
+Library Sync Tests - folder scans against an in-memory MongoDB
+"""
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('motor')
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_library_sync')
+
+import server
+from feature_index import FeatureIndex
+from library_ingest import IngestExecutor
+from library_manifest import ManifestEntry
+from neighbor_graph import NeighborGraph
+from neighbor_search import SimilaritySearch
+from scan_jobs import ScanJob
+
+@pytest.fixture
+def library(monkeypatch, tmp_path):
+    db = mongomock_motor.AsyncMongoMockClient()['library']
+    index = FeatureIndex()
+    monkeypatch.setattr(server, 'db', db)
+    monkeypatch.setattr(server, 'feature_index', index)
+    monkeypatch.setattr(server, 'neighbor_graph', NeighborGraph(db.track_neighbors, SimilaritySearch(index)))
+    monkeypatch.setattr(server, 'ingest_executor', IngestExecutor(workers=2, executor_type='thread'))
+    return db
+
+def write_file(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+async def scan(db, paths):
+    """Scan ``paths`` as one folder, against the manifest the previous scans left"""
+    previous = {
+        document['path']: ManifestEntry.from_document(document)
+        async for document in db.file_manifests.find({"folder_id": "folder"})
+    }
+
+    async def files():
+        for path in paths:
+            yield path, os.stat(path)
+
+    return await server.sync_folder_files("folder", files(), previous, ScanJob("folder", "/music"))
+
+async def tracks_by_path(db):
+    return {track['file_path']: track async for track in db.tracks.find({}, {"_id": 0})}
+
+def test_copy_found_in_a_later_batch_shares_the_original(library, tmp_path):
+    async def scenario():
+        # The copy is probed more than a content-match batch after its original
+        paths = [
+            write_file(tmp_path / f'{i:04}.mp3', os.urandom(512)) for i in range(server.CONTENT_MATCH_BATCH_SIZE + 50)
+        ]
+        with open(paths[0], 'rb') as f:
+            paths.append(write_file(tmp_path / 'copy.mp3', f.read()))
+
+        await scan(library, paths)
+        tracks = await tracks_by_path(library)
+        assert len(tracks) == len(paths)
+        assert tracks[paths[-1]]['duplicate_of'] == tracks[paths[0]]['id']
+        assert sum(1 for track in tracks.values() if track.get('duplicate_of')) == 1
+
+    asyncio.run(scenario())
+
+def test_touched_file_keeps_its_analysis(library, tmp_path):
+    async def scenario():
+        path = write_file(tmp_path / 'song.mp3', os.urandom(512))
+        await scan(library, [path])
+        await library.tracks.update_one({"file_path": path}, {"$set": {"audio_features": {"tempo": 120.0}}})
+
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+        changes = await scan(library, [path])
+        assert changes['modified'] == 1
+        assert (await tracks_by_path(library))[path]['audio_features'] == {"tempo": 120.0}
+
+        write_file(tmp_path / 'song.mp3', os.urandom(600))
+        await scan(library, [path])
+        assert 'audio_features' not in (await tracks_by_path(library))[path]
+
+    asyncio.run(scenario())
+
+def test_copy_takes_the_place_of_a_removed_original(library, tmp_path):
+    async def scenario():
+        content = os.urandom(512)
+        original = write_file(tmp_path / 'original.mp3', content)
+        await scan(library, [original])
+        copy = write_file(tmp_path / 'copy.mp3', content)
+        await scan(library, [original, copy])
+        tracks = await tracks_by_path(library)
+        server.feature_index.upsert(tracks[original]['id'], {'tempo': 120.0, 'rms_energy': 0.2})
+        features = server.feature_index.features(tracks[original]['id'])
+
+        os.remove(original)
+        changes = await scan(library, [copy])
+        assert changes['removed'] == 1
+        promoted = (await tracks_by_path(library))[copy]
+        assert promoted.get('duplicate_of') is None
+        assert tracks[original]['id'] not in server.feature_index
+        assert server.feature_index.features(promoted['id']) == features
+
+    asyncio.run(scenario())
+
+class RecordingScanJobs:
+    def __init__(self):
+        self.submitted = []
+
+    async def load_interrupted(self):
+        return []
+
+    def submit(self, folder_id, folder_path, **options):
+        self.submitted.append(folder_id)
+
+def test_quarantined_tracks_do_not_resume_a_scan(library, monkeypatch):
+    scan_jobs = RecordingScanJobs()
+    monkeypatch.setattr(server, 'scan_jobs', scan_jobs)
+
+    async def scenario():
+        await library.music_folders.insert_many([
+            {"id": "failing", "path": "/music/failing", "is_active": True},
+            {"id": "interrupted", "path": "/music/interrupted", "is_active": True}
+        ])
+        await library.tracks.insert_many([
+            {"id": "t1", "file_path": "/music/failing/bad.mp3", "audio_features": None,
+             "analysis_failure": {"reason": "error", "attempts": 3}},
+            {"id": "t2", "file_path": "/music/interrupted/new.mp3", "audio_features": None}
+        ])
+        await server.resume_interrupted_scans()
+
+    asyncio.run(scenario())
+    assert scan_jobs.submitted == ["interrupted"]
@@ -0,0 +1,69 @@
+"""
+Neighbor Search Tests - recall of the approximate backends against brute force
+"""
+import numpy as np
+import pytest
+
+from feature_index import SIMILARITY_FEATURES, FeatureIndex
+from neighbor_search import BallTreeSearch, ExactSearch, LSHSearch, SimilaritySearch
+
+K = 10
+
+def build_index():
+    rng = np.random.default_rng(0)
+    # Clusters of tracks, like genres, over features on their natural scales
+    centers = rng.normal([2000, 4000, 120, 0.1], [600, 1200, 30, 0.05], size=(20, 4))
+    rows = centers[rng.integers(len(centers), size=5000)] * rng.normal(1, 0.1, size=(5000, 4))
+    index = FeatureIndex()
+    index.build((f't{i}', dict(zip(SIMILARITY_FEATURES, row))) for i, row in enumerate(rows))
+    # Leave holes in the matrix, as removals do
+    for i in range(0, 5000, 50):
+        index.remove(f't{i}')
+    return index
+
+@pytest.fixture(scope='module')
+def index():
+    return build_index()
+
+def recall(searcher, index, queries):
+    vectors, valid, _, _ = index.snapshot()
+    exact = ExactSearch().fit(vectors, valid)
+    searcher.fit(vectors, valid)
+    found = 0
+    for query in queries:
+        expected, _ = exact.query(vectors[query], K)
+        rows, scores = searcher.query(vectors[query], K)
+        assert np.all(np.diff(scores) <= 1e-6)
+        assert valid[rows].all()
+        found += len(set(rows) & set(expected))
+    return found / (K * len(queries))
+
+@pytest.fixture(scope='module')
+def queries(index):
+    _, valid, _, _ = index.snapshot()
+    return np.random.default_rng(1).choice(np.flatnonzero(valid), size=200, replace=False)
+
+def test_balltree_is_exact(index, queries):
+    assert recall(BallTreeSearch(), index, queries) >= 0.99
+
+def test_lsh_recall(index, queries):
+    assert recall(LSHSearch(), index, queries) >= 0.9
+
+def test_lsh_falls_back_to_brute_force_for_too_few_candidates(index):
+    vectors, valid, _, _ = index.snapshot()
+    vectors, valid = vectors[:60], valid[:60]
+    # Asking for every row: no bucket holds them all, so the query must fall back
+    lsh = LSHSearch(tables=1, bits=30, probes=0).fit(vectors, valid)
+    rows, _ = lsh.query(vectors[1], int(valid.sum()))
+    assert set(rows) == set(np.flatnonzero(valid))
+
+def test_similarity_search_skips_removed_tracks():
+    # Removes a track, so it gets an index of its own
+    index = build_index()
+    search = SimilaritySearch(index, backend='lsh', exact_threshold=0)
+    features = index.features('t1')
+    nearest = search.nearest(features, K, exclude=['t1'])
+    assert len(nearest) == K and 't1' not in dict(nearest)
+
+    index.remove(nearest[0][0])
+    assert nearest[0][0] not in dict(search.nearest(features, K, exclude=['t1']))